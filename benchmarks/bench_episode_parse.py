@@ -0,0 +1,75 @@
+"""Measure episode page parsing throughput (episodes/sec) with the css selector
+implementation and the precompiled xpath implementation in snlscrape/pages.py, and
+check that they yield identical items.
+
+Pages come from a response store (see snlscrape/store.py) if one is given, otherwise
+the synthetic episode page from snlscrape/page_test_helpers.py is used.
+
+Usage: python benchmarks/bench_episode_parse.py [--store htmlstore] [--repeat 5]
+"""
+from __future__ import print_function
+import argparse
+import logging
+import time
+
+from scrapy.settings import Settings
+
+from snlscrape import reparse, settings as snl_settings
+from snlscrape.page_test_helpers import episode_response
+from snlscrape.spiders.snl import SnlSpider
+from snlscrape.store import ResponseStore
+
+def stored_responses(store_root):
+  store = ResponseStore(store_root)
+  responses = []
+  for url in store.urls():
+    if reparse.EPISODE_URL_RE.match(url):
+      entry = store.get(url)
+      responses.append(episode_response(store.body(entry['sha1']), url))
+  store.close()
+  return responses
+
+def time_parse(fast, responses, repeat):
+  best = None
+  for _ in range(repeat):
+    # A fresh spider each time, so that every run yields the same entities (see SeenRegistry)
+    spider = SnlSpider()
+    spider.settings = Settings(dict(vars(snl_settings), SNL_FAST_PARSE=fast))
+    t0 = time.time()
+    items = [[(type(item).__name__, dict(item)) for item in spider.parseEpisode(response)]
+        for response in responses]
+    elapsed = time.time() - t0
+    best = elapsed if best is None else min(best, elapsed)
+  return best, items
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+  parser.add_argument('--store', help='Response store to take episode pages from')
+  parser.add_argument('--copies', type=int, default=200,
+      help='Number of copies of the synthetic page to parse, if no --store')
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  if args.store:
+    responses = stored_responses(args.store)
+  else:
+    responses = [episode_response() for _ in range(args.copies)]
+  if not responses:
+    parser.error('No episode pages found')
+  # Responses cache their parsed tree, so parse them up front to time only the extraction
+  for response in responses:
+    response.selector
+
+  # The synthetic page deliberately triggers some warnings
+  logging.disable(logging.WARNING)
+  results = {}
+  for fast, label in [(False, 'css'), (True, 'xpath')]:
+    elapsed, items = time_parse(fast, responses, args.repeat)
+    results[label] = items
+    print('{:>6}: {:.1f} episodes/sec ({} episodes in {:.3f}s)'.format(
+      label, len(responses) / elapsed, len(responses), elapsed))
+  assert results['css'] == results['xpath'], 'Parsers disagree!'
+  print('Items identical.')
+
+if __name__ == '__main__':
+  main()
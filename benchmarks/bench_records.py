@@ -0,0 +1,100 @@
+"""Compare Appearance and Title as slotted records (see snlscrape/records.py) vs. as
+plain scrapy Items, by replaying a full crawl's worth of them from the exported
+tables: the memory needed to hold them all (as the test ItemBasket does), and the
+throughput of creating them and passing them through the field checks and the
+json-lines exporter. Checks that both give identical output.
+
+Usage: python benchmarks/bench_records.py [--data output] [--repeat 3]
+
+(If the data directory has appearances.csv rather than appearances.json, that's used
+instead.)
+"""
+from __future__ import division, print_function
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+import scrapy.exporters
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from snlscrape import items, pipelines, tables
+
+RECORD_CLASSES = [items.Appearance, items.Title]
+
+def item_version(record_class):
+  """An equivalent scrapy.Item class, with the same name and fields."""
+  return type(record_class.__name__, (items.BaseSnlItem,), dict(record_class.fields))
+
+def load_rows(data_root, table_name):
+  if tables.table_paths(data_root, table_name):
+    rows = list(tables.read_table(data_root, table_name))
+  else:
+    df = pd.read_csv(os.path.join(data_root, table_name + '.csv'), dtype=object)
+    rows = df.drop(['epid', 'sid'], axis=1, errors='ignore').to_dict('records')
+  # Leave out null fields, as the spider would
+  return [{k: v for (k, v) in row.items() if not pd.isnull(v)} for row in rows]
+
+def build(classes, rows):
+  return [cls(row) for (cls, table_rows) in zip(classes, rows) for row in table_rows]
+
+def measure_memory(classes, rows):
+  tracemalloc.start()
+  built = build(classes, rows)
+  size = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  del built
+  return size
+
+def replay(classes, rows, export):
+  """Create the items and check them, and (if export is True) export them. Return the
+  exported bytes."""
+  checker = pipelines.FieldCheckPipeline()
+  checker.open_spider(None)
+  f = io.BytesIO()
+  exporter = scrapy.exporters.JsonLinesItemExporter(f)
+  for item in build(classes, rows):
+    item = checker.process_item(item, None)
+    if export:
+      exporter.export_item(item)
+  return f.getvalue()
+
+def measure_throughput(classes, rows, repeat, export):
+  best = None
+  for _ in range(repeat):
+    t0 = time.time()
+    output = replay(classes, rows, export)
+    elapsed = time.time() - t0
+    best = elapsed if best is None else min(best, elapsed)
+  return best, output
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+  parser.add_argument('--data', default='output')
+  parser.add_argument('--repeat', type=int, default=3)
+  args = parser.parse_args()
+  rows = [load_rows(args.data, tables.table_name(cls)) for cls in RECORD_CLASSES]
+  n = sum(len(table_rows) for table_rows in rows)
+  print('{} items ({})'.format(n, ', '.join('{} {}s'.format(len(table_rows), cls.__name__)
+    for (cls, table_rows) in zip(RECORD_CLASSES, rows))))
+  results = {}
+  for label, classes in [('Item', [item_version(cls) for cls in RECORD_CLASSES]),
+      ('Record', RECORD_CLASSES)]:
+    memory = measure_memory(classes, rows)
+    check_time, _ = measure_throughput(classes, rows, args.repeat, False)
+    export_time, output = measure_throughput(classes, rows, args.repeat, True)
+    results[label] = (memory, check_time, export_time, output)
+    print('{:>7}: {:.1f}MB ({:.0f} bytes/item). {:,.0f} items/sec created and checked, '
+      '{:,.0f} items/sec also exported'.format(
+      label, memory / 1e6, memory / n, n / check_time, n / export_time))
+  item_results, record_results = results['Item'], results['Record']
+  assert item_results[-1] == record_results[-1], 'Exported output differs!'
+  print('Records: {:.1f}x less memory; {:.1f}x / {:.1f}x the throughput. Output identical.'.format(
+    *[item_result / record_result
+      for (item_result, record_result) in zip(item_results[:3], record_results[:3])]))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,47 @@
+"""Time loading every table of the database from a snapshot (see snlscrape/snapshot.py)
+vs. parsing the csvs, each in a fresh process (so nothing's cached in the interpreter).
+
+Usage: python benchmarks/bench_snapshot.py [--data output] [--repeat 5]
+
+(Writes a snapshot to <data>/snapshot first, if there isn't one.)
+"""
+from __future__ import division, print_function
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from snlscrape import snapshot
+
+LOADER = '''
+import sys, time
+sys.path.insert(0, {root!r})
+from snlscrape import snapshot
+t0 = time.time()
+tables = {call}
+print(time.time() - t0)
+'''
+
+def time_load(call, repeat):
+  """Return the fastest of repeat timings of call, in seconds."""
+  code = LOADER.format(root=ROOT, call=call)
+  return min(float(subprocess.check_output([sys.executable, '-c', code]))
+    for _ in range(repeat))
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+  parser.add_argument('--data', default='output')
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+  snapshot_path = os.path.join(args.data, 'snapshot')
+  if not os.path.exists(snapshot_path):
+    snapshot.write_snapshot(snapshot.load_csvs(args.data), snapshot_path)
+  csv_time = time_load('snapshot.load_csvs({!r})'.format(args.data), args.repeat)
+  snapshot_time = time_load('snapshot.load_snapshot({!r})'.format(snapshot_path), args.repeat)
+  print('     csv: {:.1f}ms'.format(csv_time * 1000))
+  print('snapshot: {:.1f}ms ({:.1f}x faster)'.format(snapshot_time * 1000, csv_time / snapshot_time))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,152 @@
+"""Time the computation of the casts table's n_episodes/season_fraction columns and
+the tenure table (enrich_casts + build_tenure in convert_json_to_csv.py) against the
+original row-at-a-time implementations (reproduced below), on the current dataset
+and on a synthetic one with every cast member (and their appearances) cloned n
+times. Checks that both give identical output.
+
+Usage: python benchmarks/bench_tenure.py [--data output] [--scale 10] [--skip-reference]
+
+(The data directory should contain the json tables scraped by snlscrape. If it has
+appearances.csv rather than appearances.json, that's used instead.)
+"""
+from __future__ import division, print_function
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import convert_json_to_csv as convert
+from snlscrape.keys import KeyDictionary
+
+def reference_eps_in_range(start, end, episodes):
+  epidx = (
+    (episodes['epid'] >= start)
+    & (episodes['epid'] <= end)
+  )
+  return epidx.sum()
+
+def reference_enrich_casts(casts, seasons, episodes):
+  n_eps = []
+  fracs = []
+  for cast in casts.itertuples():
+    first = cast.first_epid
+    if pd.isnull(first):
+      first = seasons.loc[cast.sid, 'first_epid']
+    last = cast.last_epid
+    if pd.isnull(last):
+      last = seasons.loc[cast.sid, 'last_epid']
+    count = reference_eps_in_range(first, last, episodes)
+    n_eps.append(count)
+    frac = count / seasons.loc[cast.sid, 'n_episodes']
+    fracs.append(frac)
+  casts['n_episodes'] = n_eps
+  casts['season_fraction'] = fracs
+
+def reference_eps_present_in_casts(cs, seasons, apps):
+  eps = 0
+  for cast in cs.itertuples():
+    season = seasons.loc[cast.sid]
+    if not pd.isnull(cast.first_epid):
+      first = cast.first_epid
+    else:
+      first = season.first_epid
+    if not pd.isnull(cast.last_epid):
+      last = cast.last_epid
+    else:
+      last = season.last_epid
+    present_epids = apps.loc[
+      (apps['aid']==cast.aid) &
+      (apps['epid'] >= first) & (apps['epid'] <= last),
+      'epid'
+    ].unique()
+    eps += len(present_epids)
+  return eps
+
+def reference_build_tenure(t):
+  seasons, apps, actors, casts = t['seasons'], t['appearances'], t['actors'], t['casts']
+  cols = ['aid', 'n_episodes', 'eps_present', 'n_seasons']
+  rows = []
+  cast = actors[actors['type']=='cast']
+  for actor in cast.itertuples():
+    aid = actor.aid
+    cast_years = casts[casts['aid'] == aid].sort_values(by='sid')
+    if len(cast_years) == 0:
+      continue
+    n_seasons = len(cast_years)
+    n_episodes = cast_years['n_episodes'].sum()
+    eps_present = reference_eps_present_in_casts(cast_years, seasons, apps)
+    rows.append([aid, n_episodes, eps_present, n_seasons])
+  return pd.DataFrame(rows, columns=cols)
+
+def load(data_root):
+  convert.DATA_ROOT = data_root
+  tables = convert.load_tables()
+  if 'appearances' not in tables:
+    apps = pd.read_csv(os.path.join(data_root, 'appearances.csv'))
+    tables['appearances'] = apps.drop(['epid', 'sid'], axis=1)
+  convert.correct_errors(tables)
+  keys = KeyDictionary.from_tables(tables)
+  keys.encode_tables(tables)
+  convert.add_indices(tables)
+  convert.add_merge_cols(tables)
+  convert.enrich_seasons(tables['seasons'], tables['episodes'])
+  return tables, keys
+
+def scaled(tables, keys, n):
+  """Return a copy of the tables (and key dictionary) with n clones of every actor
+  (and their cast-years and appearances)."""
+  t = dict(tables)
+  aids = keys.values['aid']
+  def clone(df):
+    copies = []
+    for i in range(n):
+      copy = df.copy()
+      copy['aid'] = copy['aid'] + i * len(aids)
+      copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+  for name in ('actors', 'casts', 'appearances'):
+    t[name] = clone(tables[name])
+  scaled_aids = [aid if i == 0 else '{} #{}'.format(aid, i) for i in range(n) for aid in aids]
+  scaled_keys = KeyDictionary(dict(keys.values, aid=scaled_aids))
+  return t, scaled_keys
+
+def run(tables, enrich, tenure):
+  t = dict(tables)
+  t['casts'] = tables['casts'].copy()
+  t0 = time.time()
+  enrich(t['casts'], t['seasons'], t['episodes'])
+  tenure_df = tenure(t)
+  return time.time() - t0, t['casts'], tenure_df
+
+def compare(label, tables, keys, skip_reference):
+  print('{}: {} cast-years, {} appearances'.format(
+    label, len(tables['casts']), len(tables['appearances'])))
+  elapsed, casts, tenure = run(tables, convert.enrich_casts,
+      lambda t: convert.build_tenure(t, keys))
+  print('  vectorized: {:.3f}s'.format(elapsed))
+  if skip_reference:
+    return
+  ref_elapsed, ref_casts, ref_tenure = run(tables, reference_enrich_casts, reference_build_tenure)
+  print('   reference: {:.3f}s ({:.0f}x speedup)'.format(ref_elapsed, ref_elapsed / elapsed))
+  assert casts.to_csv(index=False) == ref_casts.to_csv(index=False), 'casts differ!'
+  assert tenure.to_csv(index=False) == ref_tenure.to_csv(index=False), 'tenure differs!'
+  print('  Output identical.')
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+  parser.add_argument('--data', default='output')
+  parser.add_argument('--scale', type=int, default=10)
+  parser.add_argument('--skip-reference', action='store_true',
+      help="Don't run the reference implementation on the scaled dataset (it's slow)")
+  args = parser.parse_args()
+  tables, keys = load(args.data)
+  compare('Current dataset', tables, keys, False)
+  scaled_tables, scaled_keys = scaled(tables, keys, args.scale)
+  compare('{}x synthetic dataset'.format(args.scale), scaled_tables, scaled_keys,
+      args.skip_reference)
+
+if __name__ == '__main__':
+  main()
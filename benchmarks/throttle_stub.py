@@ -0,0 +1,132 @@
+"""Crawl two local stub servers - a fast one standing in for snlarchive, and a slow
+one standing in for IMDB - with the old global throttling settings
+(CONCURRENT_REQUESTS=1, no per-host budgets), and with the per-host throttling of
+HostThrottleMiddleware. Reports total crawl time, and the peak concurrency and
+minimum gap between requests that each server saw (i.e. the load on each site).
+
+Usage: python benchmarks/throttle_stub.py [--pages 20] [--slow-latency .6]
+"""
+from __future__ import print_function
+import argparse
+import multiprocessing
+import threading
+import time
+
+try:
+  from http.server import BaseHTTPRequestHandler, HTTPServer
+  from socketserver import ThreadingMixIn
+except ImportError:
+  from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+  from SocketServer import ThreadingMixIn
+
+import scrapy
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+FAST_HOST = '127.0.0.1'
+SLOW_HOST = 'localhost'
+
+class ThreadedServer(ThreadingMixIn, HTTPServer):
+  daemon_threads = True
+
+def stub_server(latency):
+  """Start a server that answers every GET after the given latency, and keeps
+  track of how many requests it had in flight at once.
+  """
+  load = dict(active=0, peak=0, starts=[])
+  lock = threading.Lock()
+
+  class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+      with lock:
+        load['active'] += 1
+        load['peak'] = max(load['peak'], load['active'])
+        load['starts'].append(time.time())
+      time.sleep(latency)
+      body = b'<html><body>ok</body></html>'
+      self.send_response(200)
+      self.send_header('Content-Type', 'text/html')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+      with lock:
+        load['active'] -= 1
+
+    def log_message(self, *args):
+      pass
+
+  server = ThreadedServer(('127.0.0.1', 0), Handler)
+  thread = threading.Thread(target=server.serve_forever)
+  thread.daemon = True
+  thread.start()
+  return server, load
+
+class StubSpider(scrapy.Spider):
+  name = 'stubspider'
+
+  def start_requests(self):
+    for i in range(self.pages):
+      for url in self.urls:
+        yield scrapy.Request('{}/page{}'.format(url, i), dont_filter=True)
+
+  # Scrapy >= 2.13 only calls start_requests through the default start()
+  async def start(self):
+    for request in self.start_requests():
+      yield request
+
+  def parse(self, response):
+    pass
+
+def crawl(settings_overrides, urls, pages, result_queue):
+  settings = get_project_settings()
+  settings.set('ITEM_PIPELINES', {})
+  settings.set('LOG_LEVEL', 'WARNING')
+  settings.set('ROBOTSTXT_OBEY', False)
+  for k, v in settings_overrides.items():
+    settings.set(k, v)
+  process = CrawlerProcess(settings)
+  start = time.time()
+  process.crawl(StubSpider, urls=urls, pages=pages)
+  process.start()
+  result_queue.put(time.time() - start)
+
+def min_gap(starts):
+  starts = sorted(starts)
+  gaps = [b - a for (a, b) in zip(starts, starts[1:])]
+  return min(gaps) if gaps else float('nan')
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--pages', type=int, default=20, help='Pages to request from each host')
+  parser.add_argument('--slow-latency', type=float, default=.6)
+  parser.add_argument('--fast-latency', type=float, default=.1)
+  parser.add_argument('--delay', type=float, default=.5)
+  args = parser.parse_args()
+
+  modes = [
+    ('global (old settings)', dict(CONCURRENT_REQUESTS=1, SNL_THROTTLE_ENABLED=False)),
+    ('per-host', dict(SNL_HOST_CONCURRENCY={FAST_HOST: 1, SLOW_HOST: 1},
+        SNL_HOST_DELAY={FAST_HOST: args.delay, SLOW_HOST: args.delay})),
+  ]
+  for label, overrides in modes:
+    overrides['DOWNLOAD_DELAY'] = args.delay
+    fast, fast_load = stub_server(args.fast_latency)
+    slow, slow_load = stub_server(args.slow_latency)
+    urls = ['http://{}:{}'.format(FAST_HOST, fast.server_address[1]),
+        'http://{}:{}'.format(SLOW_HOST, slow.server_address[1])]
+    # Twisted's reactor can't be restarted, so each crawl gets its own process.
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=crawl, args=(overrides, urls, args.pages, queue))
+    proc.start()
+    elapsed = queue.get()
+    proc.join()
+    fast.shutdown()
+    slow.shutdown()
+    n = 2 * args.pages
+    print('{:<22} {:6.1f}s  {:5.2f} req/s'.format(label, elapsed, n / elapsed))
+    for host, load in [('fast host', fast_load), ('slow host', slow_load)]:
+      print('  {}: peak concurrency {}, min gap between requests {:.2f}s'.format(
+        host, load['peak'], min_gap(load['starts'])))
+
+if __name__ == '__main__':
+  main()
@@ -2,6 +2,9 @@
 Goes through the 'raw' json files scraped by snlscrape and saves them to csv after
 applying the following transformations:
   - Manually corrects a few errors in the metadata from snlarchive
+  - Replaces actor, title, episode and season ids with dense integer codes (see
+    snlscrape/keys.py) while it works, decoding them again on output. The key
+    dictionary is saved to keys.json
   - Adds some useful merge columns (e.g. season id in titles)
   - Adds some other useful derived columns, e.g. to the seasons table add columns 
     for the ids of the first and last episode of each season, and the total number of episodes
@@ -10,34 +13,54 @@ applying the following transformations:
   - Creates a new derived table, tenure, with a row for each cast member describing 
     their time on the show (how many episodes they appeared in, how many episodes
     there were between their first and last show, and how many seasons they were on)
+  - Creates a new derived table, facts, with a row per appearance, denormalized with the
+    most useful columns of the title, episode and actor it belongs to (see
+    snlscrape/facts.py for loading it)
+  - If AIRTIME is set, adds columns to the titles table describing each title's share of
+    its episode, and creates a derived table, airtime, summing those shares for each
+    actor per season
+
+Each step is a stage whose output is cached (in output/.convert_cache - see
+snlscrape/stages.py), so re-running only redoes the steps affected by what's changed
+since the last run (the json, the code of a step, female_names.txt...), and only
+rewrites the csvs whose contents might have changed.
+
+Usage: python convert_json_to_csv.py [--stage STAGE] [--list] [--force]
 """
 from __future__ import division, print_function
+import argparse
+import hashlib
+import io
+import json
+import numpy as np
 import pandas as pd
-import glob
 import os
 
+from snlscrape.keys import KeyDictionary
+from snlscrape.stages import Stage, StageGraph
+from snlscrape.tables import list_tables
+from snlscrape.tenure import TenureIndex
+
 DATA_ROOT = 'output'
 OUTPUT_ROOT = 'output'
 
-# Whether to add derived columns to titles/episodes that useful specifically for
-# analyzing cast member airtimes.
-AIRTIME = False
+# Number of processes to load sharded tables with (see SNL_SHARD_BY_SEASON in
+# snlscrape/settings.py). None means one per cpu.
+PROCESSES = None
 
-def eps_in_range(start, end, episodes):
-  epidx = (
-    (episodes['epid'] >= start)
-    & (episodes['epid'] <= end)
-  )
-  return epidx.sum()
+# Whether to add derived columns to titles that are useful specifically for analyzing
+# cast member airtimes, and the derived airtime table.
+AIRTIME = True
+
+# The modules that determine how the json is loaded (which, unlike the rest of the code,
+# we fingerprint by file, so as not to have to import them when the tables are cached)
+LOADER_MODULES = ['frames.py', 'schema.py', 'items.py', 'tables.py']
 
 def load_tables():
-  tables = {}
-  for path in glob.glob('{}/*.json'.format(DATA_ROOT)):
-    fname = os.path.basename(path)
-    name = fname.split('.')[0]
-    df = pd.read_json(path, lines=True)
-    tables[name] = df
-  return tables
+  # (Imported here because it imports scrapy, via items.py, which is slow to import.)
+  from snlscrape import frames
+  # Typed according to the field definitions in items.py (see snlscrape/frames.py)
+  return frames.load_tables(DATA_ROOT, PROCESSES)
 
 def add_indices(tables):
   # Has no effect on final output, but some of the code here relies on these indices, so.
@@ -77,49 +100,27 @@ def enrich_seasons(seasons, episodes):
   seasons['n_episodes'] = n_eps
   
 
-def enrich_casts(casts, seasons, episodes):
+def enrich_casts(casts, seasons, episodes, index=None):
   """Add a column for each cast-year entry with the number of episodes the cast member
   was eligible to appear in in that season. (Normally this will be fixed per season across
   all cast members. The exception is cast members who start late in the season or end their
   run mid-season.)
   """
-  n_eps = []
-  fracs = []
-  for cast in casts.itertuples():
-    first = cast.first_epid
-    if pd.isnull(first):
-      first = seasons.loc[cast.sid, 'first_epid']
-    last = cast.last_epid
-    if pd.isnull(last):
-      last = seasons.loc[cast.sid, 'last_epid']
-    count = eps_in_range(first, last, episodes)
-    n_eps.append(count)
-    frac = count / seasons.loc[cast.sid, 'n_episodes']
-    fracs.append(frac)
+  if index is None:
+    index = TenureIndex.from_casts(casts, seasons, episodes)
+  n_eps = index.n_episodes
   casts['n_episodes'] = n_eps
-  casts['season_fraction'] = fracs
-
-def eps_present_in_casts(cs, seasons, apps):
-  eps = 0
-  for cast in cs.itertuples():
-    season = seasons.loc[cast.sid]
-    if not pd.isnull(cast.first_epid):
-      first = cast.first_epid
-    else:
-      first = season.first_epid
-    if not pd.isnull(cast.last_epid):
-      last = cast.last_epid
-    else:
-      last = season.last_epid
-    present_epids = apps.loc[
-      (apps['aid']==cast.aid) & 
-      (apps['epid'] >= first) & (apps['epid'] <= last),
-      'epid'
-    ].unique()
-    eps += len(present_epids)
-  return eps
-
-def build_tenure(t):
+  casts['season_fraction'] = n_eps / casts['sid'].map(seasons['n_episodes']).values
+
+def eps_present_in_casts(casts, seasons, apps, episodes, index=None):
+  """Return an array with the number of distinct episodes in which the actor for each
+  cast-year entry appeared, within the date range of that entry.
+  """
+  if index is None:
+    index = TenureIndex.from_casts(casts, seasons, episodes)
+  return index.count_present(apps['aid'].values, apps['epid'].values)
+
+def build_tenure(t, keys):
   seasons, apps, actors, casts = t['seasons'], t['appearances'], t['actors'], t['casts']
   # n_eps: how many episodes of SNL were there between this person's start and finish?
   # eps_present: how many episodes of SNL did this person appear in as a cast member?
@@ -128,23 +129,51 @@ def build_tenure(t):
   # Haha, so I guess some performers actually have non-contiguous runs on the show (e.g. Al
   # Franken, so some previous assumptions won't work.)
   cols = ['aid', 'n_episodes', 'eps_present', 'n_seasons']
-  rows = []
-  cast = actors[actors['type']=='cast']
-  for actor in cast.itertuples():
-    aid = actor.aid
-    cast_years = casts[casts['aid'] == aid].sort_values(by='sid')
-    if len(cast_years) == 0:
-      print("Warning: {} was in actors table with type='cast', but they aren't in casts table"\
-        .format(aid))
-      continue
-    n_seasons = len(cast_years)
-    n_episodes = cast_years['n_episodes'].sum()
-    eps_present = eps_present_in_casts(cast_years, seasons, apps)
+  per_year = pd.DataFrame(dict(
+    aid=casts['aid'].values,
+    n_episodes=casts['n_episodes'].values,
+    eps_present=eps_present_in_casts(casts, seasons, apps, t['episodes']),
+  ))
+  by_actor = per_year.groupby('aid', sort=False, observed=True)
+  totals = by_actor[['n_episodes', 'eps_present']].sum()
+  totals['n_seasons'] = by_actor.size()
+  cast = actors.loc[actors['type']=='cast', ['aid']]
+  missing = ~cast['aid'].isin(totals.index)
+  for aid in cast.loc[missing, 'aid']:
+    print("Warning: {} was in actors table with type='cast', but they aren't in casts table"\
+      .format(keys.value('aid', aid)))
+  tenure = cast[~missing].merge(totals, left_on='aid', right_index=True, how='left')
+  return tenure[cols].reset_index(drop=True)
+
 
-    row = [aid, n_episodes, eps_present, n_seasons]
-    rows.append(row)
-  return pd.DataFrame(rows, columns=cols)
 
+# Actor codes get multiplied by this to make (actor, epid) keys that sort by actor, then
+# epid. (Must be greater than any epid code.)
+EPID_SPAN = 10**8
+
+# The columns of the facts table, grouped by the table they come from (apart from
+# is_host, which says whether the actor hosted that episode)
+FACT_COLUMNS = ['sid', 'epid', 'aired', 'epno', 'tid', 'category', 'order',
+  'aid', 'capacity', 'role', 'charid', 'impid', 'voice', 'actor_type', 'gender', 'is_host']
+
+def build_facts(t):
+  """Create a new derived table, facts: the appearances table joined with the titles,
+  episodes and actors tables (and hosts), sorted by sid, epid, tid. i.e. the merge that
+  most analyses of appearances start with, done once.
+  """
+  apps, titles, episodes, actors, hosts = (t['appearances'], t['titles'], t['episodes'],
+    t['actors'], t['hosts'])
+  facts = apps.merge(titles[['tid', 'category', 'order']], on='tid')\
+    .merge(episodes[['epid', 'aired', 'epno']], on='epid')\
+    .merge(actors[['aid', 'type', 'gender']].rename(columns={'type': 'actor_type'}),
+      on='aid', how='left')
+  facts['aired'] = pd.to_datetime(facts['aired'], format='%B %d, %Y')
+  host_keys = hosts['aid'].values.astype('int64') * EPID_SPAN + hosts['epid'].values
+  facts['is_host'] = np.isin(
+    facts['aid'].values.astype('int64') * EPID_SPAN + facts['epid'].values, host_keys)
+  # (A stable sort, so each title's appearances stay in credits order)
+  facts = facts.sort_values(['sid', 'epid', 'tid'], kind='mergesort')
+  return facts[FACT_COLUMNS].reset_index(drop=True)
 
 
 weekend_update_categories = {'Weekend Update', 'Saturday Night News', 'SNL Newsbreak'}
@@ -158,7 +187,7 @@ misc_performer_categories = {'Cold Opening', 'Monologue', 'Miscellaneous'}
 performer_title_categories = set.union(
   misc_performer_categories, weekend_update_categories, live_sketch_categories, recorded_sketch_categories
 )
-def add_airtime_columns(titles, episodes, apps):
+def add_airtime_columns(titles, episodes, apps, keys):
   """Add some derived columns to titles/episodes that are useful when calculating relative 'airtime'
   of cast members and guests.
   """
@@ -167,28 +196,51 @@ def add_airtime_columns(titles, episodes, apps):
   titles['n_performers'] = 0
   # The same as above, but each title is further normalized by number of performers present.
   titles['cast_episode_share'] = 0.0
-  for episode in episodes.itertuples():
-    ep_titles_ix = ((titles['epid']==episode.epid)
-      & (titles['category'].isin(performer_title_categories)))
-    n_titles = ep_titles_ix.sum()
-    if n_titles == 0:
-      print('Warning: Found 0 titles for epid {}. Skipping.'.format(episode.epid))
-      continue
-      
-    titles.loc[ep_titles_ix, 'episode_share'] = 1/n_titles
-    perfs = []
-    for title in titles[ep_titles_ix].itertuples():
-      performer_aids = apps[apps['tid']==title.tid]['aid'].unique()
-      perfs.append(len(performer_aids))
-    titles.loc[ep_titles_ix, 'n_performers'] = perfs
-    titles.loc[ep_titles_ix, 'cast_episode_share'] = (
-      titles.loc[ep_titles_ix, 'episode_share'] 
-      / 
-      titles.loc[ep_titles_ix, 'n_performers']
-    )
-
-import gender_guesser.detector as gender
-detector = gender.Detector()
+  eligible = (titles['category'].isin(performer_title_categories)
+    & titles['epid'].isin(episodes['epid']))
+  for epid in episodes.loc[~episodes['epid'].isin(titles.loc[eligible, 'epid']), 'epid']:
+    print('Warning: Found 0 titles for epid {}. Skipping.'.format(keys.value('epid', epid)))
+
+  n_titles = titles.loc[eligible].groupby('epid')['tid'].transform('size')
+  titles.loc[eligible, 'episode_share'] = 1 / n_titles
+  performers = apps.groupby('tid')['aid'].nunique()
+  titles.loc[eligible, 'n_performers'] = titles.loc[eligible, 'tid'].map(performers)\
+      .fillna(0).astype('int64')
+  titles.loc[eligible, 'cast_episode_share'] = (
+    titles.loc[eligible, 'episode_share']
+    /
+    titles.loc[eligible, 'n_performers']
+  )
+
+def build_airtime(t):
+  """Create a new derived table, airtime, with a row for each actor and season in which
+  they performed, giving the number of (airtime-eligible) titles and episodes they
+  appeared in, and the sums of the episode_share and cast_episode_share of those titles.
+  Requires the columns added by add_airtime_columns.
+  """
+  titles, apps = t['titles'], t['appearances']
+  eligible = titles.loc[titles['episode_share'] > 0,
+    ['tid', 'episode_share', 'cast_episode_share']]
+  # Count an actor only once per title, even if they had more than one role in it
+  mg = apps[['aid', 'tid', 'epid', 'sid']].drop_duplicates(['aid', 'tid'])\
+    .merge(eligible, on='tid')
+  by_actor_season = mg.groupby(['aid', 'sid'], observed=True)
+  airtime = by_actor_season.agg({'tid': 'size', 'epid': 'nunique',
+    'episode_share': 'sum', 'cast_episode_share': 'sum'})
+  airtime = airtime.rename(columns={'tid': 'n_titles', 'epid': 'n_episodes'}).reset_index()
+  return airtime[['aid', 'sid', 'n_titles', 'n_episodes', 'episode_share', 'cast_episode_share']]
+
+_detector = None
+
+def get_detector():
+  """gender_guesser's detector. Built on first use, since building it means parsing
+  gender_guesser's whole name dictionary (which is slow, and often unnecessary - see
+  genderize_all)."""
+  global _detector
+  if _detector is None:
+    import gender_guesser.detector as gender
+    _detector = gender.Detector()
+  return _detector
 
 def names_from_file(fname):
   with open(fname) as f:
@@ -206,40 +258,99 @@ extra_femalenames = {
   'Anjelica', 'Oprah', 'Ann-Margret',
 }
 
-# Names misgendered by gender_guesser (or labelled as androgynous/unknown)
+# Names misgendered by gender_guesser (or labelled as androgynous/unknown), plus the
+# ones listed in these files (see fullname_overrides)
+FEMALE_NAMES_FNAME = 'female_names.txt'
+MALE_NAMES_FNAME = 'male_names.txt'
 female_fullnames = {
   'Blake Lively', 'Terry Turner', 'Dakota Johnson', 'Cameron Diaz', 'Taylor Swift',
   'Robin Wright', 'Sydney Biddle Barrows', 'Whitney Houston', 'Morgan Fairchild',
   'Reese Witherspoon',
   'Casey Wilson', 'Nasim Pedrad', 'Noel Wells', 'Jan Hooks', 'Robin Duke',
-}.union(names_from_file('female_names.txt'))
+}
 male_fullnames = {
   'Kyle Gass', 'The Rock', 'Jamie Foxx', 'Kelsey Grammer', 'Leslie Nielsen',
   'Kyle MacLachlan', 'Desi Arnaz Jr.', 'Desi Arnaz', 'Kyle Mooney', 'The Weeknd',
   'Bernie Sanders', 'Sacha Baron Cohen', 'A. Whitney Brown', 'Finesse Mitchell',
   'Dana Carvey', 'Tracy Morgan',
   'Fran Tarkenton', 'Ashton Kutcher', 'Jackie Chan',
-}.union(names_from_file('male_names.txt'))
+}
 # A few interesting cases: Dame Edna, RuPaul, Marilyn Manson, T.J. Jourian (transman). 
 # I labelled as ffmm, respectively.
 
-def genderize(name, confident=True):
-  if name in female_fullnames:
+_fullname_overrides = None
+
+def fullname_overrides():
+  """Return the sets of full names we know to be female and male."""
+  global _fullname_overrides
+  if _fullname_overrides is None:
+    _fullname_overrides = (female_fullnames.union(names_from_file(FEMALE_NAMES_FNAME)),
+        male_fullnames.union(names_from_file(MALE_NAMES_FNAME)))
+  return _fullname_overrides
+
+def gender_override(name):
+  """Return the gender of the named person according to our manual corrections, or
+  None if it's up to gender_guesser."""
+  female, male = fullname_overrides()
+  if name in female:
     return 'female'
-  if name in male_fullnames:
+  if name in male:
     return 'male'
   first = name.split()[0]
   if first in extra_malenames:
     return 'male'
   if first in extra_femalenames:
     return 'female'
-  guess = detector.get_gender(first)
+  return None
+
+def from_guess(guess, confident):
   if confident and guess == 'mostly_male':
     return 'male'
   if confident and guess == 'mostly_female':
     return 'female'
   return guess
 
+def gender_fingerprint(confident):
+  """Changes whenever any of the manual corrections do."""
+  female, male = fullname_overrides()
+  h = hashlib.sha1(json.dumps([confident, extra_malenames, extra_femalenames, female, male],
+      default=sorted).encode('utf-8'))
+  return h.hexdigest()
+
+def genderize_all(names, cache_path=None, confident=True):
+  """Return a dict mapping each of the given names to its gender: our manual correction,
+  if there is one, or else gender_guesser's guess from their first name. Each distinct
+  first name is only looked up once, and, if cache_path is given, the results are saved
+  there, and reused by later calls (unless the manual corrections have since changed) -
+  so the detector is only needed for names we haven't seen before.
+  """
+  fingerprint = gender_fingerprint(confident)
+  cached = {}
+  if cache_path is not None and os.path.exists(cache_path):
+    with io.open(cache_path, encoding='utf-8') as f:
+      saved = json.load(f)
+    if saved['fingerprint'] == fingerprint:
+      cached = saved['genders']
+  genders = {}
+  guesses = {}
+  for name in set(names):
+    if name in cached:
+      genders[name] = cached[name]
+      continue
+    gender = gender_override(name)
+    if gender is None:
+      first = name.split()[0]
+      if first not in guesses:
+        guesses[first] = get_detector().get_gender(first)
+      gender = from_guess(guesses[first], confident)
+    genders[name] = gender
+  if cache_path is not None and not set(genders) <= set(cached):
+    cached.update(genders)
+    with io.open(cache_path, 'w', encoding='utf-8') as f:
+      f.write(json.dumps(dict(fingerprint=fingerprint, genders=cached), ensure_ascii=False,
+        sort_keys=True))
+  return genders
+
 def correct_errors(tables):
   casts = tables['casts']
   # According to Wikipedia, George Coe was only credited for SNL's very first episode
@@ -250,25 +361,161 @@ def correct_errors(tables):
   # egregious - it seems to be the only time when cast members joined/left mid-season
   # and snlarchive didn't note it at all.
 
-def save_tables(t):
-  for name, df in t.items():
-    fname = name + '.csv'
-    path = os.path.join(OUTPUT_ROOT, fname)
-    df.to_csv(path, encoding='utf-8', index=False)
-
-def main():
-  tables = load_tables()
-  add_indices(tables)
-  correct_errors(tables)
-  add_merge_cols(tables)
-  enrich_seasons(tables['seasons'], tables['episodes'])
-  enrich_casts(tables['casts'], tables['seasons'], tables['episodes'])
-  t = tables
+def save_table(name, df, keys):
+  df = df.copy()
+  keys.decode_tables({name: df})
+  df.to_csv(os.path.join(OUTPUT_ROOT, name + '.csv'), encoding='utf-8', index=False)
+
+# The steps above, as a graph of stages whose outputs are cached (see snlscrape/stages.py).
+# Each takes the outputs of the stages it depends on, and returns the tables it changed
+# (as new DataFrames - the inputs are shared with other stages and the cache).
+
+def copy_tables(inputs, names):
+  return {name: inputs[name].copy() for name in names}
+
+def load_stage(inputs):
+  return load_tables()
+
+def correct_stage(inputs):
+  t = copy_tables(inputs, ['casts'])
+  correct_errors(t)
+  return t
+
+def encode_stage(inputs):
+  t = copy_tables(inputs, inputs)
+  keys = KeyDictionary.from_tables(t)
+  keys.encode_tables(t)
+  add_indices(t)
+  t['keys'] = keys
+  return t
+
+def merge_cols_stage(inputs):
+  t = dict(inputs)
+  add_merge_cols(t)
+  return dict(appearances=t['appearances'], titles=t['titles'])
+
+def enrich_seasons_stage(inputs):
+  seasons = inputs['seasons'].copy()
+  enrich_seasons(seasons, inputs['episodes'])
+  return dict(seasons=seasons)
+
+def enrich_casts_stage(inputs):
+  casts = inputs['casts'].copy()
+  enrich_casts(casts, inputs['seasons'], inputs['episodes'])
+  return dict(casts=casts)
+
+def airtime_stage(inputs):
+  t = dict(inputs, titles=inputs['titles'].copy())
+  add_airtime_columns(t['titles'], t['episodes'], t['appearances'], t['keys'])
+  return dict(titles=t['titles'], airtime=build_airtime(t))
+
+def tenure_stage(inputs):
+  return dict(tenure=build_tenure(inputs, inputs['keys']))
+
+def facts_stage(inputs):
+  return dict(facts=build_facts(inputs))
+
+def gender_stage(inputs):
+  actors = inputs['actors'].copy()
+  names = inputs['keys'].decode('aid', actors['aid']).astype(object)
+  if not os.path.isdir(cache_dir()):
+    os.makedirs(cache_dir())
+  genders = genderize_all(names, os.path.join(cache_dir(), GENDERS_FNAME))
+  actors['gender'] = names.map(genders)
+  return dict(actors=actors)
+
+def save_stage(inputs):
+  """Write every table to a csv - except those that haven't changed since they were
+  last written."""
+  manifest_path = os.path.join(cache_dir(), 'saved.json')
+  saved = {}
+  if os.path.exists(manifest_path):
+    with open(manifest_path) as f:
+      saved = json.load(f)
+  code = inputs.graph.code_fingerprint(inputs.stage.name)
+  keys_fingerprint = inputs.fingerprint('keys')
+  for name in sorted(inputs):
+    fname = name + '.csv' if name != 'keys' else KeyDictionary.FNAME
+    fingerprint = '{} {} {}'.format(code, keys_fingerprint, inputs.fingerprint(name))
+    if (not inputs.graph.force and saved.get(fname) == fingerprint
+        and os.path.exists(os.path.join(OUTPUT_ROOT, fname))):
+      continue
+    if name == 'keys':
+      inputs['keys'].save(os.path.join(OUTPUT_ROOT, fname))
+    else:
+      save_table(name, inputs[name], inputs['keys'])
+    saved[fname] = fingerprint
+  with open(manifest_path, 'w') as f:
+    json.dump(saved, f, indent=1, sort_keys=True)
+  return {}
+
+CACHE_DIRNAME = '.convert_cache'
+# Saved by genderize_all, in the cache dir
+GENDERS_FNAME = 'genders.json'
+
+def cache_dir():
+  return os.path.join(OUTPUT_ROOT, CACHE_DIRNAME)
+
+def build_stages():
+  json_tables = list_tables(DATA_ROOT)
+  json_tables.pop(os.path.splitext(KeyDictionary.FNAME)[0], None)
+  table_names = sorted(json_tables)
+  module_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snlscrape')
+  # KeyDictionary and TenureIndex rely on module-level helpers, so the stages using them
+  # fingerprint their whole modules
+  tenure_files = [os.path.join(module_dir, 'tenure.py')]
+  stages = [
+    Stage('load', load_stage, outputs=table_names,
+      files=[path for name in table_names for path in json_tables[name]]
+        + [os.path.join(module_dir, fname) for fname in LOADER_MODULES],
+      code=[load_tables]),
+    Stage('correct_errors', correct_stage, ['load'], ['casts'],
+      code=[correct_errors, copy_tables]),
+    Stage('encode', encode_stage, ['load', 'correct_errors'], table_names + ['keys'],
+      files=[os.path.join(module_dir, 'keys.py')], code=[copy_tables, add_indices]),
+    Stage('add_merge_cols', merge_cols_stage, ['encode'], ['appearances', 'titles'],
+      code=[add_merge_cols]),
+    Stage('enrich_seasons', enrich_seasons_stage, ['encode'], ['seasons'], code=[enrich_seasons]),
+    Stage('enrich_casts', enrich_casts_stage, ['encode', 'enrich_seasons'], ['casts'],
+      files=tenure_files, code=[enrich_casts]),
+    Stage('build_tenure', tenure_stage,
+      ['encode', 'add_merge_cols', 'enrich_seasons', 'enrich_casts'], ['tenure'],
+      files=tenure_files, code=[build_tenure, eps_present_in_casts]),
+    Stage('genderize', gender_stage, ['encode'], ['actors'],
+      files=[FEMALE_NAMES_FNAME, MALE_NAMES_FNAME],
+      code=[genderize_all, gender_override, from_guess, gender_fingerprint, get_detector,
+        fullname_overrides, names_from_file],
+      params=dict(extra_malenames=extra_malenames, extra_femalenames=extra_femalenames,
+        female_fullnames=female_fullnames, male_fullnames=male_fullnames)),
+    Stage('build_facts', facts_stage, ['encode', 'add_merge_cols', 'genderize'], ['facts'],
+      code=[build_facts], params=dict(columns=FACT_COLUMNS, epid_span=EPID_SPAN)),
+  ]
   if AIRTIME:
-    add_airtime_columns(t['titles'], t['episodes'], t['appearances'])
-  t['tenure'] = build_tenure(t)
-  t['actors']['gender'] = t['actors']['aid'].apply(genderize)
-  save_tables(t)
+    stages.append(Stage('airtime', airtime_stage, ['encode', 'add_merge_cols'],
+      ['titles', 'airtime'], code=[add_airtime_columns, build_airtime],
+      params=dict(performer_title_categories=performer_title_categories)))
+  stages.append(Stage('save', save_stage, [stage.name for stage in stages],
+    code=[save_table], cached=False))
+  return stages
+
+def main(args=None):
+  parser = argparse.ArgumentParser(description='Convert the scraped json files to csvs.')
+  parser.add_argument('--stage', default='save',
+      help='Run only up to the given stage (default: save, i.e. everything)')
+  parser.add_argument('--force', action='store_true',
+      help='Ignore cached stage outputs and re-run everything')
+  parser.add_argument('--list', action='store_true',
+      help='List the stages, marking those that would be re-run')
+  args = parser.parse_args(args)
+  graph = StageGraph(build_stages(), cache_dir(), force=args.force)
+  if args.stage not in graph.stages:
+    parser.error('Unknown stage {} (should be one of {})'.format(args.stage, ', '.join(graph.order)))
+  if args.list:
+    stale = graph.stale(args.stage)
+    for name in graph.order:
+      print('{} {}'.format('*' if name in stale else ' ', name))
+    return
+  graph.output(args.stage)
 
 if __name__ == '__main__':
-  main()
\ No newline at end of file
+  main()
@@ -1,8 +1,13 @@
 #!/bin/bash
 
+# If a crawl is interrupted, re-running this script resumes it from its last 
+# checkpoint in the jobs directory. (Tables in the output directory are only
+# replaced once a spider finishes.)
+JOBS="-s SNL_JOB_DIR=jobs"
+
 # This spider is mainly responsible for crawling the content from snlarchive 
 # pages for Episodes and their Titles (sketches). Also, IMDB ratings of episodes.
-scrapy crawl snlspider
+scrapy crawl snlspider $JOBS
 # This spider is just responsible for crawling Cast items - who was on the cast 
 # of which seasons, when did they start/end, etc.
-scrapy crawl castspider
+scrapy crawl castspider $JOBS
@@ -0,0 +1,242 @@
+"""An index of which actors have appeared together in the same titles (sketches,
+monologues...), for questions like "who did Kate McKinnon share the most sketches with".
+
+It's built from the actor x title incidence matrix B of the appearances table (B[a, t]
+is 1 if actor a appeared in title t, however many roles they had in it) as the sparse
+actor x actor matrix B B^T, whose entry [a, b] is the number of titles a and b were
+both in (and whose diagonal is the number of titles each actor was in). One matrix is
+kept per season, so that:
+  - queries can be restricted to any set of seasons
+  - new (or re-scraped) titles only mean recomputing the matrices of their seasons
+An index can also be restricted to appearances in certain capacities (e.g. only
+counting cast members' appearances).
+
+load_index keeps the index saved in <data_root>/.coappear_cache, and brings it up to
+date with any appearances files that have changed since, so that queries are
+instant:
+
+  index = load_index('output')
+  index.top_partners('Kate McKinnon', 5)
+  index.pair_count('Kate McKinnon', 'Aidy Bryant', sids=range(38, 43))
+  index.season_graph(40) # the season's actor x actor matrix
+"""
+import heapq
+import json
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+from snlscrape import helpers, tables
+from snlscrape.stages import hash_file
+
+CACHE_DIRNAME = '.coappear_cache'
+
+def season_pairs(rows, capacities=None):
+  """Return a dict mapping sid to the (aid, tid) pairs of the given appearances rows
+  in that season (only counting those in the given capacities, if any)."""
+  pairs = {}
+  sids = {}
+  for row in rows:
+    if capacities is not None and row.get('capacity') not in capacities:
+      continue
+    tid = row['tid']
+    epid = helpers.Epid.from_tid(tid)
+    if epid not in sids:
+      sids[epid] = helpers.Sid.from_epid(epid)
+    pairs.setdefault(sids[epid], []).append((row['aid'], int(tid)))
+  return pairs
+
+def coappearances(aids, tids, n_actors):
+  """The actor x actor co-appearance matrix for the given (distinct) incidence pairs of
+  actor codes and tids."""
+  title_codes = np.unique(tids, return_inverse=True)[1].ravel()
+  incidence = sp.csr_matrix((np.ones(len(aids), dtype='int32'), (aids, title_codes)),
+      shape=(n_actors, title_codes.max() + 1 if len(title_codes) else 0))
+  return (incidence @ incidence.T).tocsr()
+
+def padded(matrix, n):
+  """The given square matrix, extended with empty rows and columns to n x n (for
+  matrices built before more actors were added to the index)."""
+  if matrix.shape[0] == n:
+    return matrix
+  matrix = matrix.copy()
+  matrix.resize((n, n))
+  return matrix
+
+class CoappearanceIndex(object):
+
+  def __init__(self, capacities=None):
+    self.capacities = frozenset(capacities) if capacities else None
+    # code -> aid, and back
+    self.actors = []
+    self.codes = {}
+    # sid -> (actor codes, tids): the season's distinct incidence pairs, sorted by tid
+    self.incidence = {}
+    # sid -> the season's co-appearance matrix
+    self.graphs = {}
+    # path (relative to the data root) -> [hash, sids] for each appearances file the
+    # index is up to date with (see load_index)
+    self.sources = {}
+    # The sum of all the seasons' matrices, once computed
+    self._total = None
+
+  def actor_codes(self, aids):
+    for aid in aids:
+      if aid not in self.codes:
+        self.codes[aid] = len(self.actors)
+        self.actors.append(aid)
+    return np.array([self.codes[aid] for aid in aids], dtype='int32')
+
+  def set_season(self, sid, pairs):
+    """Make the given (aid, tid) pairs the season's appearances. Returns whether that
+    changed anything."""
+    aids = self.actor_codes([aid for (aid, _) in pairs])
+    tids = np.array([tid for (_, tid) in pairs], dtype='int64')
+    # Distinct pairs, in order of tid (so that unchanged seasons compare equal)
+    keys = np.unique(tids * len(self.actors) + aids)
+    aids, tids = (keys % len(self.actors)).astype('int32'), keys // len(self.actors)
+    old = self.incidence.get(sid)
+    if old is not None and np.array_equal(old[0], aids) and np.array_equal(old[1], tids):
+      return False
+    self.incidence[sid] = (aids, tids)
+    self.graphs[sid] = coappearances(aids, tids, len(self.actors))
+    self._total = None
+    return True
+
+  def drop_season(self, sid):
+    self.incidence.pop(sid, None)
+    self.graphs.pop(sid, None)
+    self._total = None
+
+  def add(self, rows):
+    """Add the given appearances rows (dicts with aid, tid and capacity), replacing
+    any previous appearances in the same titles. Only the matrices of the seasons of
+    those titles are recomputed."""
+    for sid, pairs in season_pairs(rows, self.capacities).items():
+      new_tids = set(tid for (_, tid) in pairs)
+      if sid in self.incidence:
+        aids, tids = self.incidence[sid]
+        pairs = [(self.actors[aid], tid) for (aid, tid) in zip(aids.tolist(), tids.tolist())
+          if tid not in new_tids] + pairs
+      self.set_season(sid, pairs)
+
+  @property
+  def sids(self):
+    return sorted(self.graphs)
+
+  def graph(self, sids=None):
+    """The co-appearance matrix summed over the given seasons (by default, all of them)."""
+    if sids is None and self._total is not None:
+      return self._total
+    n = len(self.actors)
+    total = sp.csr_matrix((n, n), dtype='int32')
+    for sid in (self.sids if sids is None else sids):
+      if sid in self.graphs:
+        total = total + padded(self.graphs[sid], n)
+    if sids is None:
+      self._total = total
+    return total
+
+  def season_graph(self, sid):
+    return padded(self.graphs[sid], len(self.actors)) if sid in self.graphs \
+      else sp.csr_matrix((len(self.actors), len(self.actors)), dtype='int32')
+
+  def top_partners(self, aid, k=5, sids=None):
+    """The k actors who appeared in the most titles with aid, as (aid, count) pairs, most
+    first (and ties in order of aid)."""
+    if aid not in self.codes:
+      return []
+    code = self.codes[aid]
+    graph = self.graph(sids)
+    row = slice(graph.indptr[code], graph.indptr[code + 1])
+    partners = ((self.actors[other], n) for (other, n)
+        in zip(graph.indices[row].tolist(), graph.data[row].tolist())
+        if other != code and n)
+    return heapq.nsmallest(k, partners, key=lambda pair: (-pair[1], pair[0]))
+
+  def pair_count(self, aid1, aid2, sids=None):
+    """The number of titles both actors appeared in."""
+    if aid1 not in self.codes or aid2 not in self.codes:
+      return 0
+    code1, code2 = self.codes[aid1], self.codes[aid2]
+    return int(sum(self.graphs[sid][code1, code2] for sid in (self.sids if sids is None else sids)
+      if sid in self.graphs and max(code1, code2) < self.graphs[sid].shape[0]))
+
+  def save(self, path):
+    arrays = dict(
+      meta=np.array(json.dumps(dict(
+        capacities=sorted(self.capacities) if self.capacities else None,
+        sids=self.sids, sources=self.sources))),
+      actors=np.array(self.actors, dtype='U'),
+    )
+    for sid in self.sids:
+      graph = self.graphs[sid]
+      arrays.update({
+        '{}.aids'.format(sid): self.incidence[sid][0],
+        '{}.tids'.format(sid): self.incidence[sid][1],
+        '{}.n'.format(sid): np.array(graph.shape[0]),
+        '{}.data'.format(sid): graph.data,
+        '{}.indices'.format(sid): graph.indices,
+        '{}.indptr'.format(sid): graph.indptr,
+      })
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+      np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+  @classmethod
+  def load(cls, path):
+    with np.load(path) as arrays:
+      meta = json.loads(arrays['meta'].item())
+      index = cls(meta['capacities'])
+      index.actors = arrays['actors'].tolist()
+      index.codes = {aid: code for (code, aid) in enumerate(index.actors)}
+      index.sources = meta['sources']
+      for sid in meta['sids']:
+        n = int(arrays['{}.n'.format(sid)])
+        index.incidence[sid] = (arrays['{}.aids'.format(sid)], arrays['{}.tids'.format(sid)])
+        index.graphs[sid] = sp.csr_matrix((arrays['{}.data'.format(sid)],
+          arrays['{}.indices'.format(sid)], arrays['{}.indptr'.format(sid)]), shape=(n, n))
+    return index
+
+def cache_path(cache_dir, capacities=None):
+  name = 'index-{}.npz'.format('-'.join(sorted(capacities)) if capacities else 'all')
+  return os.path.join(cache_dir, name)
+
+def sync(index, data_root):
+  """Bring the index up to date with the appearances files in data_root, re-reading only
+  the files that have changed since it was last synced (and recomputing only the
+  seasons whose appearances have changed). Returns whether anything changed."""
+  changed = False
+  paths = {os.path.relpath(path, data_root): path
+    for path in tables.table_paths(data_root, 'appearances')}
+  for key in sorted(set(index.sources) - set(paths)):
+    for sid in index.sources.pop(key)[1]:
+      index.drop_season(sid)
+    changed = True
+  for key, path in sorted(paths.items()):
+    digest = hash_file(path)
+    if index.sources.get(key, [None])[0] == digest:
+      continue
+    pairs = season_pairs(tables.read_rows(path), index.capacities)
+    old_sids = index.sources.get(key, [None, []])[1]
+    for sid in set(old_sids) - set(pairs):
+      index.drop_season(sid)
+    for sid in sorted(pairs):
+      index.set_season(sid, pairs[sid])
+    index.sources[key] = [digest, sorted(pairs)]
+    changed = True
+  return changed
+
+def load_index(data_root='output', capacities=None, cache_dir=None):
+  """Return the co-appearance index of the appearances in data_root (optionally only
+  counting the given capacities), up to date with the files there."""
+  path = cache_path(cache_dir or os.path.join(data_root, CACHE_DIRNAME), capacities)
+  index = CoappearanceIndex.load(path) if os.path.exists(path) \
+    else CoappearanceIndex(capacities)
+  if sync(index, data_root):
+    if not os.path.isdir(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path))
+    index.save(path)
+  return index
@@ -0,0 +1,36 @@
+from collections import defaultdict
+
+class SeenRegistry(object):
+  """Records the keys (see BaseSnlItem.pkey) of the dedupable entities seen so far
+  during a crawl.
+
+  SnlSpider consults one of these before yielding an Actor, Sketch, Character or
+  Impression, so that repeat sightings never make it out of the spider. (Otherwise
+  each one would go through scrapy's item machinery only to be dropped by
+  EntityDedupePipeline, which sticks around as a safety net.)
+  """
+
+  def __init__(self, stats=None):
+    # item class name -> set of keys
+    self.keys = defaultdict(set)
+    self.stats = stats
+
+  def first_sighting(self, item_class, key):
+    """Return True if this is the first time we've seen an item of the given class
+    with the given key (and remember it), otherwise False.
+    """
+    cache = self.keys[item_class.__name__]
+    if key in cache:
+      if self.stats is not None:
+        self.stats.inc_value('snl_dedupe/avoided')
+        self.stats.inc_value('snl_dedupe/avoided/{}'.format(item_class.__name__))
+      return False
+    cache.add(key)
+    return True
+
+  def checkpoint_state(self):
+    return {classname: list(keys) for classname, keys in self.keys.items()}
+
+  def restore(self, state):
+    for classname, keys in (state or {}).items():
+      self.keys[classname].update(keys)
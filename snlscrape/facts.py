@@ -0,0 +1,51 @@
+"""Load the facts table written by convert_json_to_csv.py: a row per appearance,
+joined with the title, episode and actor it belongs to. e.g. the most appearances by
+anyone in a single season is just
+
+  facts = load_facts()
+  facts.groupby(['sid', 'aid'], observed=True).size().sort_values().tail(1)
+
+The first load after the csv is (re)written parses it, and saves it as a snapshot (see
+snapshot.py) in <data_root>/.facts_cache. Later loads, in any session, just
+memory-map the snapshot, until the csv changes again.
+"""
+import os
+import shutil
+
+import pandas as pd
+
+from snlscrape import snapshot
+from snlscrape.stages import hash_file
+
+FNAME = 'facts.csv'
+CACHE_DIRNAME = '.facts_cache'
+
+# Columns that pandas would otherwise load as strings (or, for nullable ints, floats)
+DTYPES = dict(
+    aid='category',
+    category='category',
+    capacity='category',
+    actor_type='category',
+    gender='category',
+    charid='Int64',
+    impid='Int64',
+)
+
+def read_facts(path):
+  """Parse the facts csv at path."""
+  return pd.read_csv(path, encoding='utf-8', dtype=DTYPES, parse_dates=['aired'])
+
+def load_facts(data_root='output', cache_dir=None):
+  """Return the facts table in data_root as a DataFrame."""
+  path = os.path.join(data_root, FNAME)
+  cache_dir = cache_dir or os.path.join(data_root, CACHE_DIRNAME)
+  # Named for the csv's contents, so a stale snapshot is never found
+  snapshot_path = os.path.join(cache_dir, 'facts-' + hash_file(path)[:16])
+  if not os.path.exists(snapshot_path):
+    facts = read_facts(path)
+    if os.path.isdir(cache_dir):
+      shutil.rmtree(cache_dir)
+    os.makedirs(cache_dir)
+    snapshot.write_snapshot(dict(facts=facts), snapshot_path)
+  # (Loaded back from the snapshot even the first time, so the types are always the same)
+  return snapshot.load_snapshot(snapshot_path)['facts']
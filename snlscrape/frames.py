@@ -0,0 +1,188 @@
+"""Load the exported json-lines tables as pandas DataFrames, with column types given
+by the field metadata in items.py (see schema.py), rather than whatever pandas would
+guess. In particular:
+  - ids like epids and tids are always integers (nullable, if the field is optional)
+  - fields with a fixed set of possible values are categoricals
+  - actor names ('interned' fields) are categoricals sharing the same categories across
+    every table, so merges on them compare integer codes
+
+Tables are read a row at a time, straight into compact per-column buffers, so we
+never hold a whole table's worth of parsed json objects at once. Tables that are
+sharded by season (see SNL_SHARD_BY_SEASON) are loaded a shard per process, and then
+concatenated.
+"""
+import array
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from snlscrape import keys, schema, tables
+
+class Column(object):
+  """Accumulates the values of an untyped column."""
+
+  def __init__(self, n_missing=0):
+    self.values = [None] * n_missing
+
+  def append(self, value):
+    self.values.append(value)
+
+  def finish(self):
+    return pd.Series(self.values)
+
+class ObjectColumn(Column):
+
+  def finish(self):
+    return pd.Series(self.values, dtype=object)
+
+class IntColumn(Column):
+
+  def __init__(self, n_missing=0, optional=False):
+    self.values = array.array('q', [0] * n_missing)
+    self.mask = bytearray([1] * n_missing)
+    self.optional = optional
+
+  def append(self, value):
+    if value is None:
+      self.values.append(0)
+      self.mask.append(1)
+    else:
+      self.values.append(int(value))
+      self.mask.append(0)
+
+  def finish(self):
+    values = np.frombuffer(self.values, dtype='int64') if len(self.values) else np.zeros(0, 'int64')
+    mask = np.frombuffer(bytes(self.mask), dtype=bool) if len(self.mask) else np.zeros(0, bool)
+    if self.optional or mask.any():
+      return pd.Series(pd.arrays.IntegerArray(values.copy(), mask.copy()))
+    return pd.Series(values.copy())
+
+class BoolColumn(Column):
+
+  def finish(self):
+    if any(value is None for value in self.values):
+      return pd.Series(pd.array(self.values, dtype='boolean'))
+    return pd.Series(np.array(self.values, dtype=bool))
+
+class CategoryColumn(Column):
+  """Stores each distinct value once, plus an integer code per row."""
+
+  def __init__(self, n_missing=0, possible_values=()):
+    self.codes = array.array('i', [-1] * n_missing)
+    self.code_for = {}
+    self.possible_values = possible_values
+
+  def append(self, value):
+    if value is None:
+      self.codes.append(-1)
+      return
+    code = self.code_for.get(value)
+    if code is None:
+      code = self.code_for[value] = len(self.code_for)
+    self.codes.append(code)
+
+  def finish(self):
+    categories = sorted(set(self.code_for) | set(self.possible_values))
+    # Map codes (in order of first appearance) to positions in the sorted categories
+    remap = np.empty(len(self.code_for) + 1, dtype='int32')
+    position = {value: i for (i, value) in enumerate(categories)}
+    for value, code in self.code_for.items():
+      remap[code] = position[value]
+    remap[-1] = -1
+    codes = np.frombuffer(self.codes, dtype='int32') if len(self.codes) else np.zeros(0, 'int32')
+    return pd.Series(pd.Categorical.from_codes(remap[codes], categories=categories))
+
+def new_column(field, n_missing):
+  if field is None:
+    return Column(n_missing)
+  ltype = schema.logical_type(field)
+  if ltype == schema.INT:
+    return IntColumn(n_missing, optional=bool(field.get('optional')))
+  if ltype == schema.BOOL:
+    return BoolColumn(n_missing)
+  if ltype == schema.CATEGORY:
+    return CategoryColumn(n_missing, field.get('possible_values', ()))
+  return ObjectColumn(n_missing)
+
+def load_table(path, item_class=None):
+  """Load the json-lines table at path as a DataFrame, typed according to the fields
+  of item_class. Columns appear in the order in which they're first seen in the file.
+  """
+  fields = item_class.fields if item_class is not None else {}
+  columns = {}
+  n_rows = 0
+  for row in tables.read_rows(path):
+    for name, value in row.items():
+      if name not in columns:
+        columns[name] = new_column(fields.get(name), n_rows)
+      columns[name].append(value)
+    n_rows += 1
+    for name, column in columns.items():
+      if name not in row:
+        column.append(None)
+  return pd.DataFrame({name: column.finish() for (name, column) in columns.items()},
+      columns=list(columns))
+
+def share_categories(dfs, colname):
+  """Give all the (categorical) columns with the given name the same categories."""
+  cols = [df[colname] for df in dfs if colname in df and hasattr(df[colname], 'cat')]
+  categories = sorted(set().union(*[col.cat.categories for col in cols]))
+  for df in dfs:
+    if colname in df and hasattr(df[colname], 'cat'):
+      df[colname] = df[colname].cat.set_categories(categories)
+
+def concat_tables(dfs, item_class=None):
+  """Concatenate DataFrames loaded from the shards of a table, typing the columns just
+  as load_table would if they'd all been in one file."""
+  fields = item_class.fields if item_class is not None else {}
+  columns = []
+  for df in dfs:
+    columns += [colname for colname in df.columns if colname not in columns]
+  combined = {}
+  for colname in columns:
+    parts = [df[colname] if colname in df else new_column(fields.get(colname), len(df)).finish()
+      for df in dfs]
+    if all(hasattr(part, 'cat') for part in parts):
+      # (Merges the categories and remaps the codes, rather than going via object)
+      combined[colname] = pd.Series(union_categoricals(parts, sort_categories=True))
+    else:
+      combined[colname] = pd.concat(parts, ignore_index=True)
+  return pd.DataFrame(combined, columns=columns)
+
+def _load_table(args):
+  return load_table(*args)
+
+def load_tables(data_root, processes=None):
+  """Return a dict mapping table name to DataFrame for every json table in data_root
+  (compressed or not). Sharded tables are loaded using a pool of the given number of
+  processes (by default, one per cpu)."""
+  classes = {tables.table_name(cls): cls for cls in schema.item_classes()}
+  tasks = []
+  for name, paths in tables.list_tables(data_root).items():
+    # (convert_json_to_csv.py saves its key dictionary alongside the tables)
+    if paths == [os.path.join(data_root, keys.KeyDictionary.FNAME)]:
+      continue
+    tasks += [(name, (path, classes.get(name))) for path in paths]
+  processes = processes or multiprocessing.cpu_count()
+  if processes == 1 or len(tasks) == len(set(name for (name, _) in tasks)):
+    # Nothing's sharded - not worth starting a pool
+    results = map(_load_table, [args for (_, args) in tasks])
+  else:
+    pool = multiprocessing.Pool(processes)
+    results = pool.map(_load_table, [args for (_, args) in tasks])
+    pool.close()
+    pool.join()
+  shards = {}
+  for (name, _), df in zip(tasks, results):
+    shards.setdefault(name, []).append(df)
+  dfs = {}
+  for name, parts in shards.items():
+    dfs[name] = parts[0] if len(parts) == 1 else concat_tables(parts, classes.get(name))
+  interned = set(fieldname for cls in classes.values()
+      for fieldname, field in cls.fields.items() if field.get('interned'))
+  for colname in sorted(interned):
+    share_categories(list(dfs.values()), colname)
+  return dfs
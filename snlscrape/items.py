@@ -9,25 +9,76 @@ import scrapy
 # basestring in python 2 and str in python 3
 from six import string_types
 
-class BaseSnlItem(scrapy.Item):
-  
+from snlscrape import helpers
+from snlscrape.records import Record
+
+# Some field metadata that's only used when loading the exported tables (see schema.py):
+#   - numeric_id: the value is a string of digits (e.g. an epid), and can be loaded as an integer
+#   - interned: the same values recur across many rows (and tables), e.g. actor names
+
+class SnlItemMixin(object):
+  """Methods shared by all our item classes, whether Items or Records (see below)."""
+  __slots__ = ()
+
+  # Does every item of this class belong to a single season? If so, its table can be
+  # split into a file per season (see SNL_SHARD_BY_SEASON).
+  season_scoped = False
+
   @classmethod
   def dedupable(cls):
     return cls.key_field() is not None
 
   @classmethod
   def key_field(cls):
-    for fieldname, meta in cls.fields.items():
-      if 'pkey' in meta:
-        return fieldname
+    # Cached per class. (Checking cls.__dict__ rather than using getattr, so that a
+    # subclass doesn't pick up its parent's cached value.)
+    if '_key_field' not in cls.__dict__:
+      cls._key_field = next(
+        (fieldname for fieldname, meta in cls.fields.items() if 'pkey' in meta), None)
+    return cls._key_field
 
   @property
   def pkey(self):
     return self[self.key_field()]
 
+  @classmethod
+  def scope_fields(cls):
+    """The fields identifying which previously exported rows an item of this class
+    replaces when a partial crawl is merged into existing output. For dedupable
+    entities that's just the pkey. Otherwise it's the fields marked with 'scope'
+    metadata, e.g. all the Titles with a given epid get replaced when that episode
+    is re-scraped.
+    """
+    if cls.dedupable():
+      return (cls.key_field(),)
+    return tuple(sorted(
+      fieldname for fieldname, meta in cls.fields.items() if meta.get('scope')
+    ))
+
+  @classmethod
+  def scope_key(cls, row):
+    """Works on items, or on dicts loaded from an exported json table."""
+    return tuple(row.get(fieldname) for fieldname in cls.scope_fields())
+
+  @staticmethod
+  def season_of(row):
+    """The sid of the season a season_scoped item (or exported row) belongs to."""
+    if row.get('sid') is not None:
+      return row['sid']
+    if row.get('epid') is not None:
+      return helpers.Sid.from_epid(row['epid'])
+    return helpers.Sid.from_tid(row['tid'])
+
+class BaseSnlItem(SnlItemMixin, scrapy.Item):
+  pass
+
+class BaseSnlRecord(SnlItemMixin, Record):
+  """For the item types we scrape the most of. Works just like a BaseSnlItem, but
+  with a much smaller footprint (see records.py)."""
+  __slots__ = ()
 
 class Season(BaseSnlItem):
-  sid = scrapy.Field(type=int, min=1)
+  sid = scrapy.Field(type=int, min=1, scope=True)
   # Year in which the season began (e.g. season 1 has year 1975)
   year = scrapy.Field(type=int)
 
@@ -39,7 +90,7 @@ class Actor(BaseSnlItem):
   # snlarchive pages, but there were problems with that approach (see below).
   # In practice, celebrities are pretty careful to avoid name collisions. (Fortunately,
   # neither Michelle Williams has ever been credited in an SNL sketch.)
-  aid = scrapy.Field(pkey=True, type=string_types)
+  aid = scrapy.Field(pkey=True, type=string_types, interned=True)
   # A URL relative to snlarchives.net. Starts with one of: /Cast/, /Crew/, or /Guests/
   # e.g. Taran Killam's page is /Cast/?TaKi.
   # NB: An actor may have...
@@ -67,21 +118,23 @@ class Actor(BaseSnlItem):
 
 class Cast(BaseSnlItem):
   """A cast member on a particular season."""
-  aid = scrapy.Field(type=string_types)
-  sid = scrapy.Field(type=int, min=1)
+  season_scoped = True
+  aid = scrapy.Field(type=string_types, scope=True, interned=True)
+  sid = scrapy.Field(type=int, min=1, scope=True)
   # Was this cast member a "featured player" during this season? (This is the level
   # most cast members start at)
   featured = scrapy.Field(type=bool, default=False)
   update_anchor = scrapy.Field(type=bool, default=False)
   # These fields are only present if this person wasn't present for the full
   # season (i.e. they started in the middle of a season, or left early)
-  first_epid = scrapy.Field(type=string_types, optional=True)
-  last_epid = scrapy.Field(type=string_types, optional=True)
+  first_epid = scrapy.Field(type=string_types, optional=True, numeric_id=True)
+  last_epid = scrapy.Field(type=string_types, optional=True, numeric_id=True)
 
 class Episode(BaseSnlItem):
+  season_scoped = True
   # We use the ids snlarchives use in their urls. In practice, these look
   # like dates, e.g. '20020518'
-  epid = scrapy.Field(type=string_types)
+  epid = scrapy.Field(type=string_types, scope=True, numeric_id=True)
   # epno = n -> this is the nth episode of the season (starting from 1)
   # Specials have no epno, but for the moment I'm making a deliberate 
   # decision to exclude them from the scrape.
@@ -89,25 +142,27 @@ class Episode(BaseSnlItem):
   # Could maybe do the 'foreign key' thing more elegantly with some 
   # metaclass magic, but don't want to mess around with that too much
   # since scrapy is clearly already doing some metaclass magic here.
-  sid = scrapy.Field()
+  sid = scrapy.Field(type=int)
   aired = scrapy.Field(type=string_types)
 
 class Host(BaseSnlItem):
   # NB: an episode may rarely have 0 or many hosts (which is why this isn't just
   # a field on Episode)
-  epid = scrapy.Field(type=string_types)
-  aid = scrapy.Field(type=string_types)
+  season_scoped = True
+  epid = scrapy.Field(type=string_types, scope=True, numeric_id=True)
+  aid = scrapy.Field(type=string_types, interned=True)
 
-class Title(BaseSnlItem):
+class Title(BaseSnlRecord):
   """An episode is comprised of 'titles'. Cold openings, monologues, sketches, and 
   musical performances are all examples.
   """
+  season_scoped = True
   # The snlarchive page for this title will be at /Episodes/?<tid>
   # In practice, tids are formed by concatenating the epid of the episode a title appears
   # in with an ordinal, starting from 1. e.g. the sketch with tid=201510103 is the 
   # 3rd sketch on episode 20151010
-  tid = scrapy.Field(type=string_types)
-  epid = scrapy.Field(type=string_types)
+  tid = scrapy.Field(type=string_types, numeric_id=True)
+  epid = scrapy.Field(type=string_types, scope=True, numeric_id=True)
   category = scrapy.Field(possible_values = {
     # Standard 1-every-episode things (well, almost every episode - there are some episodes from the early years with no monologue)
     'Cold Opening', 'Monologue', 'Goodnights', 
@@ -158,18 +213,19 @@ class Title(BaseSnlItem):
   # Name is empty for certain categories such as Monologue, Weekend Update, and 
   # Goodnights.
   name = scrapy.Field(type=string_types, optional=True)
-  skid = scrapy.Field(optional=True, type=string_types)
+  skid = scrapy.Field(optional=True, type=string_types, numeric_id=True)
   # Where this appeared on the show, relative to other titles.
   order = scrapy.Field(type=int, min=0)
 
 # A recurring sketch (having a /Sketches url on snlarchive)
 class Sketch(BaseSnlItem):
-  skid = scrapy.Field(pkey=True, type=string_types)
+  skid = scrapy.Field(pkey=True, type=string_types, numeric_id=True)
   name = scrapy.Field(type=string_types)
 
-class Appearance(BaseSnlItem):
-  aid = scrapy.Field()
-  tid = scrapy.Field()
+class Appearance(BaseSnlRecord):
+  season_scoped = True
+  aid = scrapy.Field(type=string_types, interned=True)
+  tid = scrapy.Field(type=string_types, scope=True, numeric_id=True)
   capacity = scrapy.Field(possible_values = {
     'cast', 'host', 'cameo', 
     'music', # cameo by musical guest  
@@ -180,28 +236,28 @@ class Appearance(BaseSnlItem):
     })
   # The name of the credited role. Occasionally, this may be empty. This mostly happens
   # in the monologue and Weekend Update, and means they're playing themselves. 
-  role = scrapy.Field(optional=True)
-  impid = scrapy.Field(optional=True)
+  role = scrapy.Field(optional=True, type=string_types)
+  impid = scrapy.Field(optional=True, type=int)
   charid = scrapy.Field(optional=True, type=int)
-  voice = scrapy.Field(default=False)
+  voice = scrapy.Field(default=False, type=bool)
 
 class Character(BaseSnlItem):
   """A recurring character."""
   # The snlarchive url for this character will be /Characters/?<charid>
   # e.g. /Characters/?980
   charid = scrapy.Field(pkey=True, type=int)
-  name = scrapy.Field()
-  aid = scrapy.Field()
+  name = scrapy.Field(type=string_types)
+  aid = scrapy.Field(type=string_types, interned=True)
 
 class Impression(BaseSnlItem):
-  impid = scrapy.Field(pkey=True)
-  name = scrapy.Field()
-  aid = scrapy.Field()
+  impid = scrapy.Field(pkey=True, type=int)
+  name = scrapy.Field(type=string_types)
+  aid = scrapy.Field(type=string_types, interned=True)
 
 class EpisodeRating(BaseSnlItem):
   """How an episode was rated by IMDB users."""
-  epno = scrapy.Field()
-  sid = scrapy.Field()
+  epno = scrapy.Field(scope=True, type=int)
+  sid = scrapy.Field(scope=True, type=int)
   # For each possible score from 1-10, how many users chose that score for this episode?
   score_counts = scrapy.Field(type=dict, keys=set(range(1, 11)))
   # Map from demographic string (e.g. 'Females age 45+') to average score.
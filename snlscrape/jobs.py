@@ -0,0 +1,251 @@
+"""Checkpointing, so that a crawl that dies partway through can be resumed (see
+SNL_JOB_DIR).
+
+A crawl is divided into units of work - one per response. A unit is complete once
+its callback has finished and every item it yielded has made it through the item
+pipelines. Every SNL_CHECKPOINT_INTERVAL completed units, at a moment when no unit
+is partially complete, we write a checkpoint recording:
+  - the urls of the completed units, and whether each was a leaf (i.e. yielded no
+    requests - e.g. an episode page, as opposed to a season page)
+  - the state of any registered components, e.g. EntityDedupePipeline's seen keys,
+    and how far MultiJsonExportPipeline had got through each (staged) table
+
+When a crawl is restarted with the same job directory, the pipelines pick up where
+they left off at the last checkpoint (discarding anything exported after it), requests
+for completed leaves are never sent, and the items of completed non-leaf pages are
+suppressed. Non-leaf pages are few and cheap, so rather than persisting scrapy's
+request queue, we just fetch them again to rebuild the frontier.
+"""
+import json
+import logging
+import os
+import weakref
+from collections import defaultdict
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Request
+
+# crawler -> JobState
+_jobs = weakref.WeakKeyDictionary()
+
+def job_for(crawler):
+  """Return the JobState shared by the components of the given crawler, or None if
+  SNL_JOB_DIR isn't set.
+  """
+  if crawler not in _jobs:
+    job_dir = crawler.settings.get('SNL_JOB_DIR')
+    if not job_dir:
+      _jobs[crawler] = None
+    else:
+      spidercls = getattr(crawler, 'spidercls', None)
+      name = getattr(spidercls, 'name', None) or 'default'
+      _jobs[crawler] = JobState(os.path.join(job_dir, name),
+          crawler.settings.getint('SNL_CHECKPOINT_INTERVAL'), crawler.stats)
+      _jobs[crawler].connect(crawler.signals)
+  return _jobs[crawler]
+
+def response_key(response):
+  """The url that was originally requested to get this response (i.e. before any
+  redirects)."""
+  return response.meta.get('redirect_urls', [response.url])[0]
+
+class Unit(object):
+
+  def __init__(self, url):
+    self.url = url
+    self.leaf = True
+    # Items yielded by this unit that haven't made it through the pipelines yet
+    self.pending = 0
+    self.exhausted = False
+
+class JobState(object):
+
+  CHECKPOINT_FNAME = 'checkpoint.json'
+
+  def __init__(self, path, interval, stats=None):
+    self.path = path
+    self.interval = max(1, interval)
+    self.stats = stats
+    # name -> object with a checkpoint_state method, returning something json-serializable
+    self.components = {}
+    # url -> whether that unit was a leaf, for every completed unit
+    self.done = {}
+    # The component states from the checkpoint we resumed from
+    self.saved = {}
+    self.in_flight = set()
+    # id(item) -> units that yielded it and are waiting on it. (The same item object
+    # may be yielded more than once.)
+    self.pending_items = defaultdict(list)
+    self.completed_since_checkpoint = 0
+    self.load()
+
+  @property
+  def checkpoint_path(self):
+    return os.path.join(self.path, self.CHECKPOINT_FNAME)
+
+  def load(self):
+    if not os.path.exists(self.checkpoint_path):
+      return
+    with open(self.checkpoint_path) as f:
+      checkpoint = json.load(f)
+    self.done = checkpoint['done']
+    self.saved = checkpoint['components']
+    logging.info('Resuming from checkpoint with {} completed pages'.format(len(self.done)))
+    self._inc_stat('snl_job/resumed_pages', len(self.done))
+
+  def connect(self, signal_manager):
+    for signal in (signals.item_scraped, signals.item_dropped, signals.item_error):
+      signal_manager.connect(self.item_finished, signal=signal)
+    signal_manager.connect(self.spider_closed, signal=signals.spider_closed)
+
+  def register(self, name, component):
+    self.components[name] = component
+
+  def saved_state(self, name):
+    """The state the named component had at the checkpoint we resumed from (if any)."""
+    return self.saved.get(name)
+
+  def _inc_stat(self, key, count=1):
+    if self.stats is not None:
+      self.stats.inc_value(key, count)
+
+  def is_done(self, url):
+    return url in self.done
+
+  def is_done_leaf(self, url):
+    return self.done.get(url, False)
+
+  def start_unit(self, url):
+    unit = Unit(url)
+    self.in_flight.add(unit)
+    return unit
+
+  def track(self, item, unit):
+    unit.pending += 1
+    self.pending_items[id(item)].append(unit)
+
+  def item_finished(self, item, **kwargs):
+    units = self.pending_items.get(id(item))
+    if not units:
+      return
+    unit = units.pop(0)
+    if not units:
+      del self.pending_items[id(item)]
+    unit.pending -= 1
+    self._maybe_complete(unit)
+
+  def exhausted(self, unit):
+    unit.exhausted = True
+    self._maybe_complete(unit)
+
+  def _maybe_complete(self, unit):
+    if not (unit.exhausted and unit.pending == 0):
+      return
+    self.in_flight.discard(unit)
+    self.done[unit.url] = unit.leaf
+    self.completed_since_checkpoint += 1
+    if not self.in_flight and self.completed_since_checkpoint >= self.interval:
+      self.checkpoint()
+
+  def checkpoint(self):
+    assert not self.in_flight
+    checkpoint = dict(
+        done=self.done,
+        components={name: component.checkpoint_state()
+          for name, component in self.components.items()},
+    )
+    if not os.path.isdir(self.path):
+      os.makedirs(self.path)
+    tmp_path = self.checkpoint_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+      json.dump(checkpoint, f)
+    os.replace(tmp_path, self.checkpoint_path)
+    self.completed_since_checkpoint = 0
+    self._inc_stat('snl_job/checkpoints')
+
+  def spider_closed(self, spider, reason):
+    if reason == 'finished':
+      # Nothing to resume
+      if os.path.exists(self.checkpoint_path):
+        os.remove(self.checkpoint_path)
+    elif self.in_flight:
+      logging.warning('Crawl stopped ({}) with {} pages partially processed. Resuming '
+          'will start from the last checkpoint.'.format(reason, len(self.in_flight)))
+    else:
+      self.checkpoint()
+      logging.info('Crawl stopped ({}). Checkpoint saved to {}'.format(reason, self.path))
+
+class CheckpointMiddleware(object):
+  """Spider middleware that tracks the units of work for the crawl's JobState, and
+  skips those that were completed before the crawl was resumed.
+  """
+
+  def __init__(self, job, stats):
+    self.job = job
+    self.stats = stats
+
+  @classmethod
+  def from_crawler(cls, crawler):
+    job = job_for(crawler)
+    if job is None:
+      raise NotConfigured
+    return cls(job, crawler.stats)
+
+  def skip(self, request):
+    if self.job.is_done_leaf(request.url):
+      self.stats.inc_value('snl_job/skipped_requests')
+      return True
+    return False
+
+  def process_start_requests(self, start_requests, spider):
+    for request in start_requests:
+      if not self.skip(request):
+        yield request
+
+  async def process_start(self, start):
+    # Replaces process_start_requests as of scrapy 2.13
+    async for thing in start:
+      if not (isinstance(thing, Request) and self.skip(thing)):
+        yield thing
+
+  def start_unit(self, response):
+    url = response_key(response)
+    unit = self.job.start_unit(url)
+    # If we've been here before, we're only interested in where this page leads
+    unit.suppress_items = self.job.is_done(url)
+    return unit
+
+  def keep(self, thing, unit):
+    """Record a thing yielded by the given unit, and return whether to pass it on."""
+    if isinstance(thing, Request):
+      unit.leaf = False
+      return not self.skip(thing)
+    elif unit.suppress_items:
+      self.stats.inc_value('snl_job/suppressed_items')
+      return False
+    self.job.track(thing, unit)
+    return True
+
+  def process_spider_output(self, response, result, spider):
+    unit = self.start_unit(response)
+    try:
+      for thing in result:
+        if self.keep(thing, unit):
+          yield thing
+    except Exception:
+      # Retrying this page would presumably just fail the same way
+      self.job.exhausted(unit)
+      raise
+    self.job.exhausted(unit)
+
+  async def process_spider_output_async(self, response, result, spider):
+    unit = self.start_unit(response)
+    try:
+      async for thing in result:
+        if self.keep(thing, unit):
+          yield thing
+    except Exception:
+      self.job.exhausted(unit)
+      raise
+    self.job.exhausted(unit)
@@ -0,0 +1,123 @@
+"""Dense integer codes for the ids that tables are joined on (actors, titles, episodes,
+seasons), so that merges and groupbys work on small int arrays rather than actor names
+and 8-10 digit ids.
+
+A KeyDictionary maps each kind of key to the sorted array of its values; a value's code
+is its position in that array. Because the values are sorted, codes compare the same
+way the ids do - e.g. 'all episodes between first_epid and last_epid' can be computed
+on epid codes directly.
+
+Columns are matched to keys by name (see KEY_COLUMNS), which holds for every table in
+output/, including the derived ones. Missing values are encoded as <NA> (in a nullable
+Int32 column).
+
+The dictionary is saved next to the csvs (as keys.json) so that analysis code can
+translate between codes and ids:
+
+  keys = KeyDictionary.load('output/keys.json')
+  keys.code('aid', 'Kenan Thompson')
+"""
+import io
+import json
+
+import numpy as np
+import pandas as pd
+
+# column name -> the kind of key it holds
+KEY_COLUMNS = dict(
+    aid='aid',
+    tid='tid',
+    epid='epid', first_epid='epid', last_epid='epid',
+    sid='sid',
+)
+KEYS = ('aid', 'tid', 'epid', 'sid')
+
+def key_values(col):
+  """The distinct non-null values of the given column."""
+  if isinstance(col.dtype, pd.CategoricalDtype):
+    return col.cat.categories.values
+  return pd.unique(col.dropna().to_numpy())
+
+class KeyDictionary(object):
+
+  FNAME = 'keys.json'
+
+  def __init__(self, values):
+    # key name -> pd.Index of the (sorted, distinct) values of that key
+    self.values = {key: pd.Index(vals) for (key, vals) in values.items()}
+
+  @classmethod
+  def from_tables(cls, tables):
+    """Build a dictionary covering every value of every key column in the given dict
+    of DataFrames."""
+    found = {key: [] for key in KEYS}
+    for df in tables.values():
+      for colname in df.columns:
+        if colname in KEY_COLUMNS:
+          found[KEY_COLUMNS[colname]].append(key_values(df[colname]))
+    return cls({key: np.unique(np.concatenate(arrs)) if arrs else []
+      for (key, arrs) in found.items()})
+
+  @classmethod
+  def load(cls, path):
+    with io.open(path, encoding='utf-8') as f:
+      return cls(json.load(f))
+
+  def save(self, path):
+    with io.open(path, 'w', encoding='utf-8') as f:
+      f.write(json.dumps({key: vals.tolist() for (key, vals) in self.values.items()},
+        ensure_ascii=False))
+
+  def code(self, key, value):
+    """Return the code for a single value. Raises KeyError if it's not in the dictionary."""
+    return self.values[key].get_loc(value)
+
+  def value(self, key, code):
+    return self.values[key][code]
+
+  def encode(self, key, col):
+    """Return a Series with the codes of the values in col."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+      # Just need to translate the column's own codes
+      lookup = np.append(self.values[key].get_indexer(col.cat.categories), -1)
+      codes = lookup[col.cat.codes.values]
+    else:
+      codes = self.values[key].get_indexer(col)
+    codes = codes.astype('int32')
+    missing = codes == -1
+    if missing.any():
+      if not col.isnull()[missing].all():
+        raise KeyError('Values of {} missing from key dictionary'.format(col.name))
+      codes = pd.arrays.IntegerArray(codes, missing)
+    return pd.Series(codes, index=col.index, name=col.name)
+
+  def decode(self, key, col):
+    """Inverse of encode. Actor names come back as a categorical."""
+    vals = self.values[key]
+    if isinstance(col.dtype, pd.api.extensions.ExtensionDtype):
+      missing = col.isnull().values
+      codes = col.fillna(-1).values.astype('int64')
+    else:
+      missing = None
+      codes = col.values.astype('int64')
+    if vals.dtype.kind not in 'iu':
+      decoded = pd.Categorical.from_codes(codes, categories=vals)
+    elif missing is not None and missing.any():
+      decoded = pd.arrays.IntegerArray(vals.values.take(np.where(missing, 0, codes))
+          .astype('int64'), missing)
+    else:
+      decoded = vals.values.take(codes)
+    return pd.Series(decoded, index=col.index, name=col.name)
+
+  def encode_tables(self, tables):
+    """Replace the key columns of each of the given DataFrames with their codes (in place)."""
+    self._apply(tables, self.encode)
+
+  def decode_tables(self, tables):
+    self._apply(tables, self.decode)
+
+  def _apply(self, tables, fn):
+    for df in tables.values():
+      for colname in df.columns:
+        if colname in KEY_COLUMNS:
+          df[colname] = fn(KEY_COLUMNS[colname], df[colname])
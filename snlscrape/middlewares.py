@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+# Define here the models for your downloader/spider middlewares
+#
+# See documentation in:
+# http://scrapy.readthedocs.org/en/latest/topics/downloader-middleware.html
+
+import logging
+
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+
+from snlscrape.store import ResponseStore
+from snlscrape.throttle import HostThrottle
+
+class ResponseStoreMiddleware(object):
+  """Saves every successful response to a ResponseStore in SNL_STORE_DIR (if 
+  SNL_STORE_ENABLED is set), or, if SNL_OFFLINE is set, serves every request
+  from that store without touching the network.
+
+  Responses returned from process_request never reach the downloader, so replaying
+  the store isn't subject to DOWNLOAD_DELAY.
+  """
+
+  # Added to the flags of responses that were served from the store.
+  FLAG = 'stored'
+
+  def __init__(self, store, offline, stats):
+    self.store = store
+    self.offline = offline
+    self.stats = stats
+
+  @classmethod
+  def from_crawler(cls, crawler):
+    settings = crawler.settings
+    offline = settings.getbool('SNL_OFFLINE')
+    if not (offline or settings.getbool('SNL_STORE_ENABLED')):
+      raise NotConfigured
+    mw = cls(ResponseStore(settings.get('SNL_STORE_DIR')), offline, crawler.stats)
+    crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+    return mw
+
+  def spider_closed(self, spider):
+    self.store.close()
+
+  def process_request(self, request, spider):
+    if not self.offline:
+      return None
+    entry = self.store.get(request.url)
+    if entry is None:
+      self.stats.inc_value('snl_store/miss')
+      logging.warning('Offline, and no stored response for {}'.format(request.url))
+      raise IgnoreRequest('No stored response for {}'.format(request.url))
+    self.stats.inc_value('snl_store/hit')
+    body = self.store.body(entry['sha1'])
+    headers = Headers(entry['headers'])
+    respcls = responsetypes.from_args(headers=headers, url=request.url, body=body)
+    return respcls(url=request.url, status=entry['status'], headers=headers, body=body,
+        flags=[self.FLAG], request=request)
+
+  def process_response(self, request, response, spider):
+    if self.offline or self.FLAG in response.flags:
+      return response
+    if 200 <= response.status < 300:
+      headers = {
+          k.decode('latin-1'): [v.decode('latin-1') for v in vs]
+          for k, vs in response.headers.items()
+      }
+      # If we were redirected here, make sure the original url(s) can be replayed too.
+      urls = request.meta.get('redirect_urls', []) + [request.url]
+      for url in urls:
+        self.store.put(url, response.status, headers, response.body)
+      self.stats.inc_value('snl_store/stored')
+    return response
+
+class HostThrottleMiddleware(object):
+  """Gives each host its own concurrency budget (SNL_HOST_CONCURRENCY) and download
+  delay (starting at SNL_HOST_DELAY, then adapted to the host's latency and error rate
+  - see throttle.py), so that e.g. slow IMDB ratings pages don't hold up the 
+  snlarchive crawl.
+
+  Hosts without an entry fall back to CONCURRENT_REQUESTS_PER_DOMAIN / DOWNLOAD_DELAY.
+  """
+
+  def __init__(self, crawler):
+    settings = crawler.settings
+    self.crawler = crawler
+    self.host_concurrency = settings.getdict('SNL_HOST_CONCURRENCY')
+    self.host_delay = settings.getdict('SNL_HOST_DELAY')
+    self.default_concurrency = settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN')
+    self.default_delay = settings.getfloat('DOWNLOAD_DELAY')
+    self.max_delay = settings.getfloat('SNL_THROTTLE_MAX_DELAY')
+    self.error_backoff = settings.getfloat('SNL_THROTTLE_ERROR_BACKOFF')
+    # slot key (normally the hostname) -> HostThrottle
+    self.throttles = {}
+
+  @classmethod
+  def from_crawler(cls, crawler):
+    if not crawler.settings.getbool('SNL_THROTTLE_ENABLED'):
+      raise NotConfigured
+    mw = cls(crawler)
+    crawler.signals.connect(mw.request_reached_downloader,
+        signal=signals.request_reached_downloader)
+    return mw
+
+  def throttle_for(self, key):
+    if key not in self.throttles:
+      base_delay = float(self.host_delay.get(key, self.default_delay))
+      self.throttles[key] = HostThrottle(base_delay, self.max_delay, self.error_backoff)
+    return self.throttles[key]
+
+  def _configure_slot(self, key):
+    """Apply the host's budget to its downloader slot (if it has one), returning it."""
+    slot = self.crawler.engine.downloader.slots.get(key)
+    if slot is not None:
+      slot.concurrency = int(self.host_concurrency.get(key, self.default_concurrency))
+      slot.delay = self.throttle_for(key).delay
+    return slot
+
+  def request_reached_downloader(self, request, spider):
+    # Sent once the downloader has put the request in its slot (which it creates with
+    # the default budget, on a host's first request, or after a long idle) and before
+    # the slot's queue is processed, so the host's budget applies from the start.
+    self._configure_slot(request.meta.get('download_slot'))
+
+  def _update_slot(self, request, latency, error):
+    # The downloader records which slot (by default, the hostname) it used
+    key = request.meta.get('download_slot')
+    if key not in self.crawler.engine.downloader.slots:
+      return
+    self.throttle_for(key).record(latency, error)
+    slot = self._configure_slot(key)
+    self.crawler.stats.max_value('snl_throttle/max_delay/{}'.format(key), slot.delay)
+
+  def process_response(self, request, response, spider):
+    error = response.status >= 500 or response.status == 429
+    self._update_slot(request, request.meta.get('download_latency'), error)
+    return response
+
+  def process_exception(self, request, exception, spider):
+    self._update_slot(request, None, True)
@@ -0,0 +1,43 @@
+"""A sample episode page, shared by the tests and benchmarks of snlscrape/pages.py."""
+from scrapy.http import HtmlResponse, Request
+
+from snlscrape.items import Season
+
+EPISODE_URL = 'http://www.snlarchives.net/Episodes/?20020518'
+
+# Exercises most of the paths through parseEpisode: cast/host/cameo/unmatched actors,
+# impressions, characters, voice roles, repeated actors, an empty cast row, and titles
+# linked to recurring sketches and commercials.
+EPISODE_PAGE = u'''<html><body>
+<table class="epGuests">
+<tr><td><p>Aired:</p></td><td><p>May 18, 2002 (<a href="/Seasons/?2001">S27</a>E20 / #533)</p></td></tr>
+<tr><td><p>Host:</p></td><td><p><a href="/Guests/?1234">Winona Ryder</a></p></td></tr>
+<tr><td><p>Musical Guest:</p></td><td><p><a href="/Guests/?1235">Moby</a></p></td></tr>
+<tr><td><p>Cameos:</p></td><td><p><a href="/Guests/?99">Alec Baldwin</a>, <a href="/Crew/?7">Lorne Michaels</a></p></td></tr>
+</table>
+<div class="sketchWrapper"><a href="/Episodes/?200205181"><div class="title">Jeopardy!<a href="/Sketches/?17">Celebrity Jeopardy</a></div><div class="type">Cold Opening</div></a>
+<table class="roleTable"><tr><td><a href="/Cast/?WiFe">Will Ferrell</a></td><td>...</td><td><a href="/Impressions/?12">Alex Trebek</a></td></tr>
+<tr><td class="host">Winona Ryder</td><td>...</td><td>Clarissa</td></tr>
+<tr><td class="cameo">Alec Baldwin</td></tr>
+<tr><td></td></tr>
+<tr><td class="music">Chris Martin</td></tr>
+<tr><td>Moby</td></tr>
+</table></div>
+<div class="sketchWrapper"><a href="/Episodes/?200205182"><div class="title"></div><div class="type">Monologue</div></a>
+<table class="roleTable"><tr><td class="host">Winona Ryder</td></tr></table></div>
+<div class="sketchWrapper"><a href="/Episodes/?200205183"><div class="title">Botox <i>Ad</i></div><div class="type">Commercial</div></a>
+<table class="roleTable"><tr><td><a href="/Cast/?AnGa">Ana Gasteyer</a></td><td>...</td><td>announcer <i>(voice)</i></td></tr>
+<tr><td><a href="/Cast/?AnGa">Ana Gasteyer</a></td><td>...</td><td>user</td></tr>
+<tr><td><a href="/Cast/?RaDr">Rachel Dratch</a></td><td>...</td><td><a href="/Characters/?559">Virginia Klarvin</a></td></tr>
+<tr><td class="filmed"><a href="/Cast/?WiFe">Will Ferrell</a></td><td>...</td><td><a href="/Impressions/?12">Alex Trebek</a></td></tr>
+<tr><td>Jack Handey</td><td>...</td><td>narrator</td></tr>
+</table></div>
+<div class="sketchWrapper"><a href="/Episodes/?200205184"><div class="title"><a href="/Commercials/?3">Old Glory</a></div><div class="type">Film</div></a>
+<table class="roleTable"></table></div>
+</body></html>'''
+
+def episode_response(body=EPISODE_PAGE, url=EPISODE_URL):
+  if not isinstance(body, bytes):
+    body = body.encode('utf-8')
+  meta = {'season': Season(sid=27, year=2001)}
+  return HtmlResponse(url, body=body, encoding='utf-8', request=Request(url, meta=meta))
@@ -0,0 +1,208 @@
+"""Accessors for the raw values SnlSpider extracts from an snlarchive episode page (the
+episode metadata table, and each sketch's title, category and cast rows). The spider
+turns these values into items, so it doesn't care which implementation it's given.
+
+There are two implementations with the same interface:
+  - CssEpisodePage: uses scrapy selectors and css queries. Simple, but every query
+    gets translated from css to xpath again, and wraps each result in a new Selector.
+  - XPathEpisodePage: the same queries, translated to xpath once at import time, and
+    evaluated directly against the page's lxml tree. A sketch's elements are found
+    once and shared between the queries that need them.
+Both must return exactly the same values (see benchmarks/bench_episode_parse.py).
+"""
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+class CssEpisodePage(object):
+
+  def __init__(self, response):
+    self.response = response
+
+  def info_rows(self):
+    """Yield a (field, values, value_cell) triple for each row in the table of episode
+    metadata. e.g. ('Host:', ['Anna Faris'], <td>)
+    """
+    for epInfoTr in self.response.css("table.epGuests tr"):
+      epInfoTd = epInfoTr.css("td")
+      fieldTd, valueTd = epInfoTd # e.g. ("<td><p>Host:</p></td>", "<td><p>Anna Faris</p></td>")
+      field = fieldTd.css("td p ::text").extract_first()
+      values = valueTd.css("td p ::text").extract()
+      yield field, values, valueTd
+
+  def links(self, cell):
+    """Return an (href, text) pair for each link in the given cell."""
+    return [(a.css('::attr(href)').extract_first(), a.css('::text').extract_first())
+        for a in cell.css('a')]
+
+  def sketches(self):
+    for sketchInfo in self.response.css("div.sketchWrapper"):
+      yield CssSketch(sketchInfo)
+
+class CssSketch(object):
+
+  def __init__(self, sketchInfo):
+    self.sel = sketchInfo
+
+  def href(self):
+    # e.g. /Episodes/?197510111
+    return self.sel.css("a ::attr(href)").extract_first()
+
+  def category(self):
+    return self.sel.css(".type ::text").extract_first()
+
+  def name(self):
+    # In some cases, the sketch name may not be contained to a single node. e.g. the SNL
+    # digital short in this episode: http://www.snlarchives.net/Episodes/?20051217
+    return ''.join(self.sel.css(".title ::text").extract())
+
+  def title_url(self):
+    return self.sel.css(".title a ::attr(href)").extract_first()
+
+  def title_link_text(self):
+    return self.sel.css('.title a ::text').extract_first()
+
+  def cast_rows(self):
+    for row in self.sel.css(".roleTable > tr"):
+      yield CssCastRow(row)
+
+class CssCastRow(object):
+  """A row describing a cast member in a particular segment, and their role."""
+
+  def __init__(self, row):
+    self.cells = row.css('td')
+    self.n_cells = len(self.cells)
+    self.actor_cell = self.cells[0]
+
+  def actor_class(self):
+    return self.actor_cell.css('::attr(class)').extract_first()
+
+  def actor_name(self):
+    return self.actor_cell.css('::text').extract_first()
+
+  def actor_link(self):
+    """Return an (href, text) pair if the actor's name is a link, otherwise None."""
+    anchor = self.actor_cell.css('a')
+    if not anchor:
+      return None
+    return anchor.css('::attr(href)').extract_first(), anchor.css('::text').extract_first()
+
+  def role_texts(self):
+    return self.cells[2].css('::text').extract()
+
+  def role_href(self):
+    """The url of the link in the role cell (to an impression or character), or None"""
+    role_link = self.cells[2].css('a')
+    if not role_link:
+      return None
+    return role_link.css('::attr(href)').extract_first()
+
+
+_translator = HTMLTranslator()
+
+def _compile(css):
+  """Compile a css query to an xpath expression that behaves the same as 
+  Selector.css(query), but returns plain strings/elements.
+  """
+  return etree.XPath(_translator.css_to_xpath(css), smart_strings=False)
+
+_first = lambda results: results[0] if results else None
+
+class XPathEpisodePage(object):
+
+  info_rows_q = _compile("table.epGuests tr")
+  cells_q = _compile("td")
+  cell_text_q = _compile("td p ::text")
+  anchors_q = _compile("a")
+  href_q = _compile("::attr(href)")
+  text_q = _compile("::text")
+  sketches_q = _compile("div.sketchWrapper")
+
+  def __init__(self, response):
+    self.root = response.selector.root
+
+  def info_rows(self):
+    for tr in self.info_rows_q(self.root):
+      fieldTd, valueTd = self.cells_q(tr)
+      yield _first(self.cell_text_q(fieldTd)), self.cell_text_q(valueTd), valueTd
+
+  def links(self, cell):
+    return [(_first(self.href_q(a)), _first(self.text_q(a))) for a in self.anchors_q(cell)]
+
+  def sketches(self):
+    for div in self.sketches_q(self.root):
+      yield XPathSketch(div)
+
+class XPathSketch(object):
+
+  href_q = _compile("a ::attr(href)")
+  type_text_q = _compile(".type ::text")
+  title_q = _compile(".title")
+  # These are relative to the .title elements
+  text_q = _compile("::text")
+  link_href_q = _compile("a ::attr(href)")
+  link_text_q = _compile("a ::text")
+  rows_q = _compile(".roleTable > tr")
+
+  def __init__(self, div):
+    self.div = div
+    self._titles = None
+
+  def href(self):
+    return _first(self.href_q(self.div))
+
+  def category(self):
+    return _first(self.type_text_q(self.div))
+
+  @property
+  def titles(self):
+    if self._titles is None:
+      self._titles = self.title_q(self.div)
+    return self._titles
+
+  def name(self):
+    return ''.join(text for el in self.titles for text in self.text_q(el))
+
+  def title_url(self):
+    return _first([href for el in self.titles for href in self.link_href_q(el)])
+
+  def title_link_text(self):
+    return _first([text for el in self.titles for text in self.link_text_q(el)])
+
+  def cast_rows(self):
+    for tr in self.rows_q(self.div):
+      yield XPathCastRow(tr)
+
+class XPathCastRow(object):
+
+  cells_q = _compile("td")
+  class_q = _compile("::attr(class)")
+  text_q = _compile("::text")
+  anchors_q = _compile("a")
+  link_href_q = _compile("a ::attr(href)")
+  link_text_q = _compile("a ::text")
+
+  def __init__(self, tr):
+    self.cells = self.cells_q(tr)
+    self.n_cells = len(self.cells)
+    # Raise IndexError on empty rows, as CssCastRow does
+    self.actor_cell = self.cells[0]
+
+  def actor_class(self):
+    return _first(self.class_q(self.actor_cell))
+
+  def actor_name(self):
+    return _first(self.text_q(self.actor_cell))
+
+  def actor_link(self):
+    if not self.anchors_q(self.actor_cell):
+      return None
+    return _first(self.link_href_q(self.actor_cell)), _first(self.link_text_q(self.actor_cell))
+
+  def role_texts(self):
+    return self.text_q(self.cells[2])
+
+  def role_href(self):
+    role_cell = self.cells[2]
+    if not self.anchors_q(role_cell):
+      return None
+    return _first(self.link_href_q(role_cell))
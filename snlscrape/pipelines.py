@@ -6,12 +6,16 @@
 # See: http://doc.scrapy.org/en/latest/topics/item-pipeline.html
 
 import os
+import json
 import logging
 from collections import defaultdict
 
-import scrapy.exporters
+from scrapy import signals
 from scrapy.exceptions import DropItem
 
+from snlscrape import items, jobs, schema, sqldb, tables
+from snlscrape.dedupe import SeenRegistry
+
 # from items import *
 #import items
 
@@ -22,59 +26,346 @@ class EntityDedupePipeline(object):
   """Keeps track of seen entities and drops dupes (after matching on the 'pkey' field, if present).
   """
 
+  job = None
+
+  @classmethod
+  def from_crawler(cls, crawler):
+    pipeline = cls()
+    pipeline.job = jobs.job_for(crawler)
+    return pipeline
+
   def open_spider(self, spider):
-    self.seen = defaultdict(set)
+    self.seen = SeenRegistry()
+    if self.job is not None:
+      self.seen.restore(self.job.saved_state('seen'))
+      self.job.register('seen', self.seen)
 
   def process_item(self, item, spider):
     if item.dedupable():
       key = item.pkey
-      cache = self.seen[item.__class__.__name__]
-      if key in cache:
-        raise DropItem
-      cache.add(key)
+      if not self.seen.first_sighting(item.__class__, key):
+        raise DropItem('Duplicate {} with key {}'.format(item.__class__.__name__, key))
     return item
 
 class MultiJsonExportPipeline(object):
   """Export to json - one json file for every entity type in items.py
+
+  Tables are written to a staging directory, and only moved into output_dir once the
+  spider finishes successfully, so a crawl that dies partway through leaves the
+  previous output intact. (And, if SNL_JOB_DIR is set, can be resumed from its last
+  checkpoint - see jobs.py.)
+
+  If merge is True (see SNL_INCREMENTAL), rows already present in a table are kept,
+  except for those superseded by a newly scraped item with the same scope key (see
+  BaseSnlItem.scope_fields). Otherwise, each table that gets any items is overwritten.
+
+  If shard_by_season is True (see SNL_SHARD_BY_SEASON), the tables of season_scoped
+  items are split into a file per season, and it's each shard that gets any items
+  that's overwritten (or merged into), so a crawl of one season only touches that
+  season's shards. The other tables are then always merged.
+
+  Rows are buffered in memory and written in chunks of buffer_size bytes, compressed
+  if compression is set (see SNL_OUTPUT_COMPRESSION and tables.TableWriter).
   """
 
-  def __init__(self, output_dir):
+  STAGING_DIR = '.staging'
+
+  def __init__(self, output_dir, merge=False, job=None, compression=None,
+      buffer_size=tables.BUFFER_SIZE, shard_by_season=False):
     self.output_dir = output_dir
+    self.merge = merge
+    self.job = job
+    tables.check_compression(compression)
+    self.compression = compression
+    self.buffer_size = buffer_size
+    self.shard_by_season = shard_by_season
     assert os.path.isdir(output_dir), 'Directory {} does not exist'.format(output_dir)
 
   @classmethod
   def from_crawler(cls, crawler):
-    return cls(output_dir=crawler.settings.get('SNL_OUTPUT_DIR'))
+    pipeline = cls(output_dir=crawler.settings.get('SNL_OUTPUT_DIR'),
+        merge=crawler.settings.getbool('SNL_INCREMENTAL'),
+        job=jobs.job_for(crawler),
+        compression=crawler.settings.get('SNL_OUTPUT_COMPRESSION') or None,
+        buffer_size=crawler.settings.getint('SNL_EXPORT_BUFFER_SIZE', tables.BUFFER_SIZE),
+        shard_by_season=crawler.settings.getbool('SNL_SHARD_BY_SEASON'),
+        )
+    crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+    return pipeline
 
   def open_spider(self, spider):
-    self.exporters = {}
+    self.staging_dir = os.path.join(self.output_dir, self.STAGING_DIR,
+        getattr(spider, 'name', None) or 'default')
+    if not os.path.isdir(self.staging_dir):
+      os.makedirs(self.staging_dir)
+    # (table name, sid) -> TableWriter. sid is None unless the table is sharded.
+    self.writers = {}
+    # table name -> item class
+    self.item_classes = {}
+    # table name -> scope keys of the items exported during this crawl
+    self.scraped_scopes = defaultdict(set)
+    # (table name, sid) -> size of its staged file when it was closed
+    self.final_offsets = {}
+    if self.job is not None:
+      self.resume(self.job.saved_state('exports'))
+      self.job.register('exports', self)
+
+  def resume(self, state):
+    """Reopen the tables staged by an interrupted crawl, discarding anything exported
+    after its last checkpoint."""
+    if not state:
+      return
+    # The staged files are in whatever format the interrupted crawl was writing
+    self.compression = state.get('compression')
+    self.shard_by_season = state.get('shard_by_season', False)
+    for table_name, sid, offset in state['offsets']:
+      item_class = getattr(items, state['classes'][table_name])
+      self.open_table(table_name, item_class, sid, offset)
+    for table_name, scopes in state['scopes'].items():
+      self.scraped_scopes[table_name].update(tuple(scope) for scope in scopes)
+
+  def checkpoint_state(self):
+    offsets = dict(self.final_offsets)
+    for key, writer in self.writers.items():
+      if not writer.closed:
+        offsets[key] = writer.checkpoint()
+    return dict(
+        compression=self.compression,
+        shard_by_season=self.shard_by_season,
+        offsets=[[table_name, sid, offset]
+          for ((table_name, sid), offset) in sorted(offsets.items(), key=str)],
+        classes={table_name: cls.__name__ for (table_name, cls) in self.item_classes.items()},
+        scopes={table_name: [list(scope) for scope in scopes]
+          for (table_name, scopes) in self.scraped_scopes.items()},
+    )
 
   def close_spider(self, spider):
-    for key in self.exporters:
-      exporter = self.exporters[key]
-      exporter.finish_exporting()
-      exporter.file.close()
-
-  def exporter_for_item(self, item):
-    classname = item.__class__.__name__ 
-    table_name = classname.lower() + 's'
-    # sketchs is enough to drive me crazy
-    if classname == 'Sketch':
-      table_name = 'sketches'
-    if table_name not in self.exporters:
-      fname = '{}.json'.format(table_name)
-      path = os.path.join(self.output_dir, fname)
-      f = open(path, 'wb')
-      exporter = scrapy.exporters.JsonLinesItemExporter(f)
-      exporter.start_exporting()
-      self.exporters[table_name] = exporter
-    return self.exporters[table_name]
+    for key, writer in self.writers.items():
+      self.final_offsets[key] = writer.close()
+
+  def spider_closed(self, spider, reason):
+    if reason != 'finished':
+      logging.warning('Crawl stopped ({}). Not updating tables in {}'.format(
+        reason, self.output_dir))
+      return
+    self.publish()
+
+  def merges(self, table_name):
+    """Should rows already present in the given table be kept?"""
+    if self.merge:
+      return True
+    return self.shard_by_season and not self.item_classes[table_name].season_scoped
+
+  def publish(self):
+    """Move the staged tables into the output directory (after adding back any rows
+    from the previous crawl that weren't superseded, if merging)."""
+    sharded = defaultdict(list)
+    for table_name, sid in self.writers:
+      if sid is None:
+        self.publish_table(table_name)
+      else:
+        sharded[table_name].append(sid)
+    for table_name, sids in sorted(sharded.items()):
+      self.publish_shards(table_name, sids)
+    # Clean up the staging directory (and its parent) if they're now empty
+    for path in (self.staging_dir, os.path.dirname(self.staging_dir)):
+      try:
+        os.rmdir(path)
+      except OSError:
+        break
+
+  def publish_table(self, table_name):
+    previous = []
+    if self.merges(table_name):
+      # (Including any shards, if the table was previously saved sharded)
+      previous = self.load_previous_rows(tables.table_paths(self.output_dir, table_name),
+          self.item_classes[table_name])
+    self.publish_file(table_name, None, previous)
+    for path in tables.shard_paths(self.output_dir, table_name).values():
+      os.remove(path)
+    self.remove_empty_dir(os.path.join(self.output_dir, table_name))
+
+  def publish_shards(self, table_name, sids):
+    item_class = self.item_classes[table_name]
+    # If the table was previously saved as a single file, split it up
+    unsharded = tables.find_table(self.output_dir, table_name)
+    unsharded_rows = defaultdict(list)
+    for scope, line, sid in self.load_previous_rows([unsharded] if unsharded else [],
+        item_class):
+      unsharded_rows[sid].append( (scope, line, sid) )
+    for sid in sorted(sids):
+      previous = unsharded_rows.pop(sid, [])
+      if self.merges(table_name):
+        path = tables.find_table(self.output_dir, table_name, sid)
+        previous = self.load_previous_rows([path] if path else [], item_class) + previous
+      self.publish_file(table_name, sid, previous)
+    for sid, rows in sorted(unsharded_rows.items()):
+      if tables.find_table(self.output_dir, table_name, sid) is None:
+        self.publish_file(table_name, sid, rows)
+    if unsharded:
+      os.remove(unsharded)
+    self.remove_empty_dir(os.path.join(self.staging_dir, table_name))
+
+  def publish_file(self, table_name, sid, previous):
+    """Add the rows in previous that weren't superseded by this crawl's items to the
+    end of the staged file, and move it into the output directory."""
+    staged_path = tables.table_path(self.staging_dir, table_name, self.compression, sid)
+    path = tables.table_path(self.output_dir, table_name, self.compression, sid)
+    if previous:
+      writer = tables.TableWriter(staged_path, self.compression,
+          offset=self.final_offsets.get((table_name, sid), 0), buffer_size=self.buffer_size)
+      for scope, line, _sid in previous:
+        if scope not in self.scraped_scopes[table_name]:
+          writer.write_data(line)
+      writer.close()
+    if not os.path.isdir(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path))
+    os.replace(staged_path, path)
+    # Remove the old file, if it was saved with a different compression
+    for compression in tables.COMPRESSIONS:
+      old_path = tables.table_path(self.output_dir, table_name, compression, sid)
+      if compression != self.compression and os.path.exists(old_path):
+        os.remove(old_path)
+
+  @staticmethod
+  def remove_empty_dir(path):
+    try:
+      os.rmdir(path)
+    except OSError:
+      pass
+
+  def open_table(self, table_name, item_class, sid=None, offset=0):
+    path = tables.table_path(self.staging_dir, table_name, self.compression, sid)
+    if not os.path.isdir(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path))
+    writer = tables.TableWriter(path, self.compression, offset, self.buffer_size)
+    self.writers[(table_name, sid)] = writer
+    self.item_classes[table_name] = item_class
+    return writer
+
+  def writer_for_item(self, item):
+    table_name = tables.table_name(item.__class__)
+    sid = None
+    if self.shard_by_season and item.season_scoped:
+      sid = item.season_of(item)
+    writer = self.writers.get((table_name, sid))
+    if writer is None:
+      writer = self.open_table(table_name, item.__class__, sid)
+    return writer
+
+  @staticmethod
+  def load_previous_rows(paths, item_class):
+    """Return a list of (scope key, line, sid) for each row in the given files (where
+    sid is the row's season, for season_scoped items, else None)."""
+    rows = []
+    for path in paths:
+      for line in tables.read_lines(path):
+        row = json.loads(line.decode('utf-8'))
+        sid = item_class.season_of(row) if item_class.season_scoped else None
+        rows.append( (item_class.scope_key(row), line, sid) )
+    return rows
+
+  def process_item(self, item, spider):
+    table_name = tables.table_name(item.__class__)
+    self.writer_for_item(item).write_item(item)
+    if self.merge or self.shard_by_season:
+      self.scraped_scopes[table_name].add(item.scope_key(item))
+    return item
+
+class SqliteExportPipeline(object):
+  """Export to a SQLite database at SNL_SQLITE_PATH - one table for every entity type in
+  items.py (see sqldb.py). Can be used instead of, or alongside, MultiJsonExportPipeline.
+
+  Items are buffered and inserted in batches of SNL_SQLITE_BATCH_SIZE rows per
+  transaction. The indexes on aid/tid/epid/sid are dropped while loading, and
+  (re)built when the spider closes.
+
+  Re-crawls update the database in place. Items with a pkey replace the existing row
+  with that key. For other tables, the first time we see a given scope key (see
+  BaseSnlItem.scope_fields) during a crawl, we delete the existing rows with that key.
+  Unlike with the json tables, a crawl that dies partway through leaves the rows it
+  managed to insert.
+  """
+
+  def __init__(self, path, batch_size=500, job=None):
+    self.path = path
+    self.batch_size = max(1, batch_size)
+    self.job = job
+
+  @classmethod
+  def from_crawler(cls, crawler):
+    return cls(path=crawler.settings.get('SNL_SQLITE_PATH'),
+        batch_size=crawler.settings.getint('SNL_SQLITE_BATCH_SIZE'),
+        job=jobs.job_for(crawler),
+        )
+
+  def open_spider(self, spider):
+    self.db = sqldb.connect(self.path)
+    # table name -> TableSpec
+    self.specs = {}
+    # table name -> rows waiting to be inserted
+    self.pending_rows = defaultdict(list)
+    # table name -> scope keys whose old rows need deleting before the pending rows are inserted
+    self.pending_scopes = defaultdict(list)
+    self.n_pending = 0
+    # table name -> scope keys seen during this crawl
+    self.scraped_scopes = defaultdict(set)
+    if self.job is not None:
+      state = self.job.saved_state('sqlite') or {}
+      for table_name, scopes in state.items():
+        self.scraped_scopes[table_name].update(tuple(scope) for scope in scopes)
+      self.job.register('sqlite', self)
+
+  def spec_for_item(self, item):
+    table_name = tables.table_name(item.__class__)
+    if table_name not in self.specs:
+      spec = sqldb.TableSpec(item.__class__)
+      with self.db:
+        self.db.execute(spec.create_sql())
+        for sql in spec.drop_index_sqls():
+          self.db.execute(sql)
+      self.specs[table_name] = spec
+    return self.specs[table_name]
 
   def process_item(self, item, spider):
-    exporter = self.exporter_for_item(item)
-    exporter.export_item(item)
+    spec = self.spec_for_item(item)
+    if spec.pkey is None and spec.scope_fields:
+      scope = spec.scope_params(item)
+      if scope not in self.scraped_scopes[spec.name]:
+        self.scraped_scopes[spec.name].add(scope)
+        self.pending_scopes[spec.name].append(scope)
+    self.pending_rows[spec.name].append(spec.row(item))
+    self.n_pending += 1
+    if self.n_pending >= self.batch_size:
+      self.flush()
     return item
 
+  def flush(self):
+    """Insert all pending rows, in a single transaction."""
+    with self.db:
+      for table_name, rows in self.pending_rows.items():
+        spec = self.specs[table_name]
+        scopes = self.pending_scopes.get(table_name)
+        if scopes:
+          self.db.executemany(spec.delete_scope_sql(), scopes)
+        self.db.executemany(spec.insert_sql(), rows)
+    self.pending_rows.clear()
+    self.pending_scopes.clear()
+    self.n_pending = 0
+
+  def checkpoint_state(self):
+    self.flush()
+    return {table_name: [list(scope) for scope in scopes]
+        for (table_name, scopes) in self.scraped_scopes.items()}
+
+  def close_spider(self, spider):
+    self.flush()
+    with self.db:
+      for spec in self.specs.values():
+        for sql in spec.create_index_sqls():
+          self.db.execute(sql)
+    self.db.close()
+
 class FieldValidationException(Exception):
   pass
 
@@ -95,7 +386,7 @@ class ValidatorPipeline(object):
         # And it'd be annoying for an otherwise good full scrape to have a few missing
         # items here and there because there was a title category I forgot to include
         # or something.
-        logging.warn('Validation error on item: {}\n{}'.format(item, e.message))
+        logging.warn('Validation error on item: {}\n{}'.format(item, e))
     return item
 
   def validate_field_value(self, field, value, fieldname):
@@ -128,3 +419,102 @@ class DefaultValueSetterPipeline(object):
         item[fieldname] = meta.get('default')
     return item
 
+
+def compile_field_checks(item_class):
+  """Return a function check(item, fail) which does the same as DefaultValueSetterPipeline
+  followed by ValidatorPipeline for an item of the given class, but with the field
+  metadata baked in: it's generated as straight-line python, with one block per field.
+  For each invalid field, it calls fail(item, fieldname, message).
+  """
+  # Values referenced by the generated code
+  namespace = {}
+  def const(prefix, i, value):
+    name = '{}{}'.format(prefix, i)
+    namespace[name] = value
+    return name
+  def literal(value):
+    # For use in a message template
+    return str(value).replace('{', '{{').replace('}', '}}')
+  lines = ['def check(item, fail):', '  get = item.get']
+  for i, (fieldname, meta) in enumerate(item_class.fields.items()):
+    name = repr(fieldname)
+    # (condition, message template) for each rule, in the same order as validate_field_value
+    rules = []
+    if 'type' in meta:
+      rules.append(('not isinstance(value, {})'.format(const('type', i, meta['type'])),
+        'Got value {{}} for field {}. Expected type {}.'.format(fieldname, literal(meta['type']))))
+    if 'min' in meta:
+      rules.append(('value < {}'.format(const('min', i, meta['min'])),
+        'Value {{}} for field {} less than minimum = {}'.format(fieldname, literal(meta['min']))))
+    if 'possible_values' in meta:
+      rules.append(('value not in {}'.format(const('possible', i, frozenset(meta['possible_values']))),
+        'Value {{}} for field {} not among possible values: {}'.format(
+          fieldname, literal(meta['possible_values']))))
+    if 'keys' in meta:
+      rules.append(('set(value.keys()) != {}'.format(const('keys', i, set(meta['keys']))),
+        'Keys of {{}} for field {} not as expected: {}'.format(fieldname, literal(set(meta['keys'])))))
+    lines += [
+      '  value = get({})'.format(name),
+      '  if value is None:',
+      '    item[{}] = value = {}'.format(name, const('default', i, meta.get('default'))),
+      '  if value is None:',
+      '    pass' if meta.get('optional') else '    fail(item, {}, {}.format(value))'.format(
+        name, const('missing', i, 'No value for non-optional field {}'.format(fieldname))),
+    ]
+    # As with ValidatorPipeline, we report at most one problem per field
+    for j, (condition, message) in enumerate(rules):
+      lines += [
+        '  elif {}:'.format(condition),
+        '    fail(item, {}, {}.format(value))'.format(name, const('message{}_'.format(i), j, message)),
+      ]
+  lines.append('  return item')
+  exec('\n'.join(lines), namespace)
+  return namespace['check']
+
+class FieldCheckPipeline(object):
+  """Does the work of DefaultValueSetterPipeline and ValidatorPipeline in a single
+  pass, using a function compiled for each item class (see compile_field_checks).
+
+  Rather than logging a warning for each invalid item, counts validation failures in
+  the stats (snl_validation/failures/<Class>.<field>), and logs a summary with an
+  example of each kind of failure when the spider closes.
+  """
+
+  def __init__(self, stats=None):
+    self.stats = stats
+
+  @classmethod
+  def from_crawler(cls, crawler):
+    return cls(crawler.stats)
+
+  def open_spider(self, spider):
+    self.checks = {item_class: compile_field_checks(item_class)
+        for item_class in schema.item_classes()}
+    # (class name, fieldname) -> number of failures
+    self.failures = defaultdict(int)
+    # (class name, fieldname) -> (item, message) for the first such failure
+    self.examples = {}
+
+  def fail(self, item, fieldname, message):
+    key = (item.__class__.__name__, fieldname)
+    self.failures[key] += 1
+    if key not in self.examples:
+      self.examples[key] = (item, message)
+    if self.stats is not None:
+      self.stats.inc_value('snl_validation/failures')
+      self.stats.inc_value('snl_validation/failures/{}.{}'.format(*key))
+
+  def process_item(self, item, spider):
+    check = self.checks.get(item.__class__)
+    if check is None:
+      check = self.checks[item.__class__] = compile_field_checks(item.__class__)
+    return check(item, self.fail)
+
+  def close_spider(self, spider):
+    if not self.failures:
+      return
+    logging.warning('{} validation failures:\n{}'.format(sum(self.failures.values()),
+      '\n'.join('{}.{}: {}. e.g. {}\n{}'.format(classname, fieldname, count,
+          *self.examples[(classname, fieldname)])
+        for ((classname, fieldname), count) in sorted(self.failures.items()))
+    ))
@@ -0,0 +1,223 @@
+"""Record holders (most appearances overall, in a season, in a single episode, most
+times hosting...), computed by streaming through the exported json-lines tables (see
+tables.py), without loading them into pandas.
+
+A Tally counts appearances per actor, overall and within each group of each of its
+group keys (season, episode, capacity, category). Counting is a single pass over the
+rows, and picking the top k of a group uses a heap, so e.g. tally.top(3, 'season')
+never sorts any season's whole list of actors.
+
+load_tallies caches the tally of each file it reads (in <data_root>/.records_cache),
+and reuses it for as long as the file (and, for appearances, the titles it was read
+alongside) is unchanged. So when the tables are sharded by season (see
+SNL_SHARD_BY_SEASON), adding a season means reading just that season's files. (An
+unsharded table is read again in full whenever it changes.)
+
+Usage:
+  python -m snlscrape.recordbook [--data output] [-k 5]
+"""
+from __future__ import print_function
+import argparse
+import hashlib
+import heapq
+import os
+import pickle
+
+from snlscrape import helpers, tables
+from snlscrape.stages import hash_file
+
+CACHE_DIRNAME = '.records_cache'
+CACHE_FNAME = 'tallies.pickle'
+# Bump to invalidate cached tallies, when changing how they're counted
+VERSION = 1
+
+APPEARANCE_KEYS = ('season', 'episode', 'capacity', 'category')
+HOST_KEYS = ('season',)
+
+def top_k(k, counts):
+  """The k (aid, count) pairs with the highest counts, most first (and ties in order of
+  aid)."""
+  return heapq.nsmallest(k, counts.items(), key=lambda item: (-item[1], item[0]))
+
+def group_order(group):
+  # (Missing groups, e.g. the category of a title we don't have, go last)
+  return (group is None, group)
+
+class Tally(object):
+
+  def __init__(self, keys=APPEARANCE_KEYS):
+    # group key -> group -> aid -> count. The key None has a single group, None,
+    # counting everything.
+    self.counts = {key: {} for key in (None,) + tuple(keys)}
+
+  @classmethod
+  def from_counts(cls, counts):
+    tally = cls(())
+    tally.counts = counts
+    return tally
+
+  def add(self, aid, groups):
+    """Count one appearance by aid, given a dict mapping each group key to the group
+    it falls in."""
+    for key, by_group in self.counts.items():
+      group = groups.get(key)
+      counts = by_group.get(group)
+      if counts is None:
+        counts = by_group[group] = {}
+      counts[aid] = counts.get(aid, 0) + 1
+
+  def update(self, other):
+    """Add the counts from another tally (e.g. of another file)."""
+    for key, by_group in other.counts.items():
+      mine = self.counts.setdefault(key, {})
+      for group, counts in by_group.items():
+        total = mine.setdefault(group, {})
+        for aid, n in counts.items():
+          total[aid] = total.get(aid, 0) + n
+
+  def groups(self, by):
+    return sorted(self.counts[by], key=group_order)
+
+  def top(self, k=1, by=None):
+    """Return the top k (aid, count) pairs overall or, if by is given, a dict mapping
+    each group of that key to its top k."""
+    if by is None:
+      return top_k(k, self.counts[None].get(None, {}))
+    return {group: top_k(k, self.counts[by][group]) for group in self.groups(by)}
+
+  def top_groups(self, k=1, by='episode'):
+    """The k highest counts within any single group of the given key, as
+    (group, aid, count) triples. e.g. the most appearances anyone has made in one
+    episode."""
+    triples = ((group, aid, n) for (group, counts) in self.counts[by].items()
+        for (aid, n) in counts.items())
+    return heapq.nsmallest(k, triples,
+        key=lambda triple: (-triple[2], triple[1], group_order(triple[0])))
+
+def read_categories(paths):
+  """Map each tid in the given titles files to its category."""
+  categories = {}
+  for path in paths:
+    for row in tables.read_rows(path):
+      categories[row['tid']] = row.get('category')
+  return categories
+
+def tally_appearances(path, title_paths):
+  categories = read_categories(title_paths)
+  tally = Tally(APPEARANCE_KEYS)
+  sids = {}
+  for row in tables.read_rows(path):
+    tid = row['tid']
+    epid = helpers.Epid.from_tid(tid)
+    if epid not in sids:
+      sids[epid] = helpers.Sid.from_epid(epid)
+    tally.add(row['aid'], dict(season=sids[epid], episode=epid,
+      capacity=row.get('capacity'), category=categories.get(tid)))
+  return tally
+
+def tally_hosts(path):
+  tally = Tally(HOST_KEYS)
+  for row in tables.read_rows(path):
+    tally.add(row['aid'], dict(season=helpers.Sid.from_epid(row['epid'])))
+  return tally
+
+def title_paths_for(data_root, path):
+  """The titles files holding the titles of the appearances in the file at path: the
+  titles shard for the same season, if path is a shard (and there is one), and
+  otherwise all of them."""
+  match = tables.SHARD_FNAME_RE.match(os.path.basename(path))
+  if match:
+    shard = tables.find_table(data_root, 'titles', sid=int(match.group(1)))
+    if shard:
+      return [shard]
+  return tables.table_paths(data_root, 'titles')
+
+class TallyCache(object):
+  """The tallies of individual files, keyed by path, each saved with a fingerprint of
+  the files it was counted from."""
+
+  def __init__(self, cache_dir):
+    self.path = os.path.join(cache_dir, CACHE_FNAME)
+    self.entries = {}
+    if os.path.exists(self.path):
+      with open(self.path, 'rb') as f:
+        self.entries = pickle.load(f)
+    self.used = {}
+    self._hashes = {}
+
+  def fingerprint(self, paths):
+    h = hashlib.sha1(str(VERSION).encode('utf-8'))
+    for path in paths:
+      if path not in self._hashes:
+        self._hashes[path] = hash_file(path)
+      h.update(self._hashes[path].encode('utf-8'))
+    return h.hexdigest()
+
+  def get(self, key, paths, count):
+    """Return the cached tally for key if it was counted from the current contents of
+    paths, or else the result of calling count."""
+    fingerprint = self.fingerprint(paths)
+    entry = self.entries.get(key)
+    if entry is None or entry[0] != fingerprint:
+      # (Just the counts are saved, so the cache doesn't depend on where Tally lives -
+      # this module may be running as __main__)
+      entry = (fingerprint, count().counts)
+    self.used[key] = entry
+    return Tally.from_counts(entry[1])
+
+  def save(self):
+    """Save the entries used since loading (dropping any for files that are gone), if
+    they've changed."""
+    if self.used.keys() == self.entries.keys() and all(
+        self.used[key][0] == self.entries[key][0] for key in self.used):
+      return
+    dirpath = os.path.dirname(self.path)
+    if not os.path.isdir(dirpath):
+      os.makedirs(dirpath)
+    tmp_path = self.path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+      pickle.dump(self.used, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, self.path)
+
+def load_tallies(data_root='output', cache_dir=None):
+  """Return a dict with Tallies of the appearances and hosts tables in data_root."""
+  cache = TallyCache(cache_dir or os.path.join(data_root, CACHE_DIRNAME))
+  appearances = Tally(APPEARANCE_KEYS)
+  for path in tables.table_paths(data_root, 'appearances'):
+    title_paths = title_paths_for(data_root, path)
+    appearances.update(cache.get(os.path.relpath(path, data_root), [path] + title_paths,
+      lambda: tally_appearances(path, title_paths)))
+  hosts = Tally(HOST_KEYS)
+  for path in tables.table_paths(data_root, 'hosts'):
+    hosts.update(cache.get(os.path.relpath(path, data_root), [path],
+      lambda: tally_hosts(path)))
+  cache.save()
+  return dict(appearances=appearances, hosts=hosts)
+
+def print_top(title, top):
+  print(title)
+  for aid, n in top:
+    print('  {:4d} {}'.format(n, aid))
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+  parser.add_argument('--data', default='output',
+      help='Directory containing the json tables (default: output)')
+  parser.add_argument('-k', type=int, default=5, help='How many record holders to show')
+  args = parser.parse_args()
+  tallies = load_tallies(args.data)
+  apps, hosts = tallies['appearances'], tallies['hosts']
+  print_top('Most appearances', apps.top(args.k))
+  print_top('Most times hosting', hosts.top(args.k))
+  print('Most appearances in a single episode')
+  for epid, aid, n in apps.top_groups(args.k, 'episode'):
+    print('  {:4d} {} ({})'.format(n, aid, epid))
+  print('Most appearances in a season')
+  for sid, top in apps.top(1, 'season').items():
+    print('  {:>4} {}'.format(sid, ', '.join('{} ({})'.format(aid, n) for (aid, n) in top)))
+  print('Most appearances by capacity')
+  for capacity, top in apps.top(1, 'capacity').items():
+    print('  {:>8} {}'.format(capacity, ', '.join('{} ({})'.format(aid, n) for (aid, n) in top)))
+
+if __name__ == '__main__':
+  main()
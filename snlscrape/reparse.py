@@ -0,0 +1,216 @@
+"""Re-run the spiders' parse callbacks over the pages saved in a ResponseStore (see
+store.py), without scrapy's engine or twisted. Episode and cast pages are parsed in a
+pool of worker processes, and the resulting items are fed, in a fixed order, through
+the pipelines in ITEM_PIPELINES. The output is therefore byte-identical to a run
+with a single process (-j 1).
+
+Usage:
+  python -m snlscrape.reparse [--store htmlstore] [-j 4] [-s SNL_OUTPUT_DIR=output]
+"""
+from __future__ import print_function
+import argparse
+import logging
+import multiprocessing
+import re
+import time
+
+import scrapy
+from scrapy.exceptions import DropItem
+from scrapy.http import Headers, Request
+from scrapy.responsetypes import responsetypes
+from scrapy.signalmanager import SignalManager
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.log import configure_logging
+from scrapy.utils.misc import load_object
+from scrapy.utils.project import get_project_settings
+
+from snlscrape import helpers, items
+from snlscrape.spiders.cast import CastSpider
+from snlscrape.spiders.snl import SnlSpider
+from snlscrape.store import ResponseStore
+
+EPISODE_URL_RE = re.compile(r'^http://www\.snlarchives\.net/Episodes/\?(\d{8})$')
+CAST_URL_RE = re.compile(r'^http://www\.snlarchives\.net/Cast/\?(\w+)$')
+IMDB_SEASON_URL_RE = re.compile(re.escape(SnlSpider.base_url_imdb) + r'(\d+)$')
+
+class ReparseCrawler(object):
+  """Stands in for a scrapy Crawler, for the benefit of pipelines' from_crawler methods."""
+
+  def __init__(self, settings):
+    self.settings = settings
+    self.signals = SignalManager(self)
+    self.stats = MemoryStatsCollector(self)
+    self.spider = None
+
+# Per-process state for workers (see _init_worker)
+_store = None
+_spiders = None
+
+def _init_worker(store_root, overrides):
+  global _store, _spiders
+  _store = ResponseStore(store_root)
+  settings = load_settings(overrides)
+  _spiders = {}
+  for spidercls in (SnlSpider, CastSpider):
+    spider = spidercls()
+    spider.settings = settings
+    _spiders[spidercls.name] = spider
+
+def load_settings(overrides):
+  settings = get_project_settings()
+  for k, v in overrides.items():
+    settings.set(k, v, priority='cmdline')
+  return settings
+
+def stored_response(store, url, meta):
+  entry = store.get(url)
+  body = store.body(entry['sha1'])
+  headers = Headers(entry['headers'])
+  respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+  return respcls(url=url, status=entry['status'], headers=headers, body=body,
+      request=Request(url, meta=meta))
+
+def _parse_page(task):
+  """Run one parse callback over one stored page. Return a list of (classname, fields)
+  pairs for the items it produced, so that results pickle cheaply and are rebuilt
+  identically whether or not they crossed a process boundary.
+  """
+  spider_name, callback_name, url, meta = task
+  spider = _spiders[spider_name]
+  response = stored_response(_store, url, meta)
+  results = []
+  try:
+    for thing in getattr(spider, callback_name)(response) or []:
+      if isinstance(thing, items.SnlItemMixin):
+        results.append( (thing.__class__.__name__, dict(thing)) )
+  except Exception:
+    logging.exception('Error parsing {}'.format(url))
+  return results
+
+def episode_tasks(store, spider):
+  """Return the Season items (from the stored listing of all seasons, if there is
+  one), and the tasks for every stored episode page, in epid order.
+  """
+  seasons = {}
+  index_url = SnlSpider.start_urls[0]
+  if index_url in store:
+    for thing in spider.parse(stored_response(store, index_url, {})):
+      if isinstance(thing, items.Season):
+        seasons[thing['sid']] = thing
+  tasks = []
+  for url in store.urls():
+    match = EPISODE_URL_RE.match(url)
+    if not match:
+      continue
+    epid = match.group(1)
+    sid = helpers.Sid.from_epid(epid)
+    season = seasons.setdefault(sid, items.Season(sid=sid, year=1974 + sid))
+    tasks.append( (SnlSpider.name, 'parseEpisode', url, {'season': season}) )
+  return [seasons[sid] for sid in sorted(seasons)], tasks
+
+def ratings_tasks(store, spider):
+  """Tasks for the stored IMDB episode ratings pages. The ratings requests (and
+  their metadata) come from running parseRatingsSeason over the stored season pages.
+  """
+  tasks = []
+  season_urls = [url for url in store.urls() if IMDB_SEASON_URL_RE.match(url)]
+  for url in sorted(season_urls, key=lambda url: int(IMDB_SEASON_URL_RE.match(url).group(1))):
+    sid = int(IMDB_SEASON_URL_RE.match(url).group(1))
+    response = stored_response(store, url, {'season': items.Season(sid=sid, year=1974 + sid)})
+    for request in spider.parseRatingsSeason(response):
+      if request.url in store:
+        tasks.append( (SnlSpider.name, 'parseRatingsEpisode', request.url, request.meta) )
+  return tasks
+
+def cast_tasks(store):
+  return [ (CastSpider.name, 'parseCastMember', url, {})
+      for url in store.urls() if CAST_URL_RE.match(url) and not url.endswith('?FullList')
+  ]
+
+def build_pipelines(crawler):
+  pipelines = []
+  pipeline_paths = crawler.settings.getdict('ITEM_PIPELINES')
+  for path in sorted(pipeline_paths, key=pipeline_paths.get):
+    cls = load_object(path)
+    if hasattr(cls, 'from_crawler'):
+      pipelines.append(cls.from_crawler(crawler))
+    else:
+      pipelines.append(cls())
+  return pipelines
+
+def process_items(pipelines, spider, things):
+  n = 0
+  for item in things:
+    try:
+      for pipeline in pipelines:
+        item = pipeline.process_item(item, spider)
+    except DropItem:
+      continue
+    n += 1
+  return n
+
+def reparse(store_root, jobs=None, overrides=None):
+  """Reparse everything in the store at store_root, using the given number of worker
+  processes (default: one per cpu). Return the number of items exported.
+  """
+  overrides = overrides or {}
+  settings = load_settings(overrides)
+  store = ResponseStore(store_root)
+  crawler = ReparseCrawler(settings)
+  spider = SnlSpider()
+  spider.settings = settings
+  crawler.spider = spider
+
+  seasons, tasks = episode_tasks(store, spider)
+  if settings.getbool('SNL_SCRAPE_IMDB'):
+    tasks += ratings_tasks(store, spider)
+  tasks += cast_tasks(store)
+
+  pipelines = build_pipelines(crawler)
+  crawler.stats.open_spider(spider)
+  for pipeline in pipelines:
+    if hasattr(pipeline, 'open_spider'):
+      pipeline.open_spider(spider)
+
+  n_items = process_items(pipelines, spider, seasons)
+  if jobs == 1:
+    _init_worker(store_root, overrides)
+    results = map(_parse_page, tasks)
+    pool = None
+  else:
+    pool = multiprocessing.Pool(jobs, initializer=_init_worker, initargs=(store_root, overrides))
+    # imap preserves task order, which is what makes the output deterministic.
+    results = pool.imap(_parse_page, tasks, chunksize=8)
+  for result in results:
+    things = (getattr(items, classname)(**fields) for (classname, fields) in result)
+    n_items += process_items(pipelines, spider, things)
+  if pool is not None:
+    pool.close()
+    pool.join()
+
+  for pipeline in pipelines:
+    if hasattr(pipeline, 'close_spider'):
+      pipeline.close_spider(spider)
+  crawler.signals.send_catch_log(signal=scrapy.signals.spider_closed, spider=spider,
+      reason='finished')
+  crawler.stats.close_spider(spider, reason='finished')
+  return n_items
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+  parser.add_argument('--store', help='Response store directory (default: SNL_STORE_DIR)')
+  parser.add_argument('-j', '--jobs', type=int, default=None,
+      help='Number of worker processes (default: number of cpus)')
+  parser.add_argument('-s', '--set', action='append', default=[], metavar='NAME=VALUE',
+      help='Override a setting, as with scrapy crawl')
+  args = parser.parse_args()
+  overrides = dict(kv.split('=', 1) for kv in args.set)
+  settings = load_settings(overrides)
+  configure_logging(settings)
+  store_root = args.store or settings.get('SNL_STORE_DIR')
+  start = time.time()
+  n = reparse(store_root, args.jobs, overrides)
+  print('Exported {} items in {:.1f}s'.format(n, time.time() - start))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,45 @@
+"""Logical column types for the output tables, derived from the field metadata in
+items.py. (Used to load the tables with consistent types - see frames.py.)
+
+The types are:
+  - INT: 'type=int', or a 'numeric_id' (an id like an epid or tid, which the scraper
+    keeps as a string of digits)
+  - BOOL: 'type=bool'
+  - CATEGORY: fields with 'possible_values', or 'interned' fields, whose values are
+    repeated across many rows (and tables), such as actor names
+  - STRING: any other 'type=string_types' field, or a field with no type
+  - OBJECT: anything else (e.g. the dicts on EpisodeRating)
+"""
+from six import string_types
+
+from snlscrape import items
+
+INT = 'int'
+BOOL = 'bool'
+CATEGORY = 'category'
+STRING = 'string'
+OBJECT = 'object'
+
+def logical_type(field):
+  if 'possible_values' in field or field.get('interned'):
+    return CATEGORY
+  if field.get('numeric_id'):
+    return INT
+  ftype = field.get('type')
+  if ftype is None or ftype is string_types:
+    return STRING
+  if ftype is int:
+    return INT
+  if ftype is bool:
+    return BOOL
+  return OBJECT
+
+def column_types(item_class):
+  """Return a dict mapping each field of the given item class to its logical type."""
+  return {fieldname: logical_type(field) for fieldname, field in item_class.fields.items()}
+
+def item_classes():
+  return [cls for cls in vars(items).values()
+      if isinstance(cls, type) and issubclass(cls, items.SnlItemMixin)
+      and cls not in (items.SnlItemMixin, items.BaseSnlItem, items.BaseSnlRecord)
+  ]
@@ -9,23 +9,89 @@
 #     http://scrapy.readthedocs.org/en/latest/topics/downloader-middleware.html
 #     http://scrapy.readthedocs.org/en/latest/topics/spider-middleware.html
 
+import os
+
 ######### SNL custom settings
 
-# (See the target_* properties on SnlSpider)
+# Restrict a crawl to particular titles, episodes, seasons etc. (See targets.py)
+# Empty values are interpreted as "everything".
 SNL_TARGET_TIDS = None
 SNL_TARGET_TID = None
 
 SNL_TARGET_EPIDS = None
 SNL_TARGET_EPID = None
 
+# Seasons may be given as inclusive ranges, e.g. SNL_TARGET_SIDS=40-46
 SNL_TARGET_SIDS = None
 SNL_TARGET_SID = None
 
+# Inclusive bounds on air date, as YYYYMMDD or YYYY-MM-DD
+SNL_TARGET_AIRED_AFTER = None
+SNL_TARGET_AIRED_BEFORE = None
+
+# Title categories (see Title in items.py) to include / exclude
+SNL_TARGET_CATEGORIES = None
+SNL_EXCLUDE_CATEGORIES = None
+
 # Whether to scrape IMDB user ratings of episodes.
 SNL_SCRAPE_IMDB = True
 
+# Whether to parse episode pages with precompiled xpath queries over the lxml tree,
+# rather than scrapy css selectors. Both give the same items (see pages.py).
+SNL_FAST_PARSE = True
+
 # The name of the directory to write json files to (one file per class in items.py)
 SNL_OUTPUT_DIR = 'output'
+# Compress the json files - None, 'gzip' (titles.json.gz etc.) or 'zstd' (titles.json.zst -
+# requires the zstandard package). Everything that reads them handles either.
+SNL_OUTPUT_COMPRESSION = None
+# Bytes of json buffered in memory (per table) between writes
+SNL_EXPORT_BUFFER_SIZE = 1 << 20
+# If true, split the tables of items belonging to a single season (episodes, titles,
+# appearances, hosts, casts) into a file per season, e.g. output/titles/sid=27.jsonl.
+# A crawl then only rewrites the shards of the seasons it scraped, and merges its
+# items into the other tables.
+SNL_SHARD_BY_SEASON = False
+
+# If true, only request the episodes that aren't already in SNL_OUTPUT_DIR (plus all
+# episodes of the latest season), and merge the newly scraped items into the existing
+# tables rather than overwriting them.
+SNL_INCREMENTAL = False
+
+# Used by SqliteExportPipeline (which isn't enabled by default - add it to ITEM_PIPELINES)
+SNL_SQLITE_PATH = 'output/snl.sqlite'
+# Number of rows inserted per transaction
+SNL_SQLITE_BATCH_SIZE = 500
+
+# Whether to save every downloaded page to the response store in SNL_STORE_DIR (see store.py)
+SNL_STORE_ENABLED = False
+SNL_STORE_DIR = 'htmlstore'
+# If true, serve every request from the response store, and never touch the network.
+# Can also be turned on by setting the SNL_OFFLINE environment variable to 1.
+SNL_OFFLINE = os.environ.get('SNL_OFFLINE') == '1'
+
+# If set, periodically checkpoint the crawl's progress to this directory, so that an
+# interrupted crawl can be resumed by re-running it with the same SNL_JOB_DIR (see jobs.py)
+SNL_JOB_DIR = None
+# Number of pages processed between checkpoints
+SNL_CHECKPOINT_INTERVAL = 50
+
+# Per-host throttling (see HostThrottleMiddleware). Each host gets its own concurrency
+# budget, and its own download delay, which starts at the value given here and goes
+# up if the host slows down or starts returning errors (see throttle.py).
+# Hosts not listed here use CONCURRENT_REQUESTS_PER_DOMAIN and DOWNLOAD_DELAY.
+SNL_THROTTLE_ENABLED = True
+SNL_HOST_CONCURRENCY = {
+    'www.snlarchives.net': 1,
+    'www.imdb.com': 1,
+}
+SNL_HOST_DELAY = {
+    'www.snlarchives.net': .5,
+    'www.imdb.com': .5,
+}
+SNL_THROTTLE_MAX_DELAY = 10
+# At a 100% recent error rate, a host's delay gets multiplied by 1 + this.
+SNL_THROTTLE_ERROR_BACKOFF = 4.0
 
 #########
 
@@ -38,20 +104,26 @@ LOG_FORMATTER = 'snlscrape.format.SilentDropFormatter'
 
 ITEM_PIPELINES = {
     'snlscrape.pipelines.EntityDedupePipeline': 300,
-    'snlscrape.pipelines.DefaultValueSetterPipeline': 400,
-    'snlscrape.pipelines.ValidatorPipeline': 500,
+    # Sets default values and validates fields (i.e. DefaultValueSetterPipeline followed by
+    # ValidatorPipeline, compiled per item class)
+    'snlscrape.pipelines.FieldCheckPipeline': 400,
     'snlscrape.pipelines.MultiJsonExportPipeline': 700,
+    #'snlscrape.pipelines.SqliteExportPipeline': 710,
 } 
 
 LOG_LEVEL = 'INFO'
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-CONCURRENT_REQUESTS = 1
+# The load on each site is limited by the per-host budgets in SNL_HOST_CONCURRENCY.
+# This is deliberately higher than their sum, because requests waiting out a host's
+# download delay count against it, and we don't want requests queued for a slow host
+# to hold up the others.
+CONCURRENT_REQUESTS = 8
 
-# See also autothrottle settings and docs
+# See also the SNL_THROTTLE_* settings above
 DOWNLOAD_DELAY = .5
 # The download delay setting will honor only one of:
-#CONCURRENT_REQUESTS_PER_DOMAIN = 16
+CONCURRENT_REQUESTS_PER_DOMAIN = 1
 #CONCURRENT_REQUESTS_PER_IP = 16
 
 # Disable cookies (enabled by default)
@@ -68,15 +140,18 @@ DOWNLOAD_DELAY = .5
 
 # Enable or disable spider middlewares
 # See http://scrapy.readthedocs.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    'snlscrape.middlewares.SnlscrapeSpiderMiddleware': 543,
-#}
+SPIDER_MIDDLEWARES = {
+    'snlscrape.jobs.CheckpointMiddleware': 950,
+}
 
 # Enable or disable downloader middlewares
 # See http://scrapy.readthedocs.org/en/latest/topics/downloader-middleware.html
 DOWNLOADER_MIDDLEWARES = {
     'scrapy.downloadermiddlewares.useragent.UserAgentMiddleware': None,
     'scrapy_fake_useragent.middleware.RandomUserAgentMiddleware': 400,
+    # Just below HttpCompressionMiddleware (590), so that stored bodies are already decompressed
+    'snlscrape.middlewares.ResponseStoreMiddleware': 580,
+    'snlscrape.middlewares.HostThrottleMiddleware': 950,
 }
 
 # Enable or disable extensions
@@ -0,0 +1,228 @@
+"""Save the database (i.e. the csvs written by convert_json_to_csv.py) as a snapshot
+of column-oriented binary files, which can be loaded back into DataFrames without any
+parsing, by memory-mapping them.
+
+A snapshot is a directory containing:
+  - manifest.json, listing each table's columns, and how each is stored
+  - strings.blob: every distinct string in the database, utf-8 encoded, NUL-terminated
+    and concatenated. String and categorical columns are stored as int32 indices into
+    this dictionary (-1 for null).
+  - <table>.<column>.npy: one or more fixed-width arrays per column (e.g. a nullable
+    integer column gets a values array and a mask array)
+
+Numeric arrays are loaded with mmap_mode='r', so loading costs little more than
+a few system calls, and processes loading the same snapshot share its pages via the
+OS's page cache. (DataFrames built on them are read-only until modified - pandas
+copies on write.)
+
+Usage:
+  python -m snlscrape.snapshot [--data output] [--out output/snapshot]
+"""
+from __future__ import print_function
+import argparse
+import glob
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from six import string_types
+
+MANIFEST_FNAME = 'manifest.json'
+BLOB_FNAME = 'strings.blob'
+# Follows each string in the blob
+TERMINATOR = u'\0'
+
+# How a column is stored
+NUMERIC = 'numeric' # a single fixed-width array (numbers, or datetimes)
+NULLABLE = 'nullable' # values + mask (for pandas' nullable ints and bools)
+STRING = 'string' # indices into the string dictionary
+CATEGORY = 'category' # codes + categories (the latter stored as a column in turn)
+JSON = 'json' # anything else, json-encoded and then stored as a string column
+
+class StringDictionary(object):
+  """Assigns each distinct string an index, while writing a snapshot."""
+
+  def __init__(self):
+    self.index = {}
+
+  def encode(self, values):
+    """Return an int32 array of indices for the given strings (or Nones)."""
+    index = self.index
+    codes = np.empty(len(values), dtype='int32')
+    for i, value in enumerate(values):
+      if value is None:
+        codes[i] = -1
+        continue
+      code = index.get(value)
+      if code is None:
+        code = index[value] = len(index)
+      codes[i] = code
+    return codes
+
+  def save(self, dirpath):
+    encoded = []
+    for s in sorted(self.index, key=self.index.get):
+      if TERMINATOR in s:
+        raise ValueError('Can\'t save string containing NUL: {!r}'.format(s))
+      encoded.append((s + TERMINATOR).encode('utf-8'))
+    with open(os.path.join(dirpath, BLOB_FNAME), 'wb') as f:
+      f.write(b''.join(encoded))
+
+def load_strings(dirpath):
+  """Return an object array of every string in the snapshot's dictionary, with a
+  trailing None (so that taking index -1 gives None)."""
+  with open(os.path.join(dirpath, BLOB_FNAME), 'rb') as f:
+    blob = f.read()
+  # Decoded in one go and split on the terminators, which is much faster than decoding
+  # each string separately. (After the last terminator, split gives us an empty string,
+  # which we replace with None.)
+  strings = np.array(blob.decode('utf-8').split(TERMINATOR), dtype=object)
+  strings[-1] = None
+  return strings
+
+def is_strings(values):
+  return all(isinstance(v, string_types) for v in values if v is not None)
+
+def object_values(col):
+  """The values of col as a list, with None for nulls."""
+  return [None if pd.isnull(v) else v for v in col.astype(object).tolist()]
+
+class SnapshotWriter(object):
+
+  def __init__(self, dirpath):
+    self.dirpath = dirpath
+    self.strings = StringDictionary()
+    self.manifest = {}
+
+  def save_array(self, fname, arr):
+    np.save(os.path.join(self.dirpath, fname), np.ascontiguousarray(arr))
+    return fname
+
+  def column_spec(self, prefix, col):
+    """Save the given column, and return a description of how it's stored."""
+    dtype = col.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+      categories = pd.Series(dtype.categories)
+      return dict(kind=CATEGORY,
+          codes=self.save_array(prefix + '.codes.npy', col.cat.codes.values),
+          categories=self.column_spec(prefix + '.categories', categories),
+      )
+    if isinstance(dtype, pd.api.extensions.ExtensionDtype) and dtype.kind in 'biuf':
+      # Nullable int/bool/float
+      na_value = False if dtype.kind == 'b' else 0
+      return dict(kind=NULLABLE, dtype=str(dtype),
+          values=self.save_array(prefix + '.npy',
+            col.to_numpy(dtype=dtype.numpy_dtype, na_value=na_value)),
+          mask=self.save_array(prefix + '.mask.npy', col.isnull().values),
+      )
+    if dtype.kind in 'biuf' or (isinstance(dtype, np.dtype) and dtype.kind == 'M'):
+      return dict(kind=NUMERIC, values=self.save_array(prefix + '.npy', col.values))
+    values = object_values(col)
+    if is_strings(values):
+      return dict(kind=STRING,
+          codes=self.save_array(prefix + '.npy', self.strings.encode(values)))
+    jsons = [None if v is None else json.dumps(v) for v in values]
+    return dict(kind=JSON,
+        codes=self.save_array(prefix + '.npy', self.strings.encode(jsons)))
+
+  def add_table(self, name, df):
+    self.manifest[name] = dict(
+        n_rows=len(df),
+        columns=[[colname, self.column_spec('{}.{}'.format(name, i), df[colname])]
+          for (i, colname) in enumerate(df.columns)],
+    )
+
+  def finish(self):
+    self.strings.save(self.dirpath)
+    with io.open(os.path.join(self.dirpath, MANIFEST_FNAME), 'w', encoding='utf-8') as f:
+      f.write(json.dumps(self.manifest, indent=1, ensure_ascii=False))
+
+def write_snapshot(tables, dirpath):
+  """Save the given dict of DataFrames as a snapshot at dirpath (replacing any existing
+  snapshot there)."""
+  tmp_path = dirpath.rstrip(os.sep) + '.tmp'
+  if os.path.exists(tmp_path):
+    shutil.rmtree(tmp_path)
+  os.makedirs(tmp_path)
+  writer = SnapshotWriter(tmp_path)
+  for name in sorted(tables):
+    writer.add_table(name, tables[name])
+  writer.finish()
+  if os.path.exists(dirpath):
+    shutil.rmtree(dirpath)
+  os.rename(tmp_path, dirpath)
+
+class SnapshotReader(object):
+
+  def __init__(self, dirpath):
+    self.dirpath = dirpath
+    with io.open(os.path.join(dirpath, MANIFEST_FNAME), encoding='utf-8') as f:
+      self.manifest = json.load(f)
+    self._strings = None
+
+  @property
+  def strings(self):
+    if self._strings is None:
+      self._strings = load_strings(self.dirpath)
+    return self._strings
+
+  def array(self, fname):
+    return np.load(os.path.join(self.dirpath, fname), mmap_mode='r')
+
+  def column(self, spec):
+    kind = spec['kind']
+    if kind == NUMERIC:
+      return self.array(spec['values'])
+    if kind == NULLABLE:
+      values, mask = self.array(spec['values']), self.array(spec['mask'])
+      if spec['dtype'] == 'boolean':
+        return pd.arrays.BooleanArray(values, mask)
+      if values.dtype.kind == 'f':
+        return pd.arrays.FloatingArray(values, mask)
+      return pd.arrays.IntegerArray(values, mask)
+    if kind == CATEGORY:
+      categories = self.column(spec['categories'])
+      return pd.Categorical.from_codes(self.array(spec['codes']), categories=categories)
+    strings = self.strings.take(self.array(spec['codes']))
+    if kind == JSON:
+      return np.array([None if s is None else json.loads(s) for s in strings], dtype=object)
+    return strings
+
+  def table(self, name):
+    desc = self.manifest[name]
+    return pd.DataFrame({colname: pd.Series(self.column(spec), copy=False)
+      for (colname, spec) in desc['columns']},
+      columns=[colname for (colname, _) in desc['columns']], copy=False)
+
+  def tables(self):
+    return {name: self.table(name) for name in self.manifest}
+
+def load_snapshot(dirpath, tables=None):
+  """Return a dict mapping table name to DataFrame for the snapshot at dirpath
+  (optionally only for the given table names)."""
+  reader = SnapshotReader(dirpath)
+  return {name: reader.table(name) for name in (tables or reader.manifest)}
+
+def load_csvs(data_root):
+  tables = {}
+  for path in sorted(glob.glob(os.path.join(data_root, '*.csv'))):
+    name = os.path.basename(path).split('.')[0]
+    tables[name] = pd.read_csv(path, encoding='utf-8')
+  return tables
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+  parser.add_argument('--data', default='output',
+      help='Directory containing the csv tables (default: output)')
+  parser.add_argument('--out', help='Where to save the snapshot (default: <data>/snapshot)')
+  args = parser.parse_args()
+  out = args.out or os.path.join(args.data, 'snapshot')
+  tables = load_csvs(args.data)
+  write_snapshot(tables, out)
+  print('Saved {} tables to {}'.format(len(tables), out))
+
+if __name__ == '__main__':
+  main()
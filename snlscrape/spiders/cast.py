@@ -1,3 +1,5 @@
+import logging
+
 import scrapy
 
 from snlscrape import helpers
@@ -41,7 +43,7 @@ class CastSpider(scrapy.Spider):
             # The first sequence of popup_ elements represent seasons, but there
             # are others that immediately follow with stuff like characters and
             # impressions. If we've reached one of those, we've fallen off the end.
-            raise StopIteration
+            return
           year = int(href.split('?')[1])
           sid = helpers.Sid.from_year(year)
           assert 'sid' not in cast
@@ -6,8 +6,11 @@ import re
 from collections import defaultdict
 from lazy import lazy
 
-from snlscrape import helpers
+from snlscrape import helpers, jobs, tables
+from snlscrape.dedupe import SeenRegistry
+from snlscrape.pages import CssEpisodePage, XPathEpisodePage
 from snlscrape.items import *
+from snlscrape.targets import TargetFilter
 
 def removeTags(sXML):
   cleanr = re.compile('<.*?>')
@@ -27,62 +30,121 @@ class SnlSpider(scrapy.Spider):
   base_url = "http://www.snlarchives.net"
   base_url_imdb = "http://www.imdb.com/title/tt0072562/episodes?season="
   printable = set(string.printable)
+  # sid of the latest season (set once we've seen the listing of all seasons, or, in a
+  # targeted crawl, which skips it, assumed to be the latest season targeted)
+  open_sid = None
 
-  def _target_ids_from_settings(self, idtype):
-    """Given a kind of id (tid, epid, sid), return the set of those ids we're
-    targetting for this scrape. (either because they're explicitly given in the 
-    corresponding settings variable, or because they're implied by a different 
-    selection. e.g. if we're targetting tid 200604151, that entails also scraping
-    the episode in which that title appears, epid 20060415.
-
-    In the normal case where we're crawling all titles/episodes/seasons we can get
-    our hands on, return an empty set.
+  @lazy
+  def targets(self):
+    """The TargetFilter deciding which seasons, episodes and titles to scrape (by
+    default, everything). See the SNL_TARGET_* settings.
     """
-    assert idtype in ('tid', 'epid', 'sid')
-    id_attr = 'SNL_TARGET_{}'.format(idtype.upper())
-    single_target = self.settings.get(id_attr)
-    multi_attr = id_attr + 'S'
-    multi_target = self.settings.getlist(multi_attr)
-    assert not (single_target and multi_target)
-    if single_target:
-      return {single_target}
-    elif multi_target:
-      return set(multi_target)
-    else:
-      return set()
-
-  # target_* properties: an empty value is intepreted as "everything"
-  @property
-  def target_tids(self):
-    return self._target_ids_from_settings('tid')
+    return TargetFilter.from_settings(self.settings)
 
   @lazy
-  def target_epids(self):
-    inherited = set([helpers.Epid.from_tid(tid) for tid in self.target_tids])
-    return set.union(inherited, self._target_ids_from_settings('epid'))
+  def seen(self):
+    """The dedupable entities (Actors, Sketches etc.) we've already yielded. We only
+    yield the first sighting of each."""
+    crawler = getattr(self, 'crawler', None)
+    seen = SeenRegistry(crawler.stats if crawler else None)
+    job = jobs.job_for(crawler) if crawler else None
+    if job is not None:
+      seen.restore(job.saved_state('spider_seen'))
+      job.register('spider_seen', seen)
+    return seen
 
   @lazy
-  def target_sids(self):
-    inherited = set([helpers.Sid.from_epid(epid) for epid in self.target_epids])
-    return set.union(inherited, self._target_ids_from_settings('sid'))
+  def episode_page_class(self):
+    """How to pull values out of episode pages. See SNL_FAST_PARSE and snlscrape.pages"""
+    if self.settings.getbool('SNL_FAST_PARSE', True):
+      return XPathEpisodePage
+    return CssEpisodePage
 
   def interested(self, item):
     """Should we yield this item and recurse on it (i.e. continue to the
     episodes in this season, or the titles in this episode)?"""
     if isinstance(item, Season):
-      return not self.target_sids or item['sid'] in self.target_sids
+      return self.targets.wants_season(item['sid'])
     elif isinstance(item, Episode):
-      return not self.target_epids or item['epid'] in self.target_epids
+      return self.targets.wants_episode(item['epid'])
     elif isinstance(item, Title):
-      return not self.target_tids or item['tid'] in self.target_tids
+      return self.targets.wants_title(item['tid'], item.get('category'))
     else:
       assert False, "What're you doing passing this: {}".format(item)
 
+  @lazy
+  def complete_epids(self):
+    """The epids of episodes that were scraped (along with their titles) by a previous
+    crawl into SNL_OUTPUT_DIR, and which therefore don't need to be requested again.
+    Always empty unless SNL_INCREMENTAL is set.
+    """
+    if not self.settings.getbool('SNL_INCREMENTAL'):
+      return set()
+    output_dir = self.settings.get('SNL_OUTPUT_DIR')
+    epids = {row['epid'] for row in tables.read_table(output_dir, 'episodes')}
+    titled_epids = {row['epid'] for row in tables.read_table(output_dir, 'titles')}
+    complete = epids & titled_epids
+    logging.info('Incremental crawl: skipping {} previously scraped episodes'.format(len(complete)))
+    return complete
+
+  @lazy
+  def complete_sids(self):
+    return {helpers.Sid.from_epid(epid) for epid in self.complete_epids}
+
+  def already_scraped(self, epid, sid):
+    """Can an incremental crawl skip this episode? The season that's currently
+    airing (the latest one) is always re-scraped, since it may have changed.
+    """
+    return sid != self.open_sid and epid in self.complete_epids
+
+  def start_requests(self):
+    """If we're targeting particular episodes (or titles), request their pages
+    directly, rather than going via the listing of all seasons and then each of their
+    season pages. Likewise for targeted seasons.
+    """
+    targets = self.targets
+    if not targets.sids:
+      for url in self.start_urls:
+        yield scrapy.Request(url, dont_filter=True)
+      return
+    # parse() won't run, so we don't know which season is airing. The latest one targeted
+    # might be, so its episodes mustn't be skipped by an incremental crawl.
+    self.open_sid = max(targets.sids)
+    epid_sids = set([helpers.Sid.from_epid(epid) for epid in targets.epids])
+    for sid in sorted(targets.sids):
+      if not targets.wants_season(sid):
+        continue
+      year = 1974 + sid
+      item_season = Season(sid=sid, year=year)
+      if self.settings.getbool('SNL_SCRAPE_IMDB'):
+        imdb_season_url = self.base_url_imdb + str(sid)
+        yield scrapy.Request(imdb_season_url, callback=self.parseRatingsSeason, 
+            meta=dict(season=item_season))
+      # Seasons that we're only targeting implicitly (via an episode) don't need their
+      # season page. The Season item gets yielded along with its first episode instead.
+      if sid not in epid_sids:
+        season_url = '{}/Seasons/?{}'.format(self.base_url, year)
+        yield scrapy.Request(season_url, callback=self.parseSeason,
+            meta={'season': item_season, 'yield_season': True})
+    seasons_yielded = set()
+    for epid in sorted(targets.epids):
+      if not targets.wants_episode(epid):
+        continue
+      sid = helpers.Sid.from_epid(epid)
+      item_season = Season(sid=sid, year=1974 + sid)
+      episode_url = '{}/Episodes/?{}'.format(self.base_url, epid)
+      yield scrapy.Request(episode_url, callback=self.parseEpisode,
+          meta={'season': item_season, 'yield_season': sid not in seasons_yielded})
+      seasons_yielded.add(sid)
+
   def parse(self, response):
     """Parse the entry page - the listing of all seasons."""
     # parsing snlarchives. Entrypoint is the seasons page at www.snlarchives.net/Seasons/
-    for season in response.css('div.thumbRectInner'):
-      sid = int(season.css('::text').extract_first())
+    season_divs = response.css('div.thumbRectInner')
+    sids = [int(season.css('::text').extract_first()) for season in season_divs]
+    if sids:
+      self.open_sid = max(sids)
+    for sid in sids:
       year = 1974 + sid
       next_page = '?{}'.format(year)
 
@@ -91,7 +153,9 @@ class SnlSpider(scrapy.Spider):
         continue
       yield item_season
     
-      if self.settings.getbool('SNL_SCRAPE_IMDB'):
+      # In an incremental crawl, ratings are only refreshed for seasons with new episodes.
+      closed = sid != self.open_sid and sid in self.complete_sids
+      if self.settings.getbool('SNL_SCRAPE_IMDB') and not closed:
         imdb_season_url = self.base_url_imdb + str(item_season['sid'])
         yield scrapy.Request(imdb_season_url, callback=self.parseRatingsSeason, 
             meta=dict(season=item_season))
@@ -128,7 +192,7 @@ class SnlSpider(scrapy.Spider):
     except IndexError:
       # e.g. http://www.imdb.com/title/tt7399178/ratings
       logging.warn('Insufficient user ratings for episode at {}'.format(response.url))
-      raise StopIteration
+      return
 
     trCount = 0
     # histogram of ratings from 1-10
@@ -164,13 +228,17 @@ class SnlSpider(scrapy.Spider):
     Example url: snlarchives.net/Seasons/?1975
     """
     item_season = response.meta['season']
+    if response.meta.get('yield_season'):
+      yield item_season
 
     for episode in response.css('#section_1 a'):
       href_url = episode.css("a ::attr(href)").extract_first()
       if href_url.startswith("/Episodes/?") and len(href_url) == 19:
         episode_url = self.base_url + href_url
-        dummy_ep = Episode(epid=self.id_from_url(episode_url))
-        if not self.interested(dummy_ep):
+        epid = self.id_from_url(episode_url)
+        if not self.targets.wants_episode(epid):
+          continue
+        if self.already_scraped(epid, item_season['sid']):
           continue
         yield scrapy.Request(episode_url, callback=self.parseEpisode, meta={'season': item_season})
 
@@ -180,9 +248,12 @@ class SnlSpider(scrapy.Spider):
     """
     item_season = response.meta['season']
     sid = item_season['sid']
+    if response.meta.get('yield_season'):
+      yield item_season
 
     epid = self.id_from_url(response.url)
     episode = Episode(sid=sid, epid=epid)
+    page = self.episode_page_class(response)
 
     hosts = []
     # NB: I don't think there's any reason to distinguish between the below lists (they just get lumped together at the end)
@@ -196,11 +267,7 @@ class SnlSpider(scrapy.Spider):
         'Filmed Cameo:': filmed_cameos, 'Filmed Cameos:': filmed_cameos,
         }
     # Parse table with basic episode metadata (date, host, musical guest, cameos...)
-    for epInfoTr in response.css("table.epGuests tr"):
-      epInfoTd = epInfoTr.css("td")
-      fieldTd, valueTd = epInfoTd # e.g. ("<td><p>Host:</p></td>", "<td><p>Anna Faris</p></td>")
-      field = fieldTd.css("td p ::text").extract_first()
-      values = valueTd.css("td p ::text").extract()
+    for field, values, valueTd in page.info_rows():
       if field == 'Aired:':
         # e.g. "October 4, 2014 (", "<a href="/Seasons/?2014">S40</a>", "E2 / #768)"
         datestr, seasonlink, epstr = values
@@ -214,8 +281,8 @@ class SnlSpider(scrapy.Spider):
           return
       elif field in actor_fieldname_to_list:
         dest = actor_fieldname_to_list[field]
-        for actor_ele in valueTd.css('a'):
-          actor = self.actor_from_link(actor_ele)
+        for href, name in page.links(valueTd):
+          actor = self.actor_from_link(href, name)
           dest.append(actor)
 
     extra_actors = hosts + cameos + musical_guests + filmed_cameos
@@ -230,28 +297,29 @@ class SnlSpider(scrapy.Spider):
       yield Host(epid=epid, aid=host_actor['aid'])
 
     order = -1 # Record the relative order of sketches
-    for sketchInfo in response.css("div.sketchWrapper"):
+    for sketch in page.sketches():
       order += 1
-      for thing in self.parseSketchDiv(sketchInfo, order, episode['epid'], extra_lookup):
+      for thing in self.parseSketchDiv(sketch, order, episode['epid'], extra_lookup):
         yield thing
 
 
-  def parseSketchDiv(self, sketchInfo, order, epid, extra_cast):
-    """Yield a Title, and any other associated entities, given a 'div.sketchWrapper'
-    from an snlarchive episode page.
+  def parseSketchDiv(self, sketch, order, epid, extra_cast):
+    """Yield a Title, and any other associated entities, given a view of a
+    'div.sketchWrapper' from an snlarchive episode page (see snlscrape.pages).
     """
     title = Title(order=order, epid=epid)
     # e.g. /Episodes/?197510111
-    href_url = sketchInfo.css("a ::attr(href)").extract_first()
+    href_url = sketch.href()
     title['tid'] = href_url.split('?')[1]
-    if not self.interested(title):
-      raise StopIteration
-    # In some cases, the sketch name may not be contained to a single node. e.g. the SNL
-    # digital short in this episode: http://www.snlarchives.net/Episodes/?20051217
-    title['name'] = ''.join(sketchInfo.css(".title ::text").extract())
-    title['category'] = sketchInfo.css(".type ::text").extract_first()
-
-    title_url = sketchInfo.css(".title a ::attr(href)").extract_first()
+    if not self.targets.wants_title(title['tid']):
+      return
+    category = sketch.category()
+    if not self.targets.wants_title(title['tid'], category):
+      return
+    title['name'] = sketch.name()
+    title['category'] = category
+
+    title_url = sketch.title_url()
     # If the title is linkfified, that means it has an snlarchive page under /Sketches or /Commercials
     if title_url:
       if title_url.startswith('/Sketches/'):
@@ -260,9 +328,9 @@ class SnlSpider(scrapy.Spider):
         # The name for the series of recurring sketches may not be the same as the name of
         # this instance of the recurring sketch. e.g. 'SNL Digital Short - Lazy Sunday' vs.
         # 'SNL Digital Short'
-        name = sketchInfo.css('.title a ::text').extract_first()
-        rec_sketch = Sketch(skid=skid, name=name)
-        yield rec_sketch
+        name = sketch.title_link_text()
+        if self.seen.first_sighting(Sketch, skid):
+          yield Sketch(skid=skid, name=name)
       elif title_url.startswith('/Commercials/'):
         # meh. We could add another item type for Commercials and add a foreign key
         # here. I'm not sure it's worth it though - commercial parodies that are
@@ -273,23 +341,24 @@ class SnlSpider(scrapy.Spider):
 
     aids_this_title = {}
     # Parse the Appearances in this title
-    for cast_entry in sketchInfo.css(".roleTable > tr"):
+    for cast_entry in sketch.cast_rows():
       try:
         actor, app = self.parse_cast_entry_tr(cast_entry, extra_cast, title['tid'])
       except EmptyCastRowException as e:
-        logging.warn(e.message)
+        logging.warning(str(e))
         continue
-      yield actor
-      
       aid = actor['aid']
+      if self.seen.first_sighting(Actor, aid):
+        yield actor
+
       # Since Character and Impression entities are derivable from the corresponding
       # Appearance entities, I was hoping to put the logic for generating them in a 
       # pipeline, but scrapy pipelines can't yield multiple items :(
       # https://github.com/scrapy/scrapy/issues/1915
       impid, charid = app.get('impid'), app.get('charid')
-      if impid:
+      if impid and self.seen.first_sighting(Impression, impid):
         yield Impression(impid=impid, aid=aid, name=app['role'])
-      if charid:
+      if charid and self.seen.first_sighting(Character, charid):
         yield Character(charid=charid, aid=aid, name=app['role'])
 
       if aid not in aids_this_title:
@@ -316,13 +385,11 @@ class SnlSpider(scrapy.Spider):
 
   def parse_cast_entry_tr(self, row, extra_cast_lookup, tid):
     """Parse a row that describes a cast member in a particular segment, and their role."""
-    cells = row.css('td')
-    actor_cell = cells[0]
-    actor_class = actor_cell.css('::attr(class)').extract_first()
-    actor_link = actor_cell.css('a')
+    actor_class = row.actor_class()
+    actor_link = row.actor_link()
     # What's the context of this actor's appearance? As a cast member, host, cameo, etc.
     capacity = 'unknown'
-    actor_name = actor_cell.css('::text').extract_first()
+    actor_name = row.actor_name()
     if actor_name is None:
       raise EmptyCastRowException('Found no name for cast tr in sketch with tid={}'.format(tid))
     actor_name = actor_name.strip()
@@ -338,12 +405,13 @@ class SnlSpider(scrapy.Spider):
       # says he was credited as an snl writer).
       capacity = 'other'
       actor = Actor(aid=actor_name, type='crew')
-    elif not actor_link:
+    elif actor_link is None:
       # Actor name is not linkified. This means they're not cast members. They could
       # be the host, cameos, or musical guest (though this code path currently isn't
       # reached for musical titles). The td class gives a hint.
       if not actor_class:
-        logging.warn("No class found in actor cell {}".format(actor_cell))
+        logging.warn("No class found in actor cell for {} in sketch with tid={}".format(
+          actor_name, tid))
         capacity = 'unknown'
       else:
         capacity = actor_class
@@ -365,19 +433,17 @@ class SnlSpider(scrapy.Spider):
         actor = Actor(aid=actor_name, type='unknown')
     else:
       capacity = actor_class or 'cast'
-      actor = self.actor_from_link(actor_link)
+      actor = self.actor_from_link(*actor_link)
 
     app = Appearance(aid=actor['aid'], tid=tid, capacity=capacity)
-    if len(cells) == 3:
-      _dots, role_td = cells[1:]
-      app = self.parse_role_cell(role_td, app, tid)
+    if row.n_cells == 3:
+      app = self.parse_role_cell(row.role_texts(), row.role_href(), app, tid)
     else:
-      assert len(cells) == 1
+      assert row.n_cells == 1
 
     return actor, app
 
-  def parse_role_cell(self, role_td, appearance, tid):
-    rolenames = role_td.css('::text').extract()
+  def parse_role_cell(self, rolenames, href, appearance, tid):
     # Strip whitespace, and filter any resulting empty strings
     rolenames = [name.strip() for name in rolenames if name.strip()]
     if rolenames[-1] == '(voice)':
@@ -385,9 +451,7 @@ class SnlSpider(scrapy.Spider):
       rolenames = rolenames[:-1]
     rolename = ' '.join(rolenames)
     appearance['role'] = rolename
-    role_link = role_td.css('a')
-    if role_link:
-      href = role_link.css('::attr(href)').extract_first()
+    if href is not None:
       id = int(self.id_from_url(href))
       if href.startswith('/Impressions/'):
         appearance['impid'] = id
@@ -398,8 +462,7 @@ class SnlSpider(scrapy.Spider):
     return appearance
 
   @classmethod
-  def actor_from_link(self, anchor):
-    href = anchor.css('::attr(href)').extract_first()
+  def actor_from_link(self, href, name):
     if href.startswith('/Guests/'):
       atype = 'guest'
     elif href.startswith('/Cast/'):
@@ -408,7 +471,7 @@ class SnlSpider(scrapy.Spider):
       atype = 'crew'
     else:
       raise Exception('Unrecognized actor url: {}'.format(href))
-    name = anchor.css('::text').extract_first().strip()
+    name = name.strip()
     name = helpers.Aid.asciify(name)
     return Actor(
         aid=name,
@@ -0,0 +1,101 @@
+"""Helpers for storing items in a SQLite database (see SqliteExportPipeline), with one
+table per item class, named and typed as in the json output (see tables.py, schema.py).
+
+e.g. to find all of an actor's appearances:
+
+  db = sqldb.connect('output/snl.sqlite')
+  db.execute('SELECT * FROM appearances WHERE aid = ?', ('Kenan Thompson',)).fetchall()
+"""
+import json
+import sqlite3
+
+from snlscrape import schema, tables
+
+SQL_TYPES = {
+    schema.INT: 'INTEGER',
+    schema.BOOL: 'INTEGER',
+    schema.CATEGORY: 'TEXT',
+    schema.STRING: 'TEXT',
+    # json-encoded
+    schema.OBJECT: 'TEXT',
+}
+
+# Columns that get an index (in any table that has them)
+INDEXED_COLUMNS = ('aid', 'tid', 'epid', 'sid')
+
+def connect(path):
+  db = sqlite3.connect(path)
+  db.row_factory = sqlite3.Row
+  return db
+
+def quote(name):
+  # Some field names (e.g. 'order') are reserved words
+  return '"{}"'.format(name)
+
+class TableSpec(object):
+  """The SQL for storing items of a given class."""
+
+  def __init__(self, item_class):
+    self.item_class = item_class
+    self.name = tables.table_name(item_class)
+    self.columns = list(item_class.fields)
+    self.types = schema.column_types(item_class)
+    self.pkey = item_class.key_field()
+    self.scope_fields = item_class.scope_fields()
+    self.indexed = [col for col in INDEXED_COLUMNS if col in self.types and col != self.pkey]
+
+  def create_sql(self):
+    cols = []
+    for col in self.columns:
+      col_sql = '{} {}'.format(quote(col), SQL_TYPES[self.types[col]])
+      if col == self.pkey:
+        col_sql += ' PRIMARY KEY'
+      cols.append(col_sql)
+    return 'CREATE TABLE IF NOT EXISTS {} ({})'.format(quote(self.name), ', '.join(cols))
+
+  def index_name(self, col):
+    return 'idx_{}_{}'.format(self.name, col)
+
+  def create_index_sqls(self):
+    return ['CREATE INDEX IF NOT EXISTS {} ON {} ({})'.format(
+      quote(self.index_name(col)), quote(self.name), quote(col)) for col in self.indexed]
+
+  def drop_index_sqls(self):
+    return ['DROP INDEX IF EXISTS {}'.format(quote(self.index_name(col)))
+      for col in self.indexed]
+
+  def insert_sql(self):
+    """Insert a row - or, if there's already one with the same pkey, update it."""
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(quote(self.name),
+        ', '.join(quote(col) for col in self.columns),
+        ', '.join('?' for _ in self.columns))
+    if self.pkey is not None:
+      sql += ' ON CONFLICT ({}) DO UPDATE SET {}'.format(quote(self.pkey),
+        ', '.join('{0} = excluded.{0}'.format(quote(col))
+          for col in self.columns if col != self.pkey))
+    return sql
+
+  def delete_scope_sql(self):
+    """Delete the rows with a given scope key (see BaseSnlItem.scope_fields)."""
+    return 'DELETE FROM {} WHERE {}'.format(quote(self.name),
+        ' AND '.join('{} IS ?'.format(quote(col)) for col in self.scope_fields))
+
+  def scope_params(self, item):
+    return tuple(self.encode(col, value)
+      for (col, value) in zip(self.scope_fields, self.item_class.scope_key(item)))
+
+  def encode(self, col, value):
+    if value is None:
+      return None
+    ctype = self.types[col]
+    if ctype == schema.INT:
+      # numeric_id fields are strings of digits
+      return int(value)
+    if ctype == schema.BOOL:
+      return int(value)
+    if ctype == schema.OBJECT:
+      return json.dumps(value, sort_keys=True)
+    return value
+
+  def row(self, item):
+    return tuple(self.encode(col, item.get(col)) for col in self.columns)
@@ -0,0 +1,186 @@
+"""A dependency graph of processing stages, each of whose outputs is cached on disk, so
+that re-running the graph only re-runs the stages whose inputs have changed (as in
+convert_json_to_csv.py).
+
+A stage is a function taking a mapping of named inputs (the outputs of the stages it
+depends on) and returning a dict of named outputs. Each stage's cached output is keyed
+by a fingerprint of:
+  - the source of its code (and an explicit version number, for changes the source
+    doesn't capture)
+  - any parameters it declares (e.g. module-level constants it reads)
+  - the contents of any files it declares it reads
+  - the fingerprints of the stages it depends on
+so it's invalidated along with everything downstream of it by any change to these.
+
+Stages share their inputs (with each other, and with the cache), so they must not
+modify them - copy any DataFrame before changing it.
+"""
+import hashlib
+import inspect
+import json
+import os
+import pickle
+
+from six.moves.collections_abc import Mapping
+
+class Stage(object):
+
+  def __init__(self, name, fn, deps=(), outputs=(), files=(), code=(), params=None,
+      version=0, cached=True):
+    self.name = name
+    self.fn = fn
+    self.deps = tuple(deps)
+    # The names of the outputs fn returns
+    self.outputs = tuple(outputs)
+    self.files = tuple(files)
+    # Functions called by fn whose source should also be part of its fingerprint
+    self.code = (fn,) + tuple(code)
+    self.params = params or {}
+    self.version = version
+    # Uncached stages (e.g. ones that just write files) always run when asked for
+    self.cached = cached
+
+def source_of(fn):
+  try:
+    return inspect.getsource(fn).encode('utf-8')
+  except (IOError, TypeError):
+    return fn.__code__.co_code
+
+def hash_file(path):
+  h = hashlib.sha1()
+  with open(path, 'rb') as f:
+    for chunk in iter(lambda: f.read(1 << 20), b''):
+      h.update(chunk)
+  return h.hexdigest()
+
+class StageInputs(Mapping):
+  """The inputs of a stage: the outputs of its dependencies, each computed (or loaded
+  from the cache) only when first accessed. If more than one dependency provides an
+  output with the same name, the one latest in the graph wins."""
+
+  def __init__(self, graph, stage):
+    self.graph = graph
+    self.stage = stage
+    # output name -> the name of the stage providing it
+    self.providers = {}
+    for dep in sorted(stage.deps, key=graph.order.index):
+      for name in graph.stages[dep].outputs:
+        self.providers[name] = dep
+
+  def __getitem__(self, name):
+    return self.graph.output(self.providers[name])[name]
+
+  def __iter__(self):
+    return iter(self.providers)
+
+  def __len__(self):
+    return len(self.providers)
+
+  def fingerprint(self, name):
+    """The fingerprint of the stage providing the named input (which changes whenever
+    the input might have)."""
+    return self.graph.fingerprint(self.providers[name])
+
+class StageGraph(object):
+
+  def __init__(self, stages, cache_dir, force=False):
+    """stages should be in topological order. If force is True, cached outputs are
+    ignored (and overwritten)."""
+    self.stages = {stage.name: stage for stage in stages}
+    self.order = [stage.name for stage in stages]
+    for stage in stages:
+      for dep in stage.deps:
+        assert self.order.index(dep) < self.order.index(stage.name), \
+          'Stage {} must come after its dependency {}'.format(stage.name, dep)
+    self.cache_dir = cache_dir
+    self.force = force
+    self._fingerprints = {}
+    self._file_hashes = {}
+    self._outputs = {}
+    # Names of the stages actually run (rather than loaded from the cache)
+    self.ran = []
+
+  def code_fingerprint(self, name):
+    """A fingerprint of the stage itself (its code, version and params), regardless of
+    its inputs."""
+    stage = self.stages[name]
+    h = hashlib.sha1(name.encode('utf-8'))
+    for fn in stage.code:
+      h.update(source_of(fn))
+    h.update(json.dumps([stage.version, stage.params], sort_keys=True, default=sorted)
+        .encode('utf-8'))
+    return h.hexdigest()
+
+  def fingerprint(self, name):
+    if name not in self._fingerprints:
+      stage = self.stages[name]
+      h = hashlib.sha1(self.code_fingerprint(name).encode('utf-8'))
+      for path in stage.files:
+        if path not in self._file_hashes:
+          self._file_hashes[path] = hash_file(path)
+        h.update('{}:{}'.format(path, self._file_hashes[path]).encode('utf-8'))
+      for dep in stage.deps:
+        h.update(self.fingerprint(dep).encode('utf-8'))
+      self._fingerprints[name] = h.hexdigest()
+    return self._fingerprints[name]
+
+  def cache_path(self, name):
+    return os.path.join(self.cache_dir, name + '.pickle')
+
+  def cached_fingerprint(self, name):
+    """The fingerprint of the stage's cached output, or None if there isn't one."""
+    path = self.cache_path(name)
+    if not os.path.exists(path):
+      return None
+    with open(path, 'rb') as f:
+      return pickle.load(f)
+
+  def is_fresh(self, name):
+    stage = self.stages[name]
+    return (stage.cached and not self.force
+        and self.cached_fingerprint(name) == self.fingerprint(name))
+
+  def output(self, name):
+    """Return the output of the named stage, running it (and any stale stages it depends
+    on) if need be."""
+    if name in self._outputs:
+      return self._outputs[name]
+    stage = self.stages[name]
+    if self.is_fresh(name):
+      with open(self.cache_path(name), 'rb') as f:
+        pickle.load(f)
+        output = pickle.load(f)
+    else:
+      output = stage.fn(StageInputs(self, stage))
+      self.ran.append(name)
+      unexpected = set(output) - set(stage.outputs)
+      assert not unexpected, 'Stage {} has undeclared outputs {}'.format(name, unexpected)
+      if stage.cached:
+        self.save(name, output)
+    self._outputs[name] = output
+    return output
+
+  def save(self, name, output):
+    if not os.path.isdir(self.cache_dir):
+      os.makedirs(self.cache_dir)
+    path = self.cache_path(name)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+      # (The fingerprint comes first, so it can be checked without loading the rest)
+      pickle.dump(self.fingerprint(name), f, pickle.HIGHEST_PROTOCOL)
+      pickle.dump(output, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+  def stale(self, name):
+    """Return the names of the stages that might run to produce the named stage's
+    output: it and its stale ancestors (in graph order). (Stages that only access some
+    of their inputs may not need all of these.)"""
+    found = set()
+    def visit(name):
+      if name in found or self.is_fresh(name):
+        return
+      found.add(name)
+      for dep in self.stages[name].deps:
+        visit(dep)
+    visit(name)
+    return [stage_name for stage_name in self.order if stage_name in found]
@@ -0,0 +1,89 @@
+"""An on-disk store of downloaded pages, so that we can re-run parsers over the
+whole archive without hitting snlarchive (or IMDB) again.
+
+Bodies are gzipped and content-addressed (i.e. stored under the sha1 of their
+contents), so a page reachable from several urls is only stored once. An index
+file maps each url to the digest of its body, plus the response status and
+headers. The index is append-only json-lines; if a url appears more than once, the
+last entry wins.
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+
+class ResponseStore(object):
+
+  INDEX_FNAME = 'index.jsonl'
+  OBJECTS_DIR = 'objects'
+
+  def __init__(self, root):
+    self.root = root
+    # url -> dict with keys url, sha1, status, headers
+    self.index = {}
+    self._index_file = None
+    index_path = self._index_path()
+    if os.path.exists(index_path):
+      with io.open(index_path, encoding='utf-8') as f:
+        for line in f:
+          if line.strip():
+            entry = json.loads(line)
+            self.index[entry['url']] = entry
+
+  def _index_path(self):
+    return os.path.join(self.root, self.INDEX_FNAME)
+
+  def _object_path(self, digest):
+    return os.path.join(self.root, self.OBJECTS_DIR, digest[:2], digest[2:] + '.gz')
+
+  def __contains__(self, url):
+    return url in self.index
+
+  def __len__(self):
+    return len(self.index)
+
+  def urls(self):
+    return sorted(self.index)
+
+  def get(self, url):
+    """Return the index entry for the given url, or None if we don't have it."""
+    return self.index.get(url)
+
+  def body(self, digest):
+    with gzip.open(self._object_path(digest), 'rb') as f:
+      return f.read()
+
+  def put(self, url, status, headers, body):
+    """Store a response body (bytes) and record it as the current response for url.
+    headers should be a dict mapping header names to lists of values.
+    """
+    digest = hashlib.sha1(body).hexdigest()
+    path = self._object_path(digest)
+    if not os.path.exists(path):
+      dirname = os.path.dirname(path)
+      if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+      # Write to a temp file and rename, so a crash can never leave a truncated object.
+      tmp_path = path + '.tmp'
+      with gzip.open(tmp_path, 'wb') as f:
+        f.write(body)
+      os.rename(tmp_path, path)
+    entry = dict(url=url, sha1=digest, status=status, headers=headers)
+    if self.index.get(url) != entry:
+      self.index[url] = entry
+      self._append_to_index(entry)
+    return digest
+
+  def _append_to_index(self, entry):
+    if self._index_file is None:
+      if not os.path.isdir(self.root):
+        os.makedirs(self.root)
+      self._index_file = io.open(self._index_path(), 'a', encoding='utf-8')
+    self._index_file.write(json.dumps(entry, sort_keys=True) + u'\n')
+    self._index_file.flush()
+
+  def close(self):
+    if self._index_file is not None:
+      self._index_file.close()
+      self._index_file = None
@@ -0,0 +1,237 @@
+"""Helpers for locating, reading and writing the json-lines tables that
+MultiJsonExportPipeline writes to SNL_OUTPUT_DIR (one table per item class in items.py).
+
+A table may be compressed (see SNL_OUTPUT_COMPRESSION), in which case its filename gets
+an extra suffix (e.g. titles.json.gz). Tables of season_scoped items may also be split
+into a file per season (see SNL_SHARD_BY_SEASON), e.g. titles/sid=27.jsonl. The reading
+functions here handle any of these transparently.
+"""
+import gzip
+import io
+import json
+import os
+import re
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+# compression -> extension added to the filename
+EXTENSIONS = {
+    None: '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+COMPRESSIONS = (None, 'gzip', 'zstd')
+
+SHARD_FNAME_RE = re.compile(r'sid=(\d+)\.jsonl(\.gz|\.zst)?$')
+
+# Default size of TableWriter's buffer
+BUFFER_SIZE = 1 << 20
+
+def table_name(item_class):
+  """e.g. Title -> 'titles'"""
+  classname = item_class.__name__
+  # sketchs is enough to drive me crazy
+  if classname == 'Sketch':
+    return 'sketches'
+  return classname.lower() + 's'
+
+def check_compression(compression):
+  if compression not in EXTENSIONS:
+    raise ValueError('Unknown compression {!r} (should be one of {})'.format(
+      compression, ', '.join(c for c in COMPRESSIONS if c)))
+  if compression == 'zstd' and zstandard is None:
+    raise ImportError('zstd compression requires the zstandard package')
+
+def table_path(output_dir, table, compression=None, sid=None):
+  """The path of the file holding a table - or, if sid is given, the table's shard for
+  that season."""
+  if sid is None:
+    return os.path.join(output_dir, table + '.json' + EXTENSIONS[compression])
+  return os.path.join(output_dir, table,
+      'sid={:02d}.jsonl{}'.format(sid, EXTENSIONS[compression]))
+
+def find_table(output_dir, table, sid=None):
+  """Return the path of the given table (or shard) in output_dir, however it's
+  compressed, or None if there's no such file."""
+  for compression in COMPRESSIONS:
+    path = table_path(output_dir, table, compression, sid)
+    if os.path.exists(path):
+      return path
+  return None
+
+def shard_paths(output_dir, table):
+  """Return a dict mapping sid to path for each of the table's shards, in order of sid."""
+  dirpath = os.path.join(output_dir, table)
+  if not os.path.isdir(dirpath):
+    return {}
+  shards = {}
+  for fname in sorted(os.listdir(dirpath)):
+    match = SHARD_FNAME_RE.match(fname)
+    if match:
+      shards.setdefault(int(match.group(1)), os.path.join(dirpath, fname))
+  return {sid: shards[sid] for sid in sorted(shards)}
+
+def table_paths(output_dir, table):
+  """Return the paths of all the files holding the given table: its single file and/or
+  its shards."""
+  path = find_table(output_dir, table)
+  return ([path] if path else []) + list(shard_paths(output_dir, table).values())
+
+def list_tables(output_dir):
+  """Return a dict mapping table name to paths (see table_paths) for every table in
+  output_dir."""
+  names = set()
+  for fname in os.listdir(output_dir):
+    if os.path.isdir(os.path.join(output_dir, fname)):
+      if shard_paths(output_dir, fname):
+        names.add(fname)
+      continue
+    for compression in COMPRESSIONS:
+      suffix = '.json' + EXTENSIONS[compression]
+      name = fname[:-len(suffix)]
+      if fname.endswith(suffix) and '.' not in name:
+        names.add(name)
+  return {name: table_paths(output_dir, name) for name in sorted(names)}
+
+def path_compression(path):
+  for compression in COMPRESSIONS:
+    if compression and path.endswith(EXTENSIONS[compression]):
+      return compression
+  return None
+
+def open_binary(path):
+  """Open the table at path for reading, decompressing it if need be."""
+  compression = path_compression(path)
+  if compression == 'gzip':
+    # (Reads all the members of a multi-member file - see TableWriter.checkpoint)
+    return gzip.open(path, 'rb')
+  if compression == 'zstd':
+    check_compression(compression)
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'),
+        read_across_frames=True, closefd=True))
+  return open(path, 'rb')
+
+def read_lines(path):
+  """Yield each (non-blank) line of the table at path, as bytes ending in a newline."""
+  with open_binary(path) as f:
+    for line in f:
+      if not line.strip():
+        continue
+      if not line.endswith(b'\n'):
+        line += b'\n'
+      yield line
+
+def read_rows(path):
+  """Yield a dict for each line of the json-lines file at the given path. Yields
+  nothing if the file doesn't exist.
+  """
+  if path is None or not os.path.exists(path):
+    return
+  for line in read_lines(path):
+    yield json.loads(line.decode('utf-8'))
+
+def read_table(output_dir, table):
+  for path in table_paths(output_dir, table):
+    for row in read_rows(path):
+      yield row
+
+class TableWriter(object):
+  """Writes items to a json-lines table, in the same format as scrapy's
+  JsonLinesItemExporter, but buffering lines in memory and writing them out in large
+  chunks, optionally through a compressor.
+
+  If offset is given, the file at path is truncated to that size and appended to (for
+  resuming from a checkpoint).
+  """
+
+  def __init__(self, path, compression=None, offset=0, buffer_size=BUFFER_SIZE):
+    # (Imported here, so that just reading tables doesn't require importing scrapy)
+    from scrapy.utils.serialize import ScrapyJSONEncoder
+    check_compression(compression)
+    self.path = path
+    self.compression = compression
+    self.buffer_size = buffer_size
+    if offset and os.path.exists(path):
+      self.file = open(path, 'r+b')
+      self.file.truncate(offset)
+      self.file.seek(offset)
+    else:
+      self.file = open(path, 'wb')
+    self.stream = None
+    self.buffer = []
+    self.buffered = 0
+    self.encoder = ScrapyJSONEncoder()
+
+  def open_stream(self):
+    """Start a new compressed segment (gzip member/zstd frame) at the end of the file."""
+    if self.compression == 'gzip':
+      # mtime=0 so that output doesn't depend on when it was written
+      return gzip.GzipFile(filename='', mode='wb', fileobj=self.file, mtime=0)
+    if self.compression == 'zstd':
+      return zstandard.ZstdCompressor().stream_writer(self.file, closefd=False)
+    return self.file
+
+  def write_item(self, item):
+    # Fields in declaration order, as scrapy's exporter does
+    self.write_line(self.encoder.encode(
+      {name: item[name] for name in item.fields if name in item}))
+
+  def write_line(self, line):
+    self.write_data(line.encode('utf-8') + b'\n')
+
+  def write_data(self, data):
+    """Write an already encoded line (e.g. from read_lines)."""
+    self.buffer.append(data)
+    self.buffered += len(data)
+    if self.buffered >= self.buffer_size:
+      self.flush()
+
+  def flush(self):
+    if not self.buffer:
+      return
+    if self.stream is None:
+      self.stream = self.open_stream()
+    self.stream.write(b''.join(self.buffer))
+    self.buffer = []
+    self.buffered = 0
+
+  def end_segment(self):
+    """Write out everything written so far, and return the file's size."""
+    self.flush()
+    if self.stream is not None and self.stream is not self.file:
+      # Compressed files can't be truncated mid-stream, so each checkpoint ends the
+      # current gzip member/zstd frame. Concatenated members decompress as if they
+      # were one.
+      self.stream.close()
+      self.stream = None
+    self.file.flush()
+    return self.file.tell()
+
+  def checkpoint(self):
+    """Return an offset that the file can later be truncated to, to resume from here."""
+    return self.end_segment()
+
+  def close(self):
+    """Close the file, and return its final size."""
+    size = self.end_segment()
+    self.file.close()
+    return size
+
+  @property
+  def closed(self):
+    return self.file.closed
+
+def write_rows(output_dir, table, rows, sid=None, compression=None):
+  """Write the given dicts as a table in output_dir (or, if sid is given, as the table's
+  shard for that season), replacing any existing file. e.g. for building small
+  databases in tests."""
+  path = table_path(output_dir, table, compression, sid)
+  if not os.path.isdir(os.path.dirname(path)):
+    os.makedirs(os.path.dirname(path))
+  writer = TableWriter(path, compression)
+  for row in rows:
+    writer.write_line(json.dumps(row))
+  writer.close()
@@ -0,0 +1,117 @@
+"""Compiled selection of what a (partial) crawl should scrape, built once per crawl
+from the SNL_TARGET_* / SNL_EXCLUDE_* settings. All the checks are set lookups or 
+comparisons, so they're cheap enough to make at every pruning point in the spider.
+"""
+from snlscrape import helpers
+
+class TargetFilter(object):
+  """Empty selectors are interpreted as "everything". Non-empty ones are ANDed
+  together, e.g. seasons 40-46 + category 'Sketch' means only the sketches from those
+  seasons.
+
+  Ids implied by more specific selections are included (e.g. targeting tid 200604151
+  entails also scraping the episode in which that title appears, epid 20060415, and
+  that episode's season).
+  """
+
+  def __init__(self, tids=(), epids=(), sids=(), aired_after=None, aired_before=None,
+      categories=(), exclude_categories=()):
+    self.tids = frozenset(tids)
+    self.epids = frozenset(epids).union(helpers.Epid.from_tid(tid) for tid in self.tids)
+    self.sids = frozenset(sids).union(helpers.Sid.from_epid(epid) for epid in self.epids)
+    # epids look like dates ('20020518'), so string comparisons on them are chronological
+    self.aired_after = aired_after
+    self.aired_before = aired_before
+    self.min_sid = sid_on_or_after(aired_after) if aired_after else None
+    self.max_sid = sid_on_or_before(aired_before) if aired_before else None
+    self.categories = frozenset(categories)
+    self.exclude_categories = frozenset(exclude_categories)
+
+  @classmethod
+  def from_settings(cls, settings):
+    return cls(
+        tids=ids_from_settings(settings, 'SNL_TARGET_TID'),
+        epids=ids_from_settings(settings, 'SNL_TARGET_EPID'),
+        sids=parse_sids(ids_from_settings(settings, 'SNL_TARGET_SID')),
+        aired_after=normalize_date(settings.get('SNL_TARGET_AIRED_AFTER')),
+        aired_before=normalize_date(settings.get('SNL_TARGET_AIRED_BEFORE')),
+        categories=settings.getlist('SNL_TARGET_CATEGORIES'),
+        exclude_categories=settings.getlist('SNL_EXCLUDE_CATEGORIES'),
+        )
+
+  def wants_season(self, sid):
+    if self.sids and sid not in self.sids:
+      return False
+    if self.min_sid is not None and sid < self.min_sid:
+      return False
+    if self.max_sid is not None and sid > self.max_sid:
+      return False
+    return True
+
+  def wants_episode(self, epid):
+    if self.epids and epid not in self.epids:
+      return False
+    if self.aired_after and epid < self.aired_after:
+      return False
+    if self.aired_before and epid > self.aired_before:
+      return False
+    return True
+
+  def wants_title(self, tid, category=None):
+    """category may be None if it's not known yet, in which case only the tid is
+    checked.
+    """
+    if self.tids and tid not in self.tids:
+      return False
+    if category is not None:
+      if self.categories and category not in self.categories:
+        return False
+      if category in self.exclude_categories:
+        return False
+    return True
+
+def ids_from_settings(settings, name):
+  """Return the set of ids given in a setting with the given name (e.g. SNL_TARGET_TID),
+  or its plural (SNL_TARGET_TIDS), which takes a comma-separated list.
+  """
+  single_target = settings.get(name)
+  multi_target = settings.getlist(name + 'S')
+  assert not (single_target and multi_target)
+  if single_target:
+    return {single_target}
+  return set(multi_target)
+
+def parse_sids(values):
+  """Season ids may be given individually (e.g. '27') or as inclusive ranges ('40-46')."""
+  sids = set()
+  for value in values:
+    value = str(value).strip()
+    if '-' in value:
+      first, last = value.split('-')
+      sids.update(range(int(first), int(last) + 1))
+    else:
+      sids.add(int(value))
+  return sids
+
+def normalize_date(value):
+  """Accept 'YYYYMMDD' or 'YYYY-MM-DD' and return the former (which is comparable
+  with epids).
+  """
+  if not value:
+    return None
+  return str(value).replace('-', '')
+
+def sid_on_or_after(datestr):
+  """The first season that airs on or after the given date."""
+  date = helpers.Epid.to_date(datestr)
+  # Seasons start in the fall. Aug. is in the gap between seasons.
+  if date.month == 8:
+    return helpers.Sid.from_year(date.year)
+  return helpers.Sid.from_date(date)
+
+def sid_on_or_before(datestr):
+  """The last season that airs on or before the given date."""
+  date = helpers.Epid.to_date(datestr)
+  if date.month == 8:
+    return helpers.Sid.from_year(date.year) - 1
+  return helpers.Sid.from_date(date)
@@ -0,0 +1,188 @@
+"""An index of cast members' tenures, for questions like "who was in the cast on
+episode X" (or on date X - any int that sorts like an epid will do).
+
+The casts table has a row per cast member per season, optionally giving the epids of
+their first and/or last episodes that season (and otherwise implying the first/last
+episode of the season). TenureIndex resolves each row to a range of episodes, and
+merges consecutive ranges into each cast member's runs on the show. Some cast members
+have more than one run (e.g. Al Franken), so a run is the unit the queries work on.
+
+The runs are kept in arrays sorted by first episode, along with, for each node of the
+implicit balanced binary search tree over that order (the root being the middle run,
+and so on recursively), the greatest last episode in its subtree. That makes it an
+interval tree: point and overlap queries (at, overlapping) take O(log n + k) time, for
+k results. within only needs the sorted order: it takes O(log n + m) time, for the m
+runs starting in the range.
+
+The index works with whatever ids it's given, e.g. the epid codes in
+convert_json_to_csv.py, or the epids in the csvs:
+
+  index = TenureIndex.from_casts(casts, seasons, episodes)
+  index.at(20210410) # the cast of that episode
+"""
+import numpy as np
+
+def count_in_ranges(sorted_values, starts, ends):
+  """Return an array with the number of elements of sorted_values falling in each of
+  the (inclusive) ranges given by starts, ends."""
+  return (np.searchsorted(sorted_values, ends, side='right')
+      - np.searchsorted(sorted_values, starts, side='left'))
+
+def subtree_max_ends(ends):
+  """Given the ends of some intervals sorted by start, return, for each position, the
+  greatest end in the subtree rooted there (see the module docstring)."""
+  ends = list(ends)
+  max_ends = [None] * len(ends)
+  def build(lo, hi):
+    if lo >= hi:
+      return None
+    mid = (lo + hi) // 2
+    max_ends[mid] = max(end for end in (ends[mid], build(lo, mid), build(mid + 1, hi))
+      if end is not None)
+    return max_ends[mid]
+  build(0, len(ends))
+  return max_ends
+
+def actor_codes(*arrays):
+  """Return int64 versions of the given arrays of actors (which may be e.g. names
+  rather than the codes in convert_json_to_csv.py), consistent across them."""
+  if all(arr.dtype.kind in 'iu' for arr in arrays):
+    return [arr.astype('int64') for arr in arrays]
+  codes = np.unique(np.concatenate(arrays), return_inverse=True)[1].ravel()
+  return np.split(codes.astype('int64'), np.cumsum([len(arr) for arr in arrays[:-1]]))
+
+class TenureIndex(object):
+
+  def __init__(self, aids, firsts, lasts, epids):
+    """aids, firsts and lasts give the actor and the (inclusive) range of episodes of
+    each cast row (e.g. cast member per season), and epids every episode."""
+    self.epids = np.sort(np.asarray(epids))
+    self.aids = np.asarray(aids)
+    # Each row's range, as positions in epids
+    self.first_pos = np.searchsorted(self.epids, firsts, side='left')
+    self.last_pos = np.searchsorted(self.epids, lasts, side='right') - 1
+    self._build_runs()
+
+  @classmethod
+  def from_casts(cls, casts, seasons, episodes):
+    """Build an index of the given casts table, falling back to the first/last episodes
+    in the seasons table (see enrich_seasons in convert_json_to_csv.py) for rows
+    without a first/last_epid."""
+    seasons = seasons.set_index('sid')
+    first = casts['first_epid'].fillna(casts['sid'].map(seasons['first_epid']))
+    last = casts['last_epid'].fillna(casts['sid'].map(seasons['last_epid']))
+    return cls(casts['aid'].values, first.astype('int64').values,
+        last.astype('int64').values, episodes['epid'].values)
+
+  def _build_runs(self):
+    # Merge each actor's overlapping or consecutive ranges into runs
+    order = sorted(range(len(self.aids)), key=lambda i: (self.aids[i], self.first_pos[i]))
+    runs = []
+    for i in order:
+      aid, first, last = self.aids[i], int(self.first_pos[i]), int(self.last_pos[i])
+      if first > last:
+        # (No episodes in range)
+        continue
+      if runs and runs[-1][0] == aid and first <= runs[-1][2] + 1:
+        runs[-1][2] = max(runs[-1][2], last)
+      else:
+        runs.append([aid, first, last])
+    runs.sort(key=lambda run: (run[1], run[2]))
+    self.run_aids = [aid for (aid, _, _) in runs]
+    # As positions in epids
+    self.run_firsts = [first for (_, first, _) in runs]
+    self.run_lasts = [last for (_, _, last) in runs]
+    self.run_max_lasts = subtree_max_ends(self.run_lasts)
+    self._sorted_lasts = np.sort(self.run_lasts)
+    self._runs_by_actor = {}
+    for i, aid in enumerate(self.run_aids):
+      self._runs_by_actor.setdefault(aid, []).append(i)
+
+  @property
+  def n_episodes(self):
+    """The number of episodes in each row's range."""
+    return self.last_pos - self.first_pos + 1
+
+  def count_present(self, aids, epids):
+    """Given the actor and epid of each of a set of appearances, return the number of
+    distinct episodes in each row's range in which its actor appeared."""
+    epids = np.asarray(epids)
+    pos = np.searchsorted(self.epids, epids)
+    valid = pos < len(self.epids)
+    valid[valid] = self.epids[pos[valid]] == epids[valid]
+    row_codes, codes = actor_codes(self.aids, np.asarray(aids)[valid])
+    # Keys that sort by actor, then episode
+    span = len(self.epids) + 1
+    keys = np.unique(codes * span + pos[valid])
+    return count_in_ranges(keys, row_codes * span + self.first_pos,
+        row_codes * span + self.last_pos)
+
+  def _first_pos(self, epid):
+    """The position of the first episode on or after epid."""
+    return int(np.searchsorted(self.epids, epid, side='left'))
+
+  def _last_pos(self, epid):
+    """The position of the last episode on or before epid."""
+    return int(np.searchsorted(self.epids, epid, side='right')) - 1
+
+  def _overlapping_runs(self, first, last):
+    """The indices of the runs overlapping the range of positions first-last."""
+    found = []
+    firsts, lasts, max_lasts = self.run_firsts, self.run_lasts, self.run_max_lasts
+    def visit(lo, hi):
+      if lo >= hi:
+        return
+      mid = (lo + hi) // 2
+      if max_lasts[mid] < first:
+        return
+      visit(lo, mid)
+      if firsts[mid] > last:
+        # (Nor can anything to the right)
+        return
+      if lasts[mid] >= first:
+        found.append(mid)
+      visit(mid + 1, hi)
+    visit(0, len(firsts))
+    return found
+
+  def _aids(self, runs):
+    """The actors of the given runs, without repeats, in order."""
+    seen = set()
+    return [self.run_aids[i] for i in runs
+      if not (self.run_aids[i] in seen or seen.add(self.run_aids[i]))]
+
+  def runs(self, aid):
+    """The (first epid, last epid) of each of the actor's runs."""
+    return [(self.epids[self.run_firsts[i]].item(), self.epids[self.run_lasts[i]].item())
+      for i in self._runs_by_actor.get(aid, [])]
+
+  def at(self, epid):
+    """The actors who were in the cast at epid (in order of the start of their run).
+    epid needn't be an episode, so e.g. a date between two seasons gives anyone whose
+    run continued from the one to the next."""
+    return self.overlapping(epid, epid)
+
+  def overlapping(self, first, last):
+    """The actors who were in the cast at any time between epids first and last
+    (inclusive)."""
+    first_pos, last_pos = self._first_pos(first), self._last_pos(last)
+    if first_pos <= last_pos:
+      return self._aids(self._overlapping_runs(first_pos, last_pos))
+    # There are no episodes in the range, so it falls between the episodes at last_pos
+    # and first_pos, and only runs spanning both count
+    return self._aids(i for i in self._overlapping_runs(last_pos, last_pos)
+      if self.run_lasts[i] >= first_pos)
+
+  def within(self, first, last):
+    """The actors with a run that started and ended between epids first and last. (A
+    scan of the runs starting in the range, rather than a query of the tree.)"""
+    first_pos, last_pos = self._first_pos(first), self._last_pos(last)
+    lo = np.searchsorted(self.run_firsts, first_pos, side='left')
+    hi = np.searchsorted(self.run_firsts, last_pos, side='right')
+    return self._aids(i for i in range(lo, hi) if self.run_lasts[i] <= last_pos)
+
+  def count_at(self, epids):
+    """The number of cast members at each of the given epids (which must be episodes)."""
+    pos = np.searchsorted(self.epids, epids)
+    return (np.searchsorted(self.run_firsts, pos, side='right')
+        - np.searchsorted(self._sorted_lasts, pos, side='left'))
@@ -0,0 +1,53 @@
+from snlscrape import coappear
+from snlscrape.tables import write_rows
+
+def app(aid, tid, capacity='cast'):
+  return dict(aid=aid, tid=tid, capacity=capacity)
+
+def test_queries(tmpdir):
+  write_rows(str(tmpdir), 'appearances', [
+    app('Dana Carvey', '199010061'), app('Jan Hooks', '199010061'),
+    app('Dana Carvey', '199010062'), app('Jan Hooks', '199010062'),
+    # (A second role in the same title doesn't count twice)
+    app('Jan Hooks', '199010062'),
+    app('Phil Hartman', '199010062'), app('George Steinbrenner', '199010062', 'host'),
+  ], sid=16)
+  write_rows(str(tmpdir), 'appearances',
+    [app('Phil Hartman', '199109281'), app('Jan Hooks', '199109281')], sid=17)
+  index = coappear.load_index(str(tmpdir))
+  assert index.pair_count('Dana Carvey', 'Jan Hooks') == 2
+  assert index.pair_count('Jan Hooks', 'Jan Hooks') == 3
+  assert index.pair_count('Jan Hooks', 'Phil Hartman', sids=[17]) == 1
+  assert index.pair_count('Jan Hooks', 'Nobody') == 0
+  assert index.top_partners('Jan Hooks', 2) == [('Dana Carvey', 2), ('Phil Hartman', 2)]
+  assert index.top_partners('Jan Hooks', 5, sids=[17]) == [('Phil Hartman', 1)]
+  assert index.season_graph(17).shape == (4, 4)
+  cast = coappear.load_index(str(tmpdir), capacities=['cast'])
+  assert [aid for (aid, _) in cast.top_partners('Phil Hartman', 5)] == ['Jan Hooks', 'Dana Carvey']
+
+def test_incremental(tmpdir, monkeypatch):
+  write_rows(str(tmpdir), 'appearances',
+    [app('Dana Carvey', '199010061'), app('Jan Hooks', '199010061')], sid=16)
+  coappear.load_index(str(tmpdir))
+
+  computed = []
+  coappearances = coappear.coappearances
+  def counting(aids, tids, n_actors):
+    computed.append(tids.tolist())
+    return coappearances(aids, tids, n_actors)
+  monkeypatch.setattr(coappear, 'coappearances', counting)
+  write_rows(str(tmpdir), 'appearances',
+    [app('Phil Hartman', '199109281'), app('Dana Carvey', '199109281')], sid=17)
+  index = coappear.load_index(str(tmpdir))
+  assert computed == [[199109281, 199109281]]
+  assert index.top_partners('Dana Carvey') == [('Jan Hooks', 1), ('Phil Hartman', 1)]
+
+  # Titles added directly replace any earlier versions of the same titles
+  index.add([app('Phil Hartman', '199109281'), app('Jan Hooks', '199109281')])
+  assert index.pair_count('Dana Carvey', 'Phil Hartman') == 0
+  assert index.pair_count('Jan Hooks', 'Phil Hartman', sids=[17]) == 1
+
+  # Nothing's changed since it was saved, so loading it again doesn't recompute anything
+  computed = []
+  coappear.load_index(str(tmpdir))
+  assert computed == []
@@ -0,0 +1,17 @@
+from scrapy.utils.test import get_crawler
+
+from snlscrape.dedupe import SeenRegistry
+from snlscrape.items import Actor, Sketch
+
+def test_first_sighting():
+  stats = get_crawler().stats
+  seen = SeenRegistry(stats)
+  assert seen.first_sighting(Actor, 'Will Ferrell')
+  assert seen.first_sighting(Sketch, 'Will Ferrell')
+  assert not seen.first_sighting(Actor, 'Will Ferrell')
+  assert stats.get_value('snl_dedupe/avoided') == 1
+  assert stats.get_value('snl_dedupe/avoided/Actor') == 1
+
+  restored = SeenRegistry()
+  restored.restore(seen.checkpoint_state())
+  assert not restored.first_sighting(Sketch, 'Will Ferrell')
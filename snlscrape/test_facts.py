@@ -0,0 +1,48 @@
+import pandas as pd
+
+import convert_json_to_csv as convert
+from snlscrape import facts
+
+def make_tables():
+  # (Already encoded, as in the converter)
+  return dict(
+    appearances=pd.DataFrame(dict(aid=[1, 0, 0, 2], tid=[3, 0, 1, 2], capacity=['cast'] * 4,
+      role=['Church Lady', None, 'Garth', None], charid=[5, None, 6, None],
+      impid=[None] * 4, voice=[False] * 4, epid=[1, 0, 0, 1], sid=[0, 0, 0, 0])),
+    titles=pd.DataFrame(dict(tid=[0, 1, 2, 3], category=['Monologue', 'Sketch', 'Sketch', 'Sketch'],
+      order=[0, 1, 1, 2], epid=[0, 0, 1, 1], sid=[0, 0, 0, 0])),
+    episodes=pd.DataFrame(dict(sid=[0, 0], epid=[0, 1], aired=['September 29, 1990',
+      'October 6, 1990'], epno=[1, 2])),
+    actors=pd.DataFrame(dict(aid=[0, 1, 2], type=['cast', 'cast', 'guest'],
+      gender=['male', 'male', 'male'])),
+    hosts=pd.DataFrame(dict(epid=[0, 1], aid=[0, 2])),
+  )
+
+def test_build_facts():
+  df = convert.build_facts(make_tables())
+  assert list(df.columns) == convert.FACT_COLUMNS
+  assert df['tid'].tolist() == [0, 1, 2, 3]
+  assert df['aid'].tolist() == [0, 0, 2, 1]
+  assert df['is_host'].tolist() == [True, True, True, False]
+  assert df['category'].tolist() == ['Monologue', 'Sketch', 'Sketch', 'Sketch']
+  assert df['aired'].dt.month.tolist() == [9, 9, 10, 10]
+
+def test_load_facts_cache(tmpdir, monkeypatch):
+  df = convert.build_facts(make_tables())
+  path = tmpdir.join(facts.FNAME)
+  df.to_csv(str(path), index=False)
+  loaded = facts.load_facts(str(tmpdir))
+  assert str(loaded['aired'].dtype).startswith('datetime64')
+  assert loaded['charid'].tolist() == [pd.NA, 6, pd.NA, 5]
+  assert list(loaded['gender'].cat.categories) == ['male']
+
+  def no_parse(path):
+    raise AssertionError('Should have loaded the cached snapshot')
+  monkeypatch.setattr(facts, 'read_facts', no_parse)
+  assert facts.load_facts(str(tmpdir)).to_csv(index=False) == loaded.to_csv(index=False)
+  monkeypatch.undo()
+
+  # Rewriting the csv invalidates the snapshot
+  df.iloc[:2].to_csv(str(path), index=False)
+  assert len(facts.load_facts(str(tmpdir))) == 2
+  assert len(tmpdir.join(facts.CACHE_DIRNAME).listdir()) == 1
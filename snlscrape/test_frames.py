@@ -0,0 +1,54 @@
+import json
+
+from snlscrape import frames, items
+
+def write_table(dirpath, name, rows):
+  dirpath.join(name + '.json').write('\n'.join(json.dumps(row) for row in rows) + '\n')
+
+def test_typed_columns(tmpdir):
+  write_table(tmpdir, 'casts', [
+    dict(aid='Jan Hooks', sid=12, featured=True, first_epid='19861011', update_anchor=False),
+    dict(aid='Dana Carvey', sid=12, featured=False, update_anchor=False),
+  ])
+  write_table(tmpdir, 'appearances', [
+    dict(aid='Dana Carvey', tid='198610111', capacity='cast', role='Church Lady', voice=False),
+    dict(aid='Phil Hartman', tid='198610112', capacity='cast', role='Frankenstein',
+      impid=7, voice=False),
+  ])
+  t = frames.load_tables(str(tmpdir))
+  casts, apps = t['casts'], t['appearances']
+  assert list(casts.columns) == ['aid', 'sid', 'featured', 'first_epid', 'update_anchor']
+  assert str(casts['first_epid'].dtype) == 'Int64'
+  assert casts['first_epid'][0] == 19861011
+  assert casts['first_epid'].isnull()[1]
+  assert str(casts['sid'].dtype) == 'int64'
+  assert str(apps['tid'].dtype) == 'int64'
+  assert apps['impid'].tolist()[1] == 7
+  # Every possible value is a category, even if it doesn't appear in the data
+  assert set(apps['capacity'].cat.categories) == set(items.Appearance.fields['capacity']['possible_values'])
+  # Actor names are encoded the same way in every table
+  assert list(casts['aid'].cat.categories) == list(apps['aid'].cat.categories) \
+      == ['Dana Carvey', 'Jan Hooks', 'Phil Hartman']
+  assert casts['aid'].cat.codes[1] == apps['aid'].cat.codes[0]
+
+def test_unknown_table(tmpdir):
+  write_table(tmpdir, 'extras', [dict(x=1, y='a'), dict(x=2)])
+  df = frames.load_tables(str(tmpdir))['extras']
+  assert df['x'].tolist() == [1, 2]
+  assert df['y'][0] == 'a' and df['y'].isnull()[1]
+
+def test_sharded_table(tmpdir):
+  rows = [
+    dict(aid='Jan Hooks', sid=12, featured=True, first_epid='19861011', update_anchor=False),
+    dict(aid='Dana Carvey', sid=12, featured=False, update_anchor=False),
+    dict(aid='Phil Hartman', sid=13, featured=False, update_anchor=False),
+  ]
+  write_table(tmpdir.mkdir('flat'), 'casts', rows)
+  shards = tmpdir.mkdir('sharded').mkdir('casts')
+  shards.join('sid=12.jsonl').write('\n'.join(json.dumps(row) for row in rows[:2]) + '\n')
+  shards.join('sid=13.jsonl').write(json.dumps(rows[2]) + '\n')
+  flat = frames.load_tables(str(tmpdir.join('flat')))['casts']
+  sharded = frames.load_tables(str(tmpdir.join('sharded')), processes=2)['casts']
+  # Typed just the same, even though the second shard has no first_epid column
+  assert sharded.dtypes.to_dict() == flat.dtypes.to_dict()
+  assert sharded.to_csv() == flat.to_csv()
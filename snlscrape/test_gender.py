@@ -0,0 +1,18 @@
+import convert_json_to_csv as convert
+
+def test_genderize_all_cache(tmpdir, monkeypatch):
+  names = ['Jan Hooks', 'Kenan Thompson', 'Kenan Thompson', 'Chevy Chase', 'Kenan Smith']
+  cache_path = str(tmpdir.join('genders.json'))
+  genders = convert.genderize_all(names, cache_path)
+  assert genders == {'Jan Hooks': 'female', 'Kenan Thompson': 'male', 'Chevy Chase': 'male',
+    'Kenan Smith': 'male'}
+
+  def no_detector():
+    raise AssertionError('Detector should not be needed')
+  monkeypatch.setattr(convert, 'get_detector', no_detector)
+  assert convert.genderize_all(names, cache_path) == genders
+  # Changing the manual corrections invalidates the cache
+  monkeypatch.setattr(convert, 'extra_femalenames', convert.extra_femalenames | {'Kenan'})
+  monkeypatch.setattr(convert, 'get_detector', lambda: None)
+  genders = convert.genderize_all(['Kenan Thompson'], cache_path)
+  assert genders == {'Kenan Thompson': 'female'}
@@ -0,0 +1,109 @@
+import json
+
+import scrapy
+from scrapy import signals
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from snlscrape import jobs, tables
+from snlscrape.items import *
+from snlscrape.pipelines import EntityDedupePipeline, MultiJsonExportPipeline
+
+EP_URL = 'http://www.snlarchives.net/Episodes/?{}'
+
+class Crawl(object):
+  """Just enough of a crawl to exercise checkpointing, without the engine."""
+
+  def __init__(self, tmpdir, **settings):
+    settings.update(SNL_JOB_DIR=str(tmpdir.join('job')), SNL_CHECKPOINT_INTERVAL=1,
+        SNL_OUTPUT_DIR=str(tmpdir.join('output')))
+    self.crawler = get_crawler(settings_dict=settings)
+    self.spider = scrapy.Spider('test')
+    self.crawler.stats.open_spider(None)
+    self.job = jobs.job_for(self.crawler)
+    self.middleware = jobs.CheckpointMiddleware.from_crawler(self.crawler)
+    self.pipelines = [EntityDedupePipeline.from_crawler(self.crawler),
+        MultiJsonExportPipeline.from_crawler(self.crawler)]
+    for pipeline in self.pipelines:
+      pipeline.open_spider(self.spider)
+
+  def spider_output(self, epid, things):
+    url = EP_URL.format(epid)
+    response = HtmlResponse(url, body=b'<html></html>', request=Request(url))
+    return response, self.middleware.process_spider_output(response, iter(things), self.spider)
+
+  def run_page(self, epid, things):
+    """Process a page yielding the given things, like the scraper would, and return
+    the requests that make it through."""
+    requests = []
+    response, output = self.spider_output(epid, things)
+    for thing in output:
+      if isinstance(thing, Request):
+        requests.append(thing)
+        continue
+      try:
+        for pipeline in self.pipelines:
+          thing = pipeline.process_item(thing, self.spider)
+      except scrapy.exceptions.DropItem as e:
+        self.crawler.signals.send_catch_log(signals.item_dropped, item=thing,
+            response=response, spider=self.spider, exception=e)
+      else:
+        self.crawler.signals.send_catch_log(signals.item_scraped, item=thing,
+            response=response, spider=self.spider)
+    return requests
+
+  def finish(self, reason='finished'):
+    for pipeline in self.pipelines:
+      if hasattr(pipeline, 'close_spider'):
+        pipeline.close_spider(self.spider)
+    self.crawler.signals.send_catch_log(signals.spider_closed, spider=self.spider, reason=reason)
+
+def episode_things(epid):
+  return [Episode(epid=epid, sid=27, epno=int(epid[-2:])), Actor(aid='Will Ferrell', type='cast')]
+
+def read_output(tmpdir, table):
+  with open(str(tmpdir.join('output', table + '.json'))) as f:
+    return [json.loads(line) for line in f]
+
+def test_resume(tmpdir):
+  tmpdir.mkdir('output')
+  crawl = Crawl(tmpdir)
+  season = [Request(EP_URL.format(epid)) for epid in ('20020511', '20020518')]
+  assert len(crawl.run_page('2001', [Season(sid=27, year=2001)] + season)) == 2
+  crawl.run_page('20020511', episode_things('20020511'))
+  # Die partway through the second episode
+  _response, partial = crawl.spider_output('20020518', episode_things('20020518'))
+  next(partial)
+  assert json.loads(tmpdir.join('job', 'default', 'checkpoint.json').read())['done'] == {
+      EP_URL.format('2001'): False, EP_URL.format('20020511'): True}
+  assert not tmpdir.join('output', 'episodes.json').exists()
+
+  resumed = Crawl(tmpdir)
+  # The season page's items have already been exported, but its requests still matter
+  requests = resumed.run_page('2001', [Season(sid=27, year=2001)] + season)
+  assert [r.url for r in requests] == [EP_URL.format('20020518')]
+  resumed.run_page('20020518', episode_things('20020518'))
+  resumed.finish()
+
+  assert [row['epid'] for row in read_output(tmpdir, 'episodes')] == ['20020511', '20020518']
+  assert len(read_output(tmpdir, 'seasons')) == 1
+  # Dedupe state survived the restart
+  assert len(read_output(tmpdir, 'actors')) == 1
+  assert not tmpdir.join('job', 'default', 'checkpoint.json').exists()
+
+def test_resume_compressed(tmpdir):
+  tmpdir.mkdir('output')
+  crawl = Crawl(tmpdir, SNL_OUTPUT_COMPRESSION='gzip')
+  crawl.run_page('20020511', episode_things('20020511'))
+  _response, partial = crawl.spider_output('20020518', episode_things('20020518'))
+  next(partial)
+
+  # Resuming uses the staged files' compression, whatever the settings say now
+  resumed = Crawl(tmpdir)
+  resumed.run_page('20020518', episode_things('20020518'))
+  resumed.finish()
+
+  output = str(tmpdir.join('output'))
+  assert tables.list_tables(output) == dict(actors=[tables.table_path(output, 'actors', 'gzip')],
+      episodes=[tables.table_path(output, 'episodes', 'gzip')])
+  assert [row['epid'] for row in tables.read_table(output, 'episodes')] == ['20020511', '20020518']
@@ -0,0 +1,36 @@
+import pandas as pd
+
+from snlscrape.keys import KeyDictionary
+
+def make_tables():
+  casts = pd.DataFrame(dict(
+    aid=pd.Categorical(['Jan Hooks', 'Dana Carvey'], categories=['Dana Carvey', 'Jan Hooks']),
+    sid=[12, 12],
+    first_epid=pd.array([19861011, None], dtype='Int64'),
+  ))
+  episodes = pd.DataFrame(dict(epid=[19861122, 19861011], sid=[12, 12]))
+  return dict(casts=casts, episodes=episodes)
+
+def test_roundtrip():
+  tables = make_tables()
+  original = {name: df.copy() for (name, df) in tables.items()}
+  keys = KeyDictionary.from_tables(tables)
+  keys.encode_tables(tables)
+  assert tables['casts']['aid'].tolist() == [1, 0]
+  assert str(tables['episodes']['epid'].dtype) == 'int32'
+  # Codes sort the same way as the ids they stand for
+  assert tables['episodes']['epid'].tolist() == [1, 0]
+  assert tables['casts']['first_epid'].isnull().tolist() == [False, True]
+  assert tables['casts']['first_epid'][0] == keys.code('epid', 19861011)
+  keys.decode_tables(tables)
+  for name, df in tables.items():
+    assert df.to_csv(index=False) == original[name].to_csv(index=False)
+
+def test_save_load(tmpdir):
+  keys = KeyDictionary.from_tables(make_tables())
+  path = str(tmpdir.join(KeyDictionary.FNAME))
+  keys.save(path)
+  loaded = KeyDictionary.load(path)
+  assert loaded.code('aid', 'Jan Hooks') == 1
+  assert loaded.value('epid', 1) == 19861122
+  assert loaded.value('sid', 0) == 12
@@ -0,0 +1,50 @@
+from scrapy.http import HtmlResponse, Request
+from scrapy.settings import Settings
+
+from snlscrape import settings as snl_settings
+from snlscrape.items import EpisodeRating
+from snlscrape.page_test_helpers import episode_response
+from snlscrape.spiders.snl import SnlSpider
+
+def parse_items(fast, response):
+  spider = SnlSpider()
+  spider.settings = Settings(dict(vars(snl_settings), SNL_FAST_PARSE=fast))
+  return [(type(item).__name__, dict(item)) for item in spider.parseEpisode(response)]
+
+def test_fast_parse_matches_css():
+  response = episode_response()
+  slow = parse_items(False, response)
+  fast = parse_items(True, response)
+  assert fast == slow
+  classes = [cls for (cls, _item) in fast]
+  assert classes.count('Title') == 4
+  assert 'Sketch' in classes and 'Impression' in classes and 'Character' in classes
+
+def test_parse_values():
+  items = parse_items(True, episode_response())
+  titles = [item for (cls, item) in items if cls == 'Title']
+  assert [t['name'] for t in titles] == ['Jeopardy!Celebrity Jeopardy', '', 'Botox Ad', 'Old Glory']
+  assert titles[0]['skid'] == '17'
+  assert 'skid' not in titles[3]
+  apps = [item for (cls, item) in items if cls == 'Appearance']
+  voiced = [app for app in apps if app.get('voice')]
+  assert len(voiced) == 1 and voiced[0]['role'] == 'announcer'
+  filmed = [app for app in apps if app['capacity'] == 'filmed']
+  assert filmed[0]['impid'] == 12
+  hosts = [item for (cls, item) in items if cls == 'Host']
+  assert hosts == [dict(epid='20020518', aid='Winona Ryder')]
+
+def test_repeat_entities_not_yielded():
+  items = parse_items(True, episode_response())
+  aids = [item['aid'] for (cls, item) in items if cls == 'Actor']
+  assert len(aids) == len(set(aids))
+  assert 'Ana Gasteyer' in aids
+  impressions = [item for (cls, item) in items if cls == 'Impression']
+  assert len(impressions) == 1
+
+def test_ratings_page_without_tables():
+  # e.g. an episode with too few ratings for IMDb to show a breakdown
+  url = 'http://www.imdb.com/title/tt7399178/ratings'
+  response = HtmlResponse(url, body=b'<html><body></body></html>', encoding='utf-8',
+    request=Request(url, meta={'rating': EpisodeRating(epno=0, sid=43)}))
+  assert list(SnlSpider().parseRatingsEpisode(response)) == []
@@ -0,0 +1,158 @@
+import json
+
+import scrapy
+import scrapy.exporters
+
+from snlscrape import frames, sqldb, tables
+from snlscrape.items import *
+from snlscrape.pipelines import *
+
+def write_table(path, rows):
+  with open(str(path), 'w') as f:
+    for row in rows:
+      f.write(json.dumps(row) + '\n')
+
+def read_table(path):
+  with open(str(path)) as f:
+    return [json.loads(line) for line in f]
+
+def export(pipeline, items, reason='finished'):
+  spider = scrapy.Spider('test')
+  pipeline.open_spider(spider)
+  for item in items:
+    pipeline.process_item(item, spider)
+  pipeline.close_spider(spider)
+  if hasattr(pipeline, 'spider_closed'):
+    pipeline.spider_closed(spider, reason)
+
+def test_overwrite(tmpdir):
+  write_table(tmpdir.join('episodes.json'), [dict(epid='20020518', sid=27, epno=20, aired='May 18, 2002')])
+  export(MultiJsonExportPipeline(str(tmpdir)), [Episode(epid='20021005', sid=28, epno=1)])
+  assert [row['epid'] for row in read_table(tmpdir.join('episodes.json'))] == ['20021005']
+  assert tmpdir.listdir() == [tmpdir.join('episodes.json')]
+
+def test_unfinished_crawl_leaves_output(tmpdir):
+  write_table(tmpdir.join('episodes.json'), [dict(epid='20020518', sid=27, epno=20, aired='May 18, 2002')])
+  export(MultiJsonExportPipeline(str(tmpdir)), [Episode(epid='20021005', sid=28, epno=1)],
+      reason='shutdown')
+  assert [row['epid'] for row in read_table(tmpdir.join('episodes.json'))] == ['20020518']
+
+def test_incremental_merge(tmpdir):
+  write_table(tmpdir.join('titles.json'), [
+    dict(tid='200205181', epid='20020518', order=0),
+    dict(tid='200210051', epid='20021005', order=0, name='old'),
+    dict(tid='200210052', epid='20021005', order=1),
+  ])
+  write_table(tmpdir.join('actors.json'), [
+    dict(aid='Will Ferrell', type='cast', url='/Cast/?WiFe'),
+    dict(aid='Winona Ryder', type='unknown', url=None),
+  ])
+  pipeline = MultiJsonExportPipeline(str(tmpdir), merge=True)
+  export(pipeline, [
+    Title(tid='200210051', epid='20021005', order=0, name='new'),
+    Actor(aid='Winona Ryder', type='guest', url='/Guests/?1'),
+    Actor(aid='Jimmy Fallon', type='cast', url='/Cast/?JiFa'),
+  ])
+  titles = read_table(tmpdir.join('titles.json'))
+  # All the titles for the re-scraped episode are replaced, others are untouched
+  assert [(t['tid'], t.get('name')) for t in titles] == [('200210051', 'new'), ('200205181', None)]
+  actors = {a['aid']: a for a in read_table(tmpdir.join('actors.json'))}
+  assert set(actors) == {'Will Ferrell', 'Winona Ryder', 'Jimmy Fallon'}
+  assert actors['Winona Ryder']['type'] == 'guest'
+  # Tables with no new items are left alone
+  assert not tmpdir.join('episodes.json').exists()
+
+def test_compressed_merge(tmpdir):
+  write_table(tmpdir.join('titles.json'), [
+    dict(tid='200205181', epid='20020518', order=0),
+    dict(tid='200210051', epid='20021005', order=0, name='old'),
+  ])
+  pipeline = MultiJsonExportPipeline(str(tmpdir), merge=True, compression='gzip', buffer_size=10)
+  export(pipeline, [Title(tid='200210051', epid='20021005', order=0, name='new')])
+  # The plain table is replaced by a compressed one
+  assert tmpdir.listdir() == [tmpdir.join('titles.json.gz')]
+  titles = frames.load_tables(str(tmpdir))['titles']
+  assert titles['tid'].tolist() == [200210051, 200205181]
+  assert titles['name'].tolist()[0] == 'new'
+
+def test_writer_matches_scrapy_exporter(tmpdir):
+  things = [Title(tid='200210051', epid='20021005', order=0, name=u'Caf\xe9'),
+      Actor(url='/Guests/?1', aid='Winona Ryder', type='guest')]
+  path = str(tmpdir.join('writer.json'))
+  writer = tables.TableWriter(path)
+  for thing in things:
+    writer.write_item(thing)
+  writer.close()
+  with open(str(tmpdir.join('exporter.json')), 'wb') as f:
+    exporter = scrapy.exporters.JsonLinesItemExporter(f)
+    for thing in things:
+      exporter.export_item(thing)
+  assert tmpdir.join('writer.json').read_binary() == tmpdir.join('exporter.json').read_binary()
+
+def test_sharded_recrawl(tmpdir):
+  write_table(tmpdir.join('titles.json'), [
+    dict(tid='200205181', epid='20020518', order=0),
+    dict(tid='200210051', epid='20021005', order=0, name='old'),
+  ])
+  write_table(tmpdir.join('actors.json'), [dict(aid='Will Ferrell', type='cast', url='/Cast/?WiFe')])
+  export(MultiJsonExportPipeline(str(tmpdir), shard_by_season=True), [
+    Title(tid='200210051', epid='20021005', order=0, name='new'),
+    Actor(aid='Jimmy Fallon', type='cast', url='/Cast/?JiFa'),
+  ])
+  # The old titles table is split up, with season 28's shard replaced
+  assert not tmpdir.join('titles.json').exists()
+  assert [t['name'] for t in read_table(tmpdir.join('titles', 'sid=28.jsonl'))] == ['new']
+  assert [t['tid'] for t in read_table(tmpdir.join('titles', 'sid=27.jsonl'))] == ['200205181']
+  # Tables that aren't sharded are merged
+  assert [a['aid'] for a in read_table(tmpdir.join('actors.json'))] == ['Jimmy Fallon', 'Will Ferrell']
+
+  export(MultiJsonExportPipeline(str(tmpdir), shard_by_season=True), [
+    Title(tid='200205182', epid='20020518', order=1),
+  ])
+  assert [t['tid'] for t in read_table(tmpdir.join('titles', 'sid=27.jsonl'))] == ['200205182']
+  assert [t['tid'] for t in tables.read_table(str(tmpdir), 'titles')] == ['200205182', '200210051']
+
+def test_sqlite_recrawl(tmpdir):
+  path = str(tmpdir.join('snl.sqlite'))
+  export(SqliteExportPipeline(path, batch_size=2), [
+    Title(tid='200205181', epid='20020518', order=0, category='Sketch'),
+    Title(tid='200210051', epid='20021005', order=0, name='old'),
+    Title(tid='200210052', epid='20021005', order=1),
+    Actor(aid='Winona Ryder', type='unknown', url=None),
+    Appearance(aid='Winona Ryder', tid='200205181', capacity='host', voice=False),
+  ])
+  export(SqliteExportPipeline(path, batch_size=2), [
+    Title(tid='200210051', epid='20021005', order=0, name='new'),
+    Actor(aid='Winona Ryder', type='guest', url='/Guests/?1'),
+  ])
+  db = sqldb.connect(path)
+  titles = db.execute('SELECT tid, epid, name, "order" FROM titles ORDER BY tid').fetchall()
+  # All the titles for the re-scraped episode are replaced, others are untouched
+  assert [tuple(row) for row in titles] == [
+      (200205181, 20020518, None, 0), (200210051, 20021005, 'new', 0)]
+  actors = db.execute('SELECT * FROM actors').fetchall()
+  assert [(row['aid'], row['type']) for row in actors] == [('Winona Ryder', 'guest')]
+  assert db.execute('SELECT voice FROM appearances').fetchone()[0] == 0
+  indexes = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+  assert {'idx_titles_tid', 'idx_titles_epid', 'idx_appearances_aid'} <= indexes
+
+def test_field_checks_match_generic_pipelines(caplog):
+  def make_items():
+    return [
+      Cast(aid='Jan Hooks', sid=0, first_epid=19861011),
+      Title(tid='198610111', epid='19861011', category='Nope', order=3),
+      Appearance(aid='Jan Hooks', tid='198610111', capacity='cast'),
+      EpisodeRating(epno=1, sid=12, score_counts={1: 5}),
+    ]
+  generic = make_items()
+  for item in generic:
+    ValidatorPipeline().process_item(DefaultValueSetterPipeline().process_item(item, None), None)
+  checker = FieldCheckPipeline()
+  checker.open_spider(None)
+  compiled = [checker.process_item(item, None) for item in make_items()]
+  assert [dict(item) for item in compiled] == [dict(item) for item in generic]
+  assert compiled[0]['featured'] is False and compiled[2]['voice'] is False
+  assert set(checker.failures) == {('Cast', 'sid'), ('Cast', 'first_epid'), ('Title', 'category'),
+      ('EpisodeRating', 'score_counts'), ('EpisodeRating', 'demographic_averages'),
+      ('EpisodeRating', 'demographic_counts')}
+  assert len([r for r in caplog.records if 'Validation error' in r.getMessage()]) == len(checker.failures)
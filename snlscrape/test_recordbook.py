@@ -0,0 +1,41 @@
+from snlscrape import recordbook
+from snlscrape.tables import write_rows
+
+def write_season(dirpath, sid, epid, apps, host):
+  write_rows(str(dirpath), 'titles', [
+    dict(tid=epid + '1', epid=epid, order=0, category='Monologue'),
+    dict(tid=epid + '2', epid=epid, order=1, category='Sketch'),
+  ], sid=sid)
+  write_rows(str(dirpath), 'appearances', [dict(aid=aid, tid=epid + str(n), capacity=capacity)
+    for (aid, n, capacity) in apps], sid=sid)
+  write_rows(str(dirpath), 'hosts', [dict(epid=epid, aid=host)], sid=sid)
+
+def test_tallies(tmpdir, monkeypatch):
+  write_season(tmpdir, 16, '19901006', [
+    ('Dana Carvey', 1, 'cast'), ('Dana Carvey', 2, 'cast'), ('Jan Hooks', 2, 'cast'),
+    ('George Steinbrenner', 1, 'host')], 'George Steinbrenner')
+  write_season(tmpdir, 17, '19910928', [
+    ('Jan Hooks', 1, 'cast'), ('Jan Hooks', 2, 'cast'), ('Jan Hooks', 2, 'cast')],
+    'Jimmy Smits')
+  tallies = recordbook.load_tallies(str(tmpdir))
+  apps = tallies['appearances']
+  assert apps.top(2) == [('Jan Hooks', 4), ('Dana Carvey', 2)]
+  assert apps.top(1, 'season') == {16: [('Dana Carvey', 2)], 17: [('Jan Hooks', 3)]}
+  assert apps.top(1, 'category') == {'Monologue': [('Dana Carvey', 1)],
+    'Sketch': [('Jan Hooks', 3)]}
+  assert apps.top(5, 'capacity')['host'] == [('George Steinbrenner', 1)]
+  assert apps.top_groups(1, 'episode') == [('19910928', 'Jan Hooks', 3)]
+  assert tallies['hosts'].top(5) == [('George Steinbrenner', 1), ('Jimmy Smits', 1)]
+
+  # Adding a season only means counting its files
+  counted = []
+  tally_appearances = recordbook.tally_appearances
+  def counting(path, title_paths):
+    counted.append(path)
+    return tally_appearances(path, title_paths)
+  monkeypatch.setattr(recordbook, 'tally_appearances', counting)
+  write_season(tmpdir, 18, '19920926', [('Dana Carvey', 2, 'cast')] * 3, 'Tom Hanks')
+  tallies = recordbook.load_tallies(str(tmpdir))
+  assert counted == [str(tmpdir.join('appearances', 'sid=18.jsonl'))]
+  assert tallies['appearances'].top(2) == [('Dana Carvey', 5), ('Jan Hooks', 4)]
+  assert sorted(tallies['hosts'].top(1, 'season')) == [16, 17, 18]
@@ -0,0 +1,35 @@
+import io
+import pickle
+
+import pytest
+import scrapy
+import scrapy.exporters
+
+from snlscrape.items import Appearance, BaseSnlItem, Title
+
+def test_mapping_interface():
+  app = Appearance(aid='Will Ferrell', tid='200205241', capacity='cast')
+  assert 'role' not in app and app.get('role') is None
+  with pytest.raises(KeyError):
+    app['role']
+  app['role'] = 'Alex Trebek'
+  assert app['role'] == 'Alex Trebek'
+  assert dict(app) == dict(aid='Will Ferrell', tid='200205241', capacity='cast', role='Alex Trebek')
+  del app['role']
+  assert len(app) == 3
+  with pytest.raises(KeyError):
+    app['bogus'] = 1
+  assert not hasattr(app, '__dict__')
+  assert dict(pickle.loads(pickle.dumps(app))) == dict(app)
+  assert Title.scope_fields() == ('epid',) and Appearance.key_field() is None
+
+def test_exports_like_item():
+  ItemTitle = type('Title', (BaseSnlItem,), dict(Title.fields))
+  def export(title):
+    f = io.BytesIO()
+    scrapy.exporters.JsonLinesItemExporter(f).export_item(title)
+    return f.getvalue()
+  kwargs = dict(order=2, epid='20020518', category='Sketch', name=None)
+  record, item = Title(**kwargs), ItemTitle(**kwargs)
+  record['tid'] = item['tid'] = '200205183'
+  assert export(record) == export(item)
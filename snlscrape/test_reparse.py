@@ -0,0 +1,46 @@
+from snlscrape import reparse
+from snlscrape.store import ResponseStore
+
+HEADERS = {'Content-Type': ['text/html; charset=UTF-8']}
+
+EPISODE_PAGE = u'''<html><body>
+<table class="epGuests">
+<tr><td><p>Aired:</p></td><td><p>{aired} (<a href="/Seasons/?2001">S27</a>E{epno} / #533)</p></td></tr>
+<tr><td><p>Host:</p></td><td><p><a href="/Guests/?1">{host}</a></p></td></tr>
+</table>
+<div class="sketchWrapper"><a href="/Episodes/?{epid}1"><div class="title">Jeopardy!</div>
+<div class="type">Sketch</div></a>
+<table class="roleTable">
+<tr><td><a href="/Cast/?WiFe">Will Ferrell</a></td><td>...</td><td><a href="/Impressions/?12">Alex Trebek</a></td></tr>
+<tr><td class="host">{host}</td><td>...</td><td>contestant</td></tr>
+</table></div>
+<div class="sketchWrapper"><a href="/Episodes/?{epid}2"><div class="title"></div>
+<div class="type">Monologue</div></a>
+<table class="roleTable"><tr><td class="host">{host}</td></tr></table></div>
+</body></html>'''
+
+def build_store(root):
+  store = ResponseStore(root)
+  episodes = [('20020518', 'May 18, 2002', 20, 'Winona Ryder'),
+      ('20020511', 'May 11, 2002', 19, 'Kirsten Dunst'),
+      ('20020420', 'April 20, 2002', 18, 'The Rock')]
+  for epid, aired, epno, host in episodes:
+    page = EPISODE_PAGE.format(epid=epid, aired=aired, epno=epno, host=host)
+    store.put('http://www.snlarchives.net/Episodes/?' + epid, 200, HEADERS, page.encode('utf-8'))
+  store.close()
+
+def run(tmpdir, name, jobs):
+  out = tmpdir.mkdir(name)
+  reparse.reparse(str(tmpdir.join('store')), jobs,
+      dict(SNL_OUTPUT_DIR=str(out), SNL_SCRAPE_IMDB=False))
+  return {f.basename: f.read_binary() for f in out.listdir()}
+
+def test_parallel_matches_serial(tmpdir):
+  build_store(str(tmpdir.join('store')))
+  serial = run(tmpdir, 'serial', 1)
+  parallel = run(tmpdir, 'parallel', 2)
+  assert serial == parallel
+  assert serial['titles.json'].count(b'\n') == 6
+  # Will Ferrell appears in all three episodes, but should only be exported once
+  assert serial['actors.json'].count(b'Will Ferrell') == 1
+  assert serial['seasons.json'].count(b'\n') == 1
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from snlscrape import snapshot
+
+def make_tables():
+  casts = pd.DataFrame(dict(
+    aid=pd.Categorical([u'Beyoncé', 'Dana Carvey', 'Jan Hooks']),
+    sid=np.array([12, 12, 13], dtype='int32'),
+    featured=[True, False, False],
+    first_epid=pd.array([19861011, None, None], dtype='Int64'),
+    season_fraction=[1.0, 0.5, 0.25],
+  ))
+  titles = pd.DataFrame(dict(
+    tid=[198610111, 198610112],
+    name=['Church Chat', None],
+    misc=[dict(a=1), None],
+  ))
+  return dict(casts=casts, titles=titles)
+
+def test_roundtrip(tmpdir):
+  tables = make_tables()
+  path = str(tmpdir.join('snapshot'))
+  snapshot.write_snapshot(tables, path)
+  loaded = snapshot.load_snapshot(path)
+  assert sorted(loaded) == ['casts', 'titles']
+  for name, df in tables.items():
+    assert df.to_csv(index=False) == loaded[name].to_csv(index=False)
+  casts = loaded['casts']
+  assert str(casts['first_epid'].dtype) == 'Int64'
+  assert str(casts['sid'].dtype) == 'int32'
+  assert list(casts['aid'].cat.categories) == [u'Beyoncé', 'Dana Carvey', 'Jan Hooks']
+  assert loaded['titles']['misc'][0] == dict(a=1)
+
+def test_replace_existing(tmpdir):
+  path = str(tmpdir.join('snapshot'))
+  snapshot.write_snapshot(make_tables(), path)
+  snapshot.write_snapshot(dict(seasons=pd.DataFrame(dict(sid=[1, 2]))), path)
+  loaded = snapshot.load_snapshot(path)
+  assert list(loaded) == ['seasons']
+  assert loaded['seasons']['sid'].tolist() == [1, 2]
+  assert not tmpdir.join('snapshot.tmp').exists()
@@ -0,0 +1,56 @@
+from snlscrape.stages import Stage, StageGraph
+
+def make_graph(tmpdir, calls, **kwargs):
+  data = tmpdir.join('data.txt')
+  def read(inputs):
+    calls.append('read')
+    return dict(words=data.read().split())
+  def count(inputs):
+    calls.append('count')
+    return dict(n_words=len(inputs['words']))
+  def shout(inputs):
+    calls.append('shout')
+    return dict(words=[word.upper() for word in inputs['words']])
+  def report(inputs):
+    calls.append('report')
+    return dict(report='{}: {}'.format(inputs['n_words'], ' '.join(inputs['words'])))
+  return StageGraph([
+    Stage('read', read, outputs=['words'], files=[str(data)]),
+    Stage('count', count, ['read'], ['n_words']),
+    Stage('shout', shout, ['read'], ['words']),
+    Stage('report', report, ['read', 'count', 'shout'], ['report']),
+  ], str(tmpdir.join('cache')), **kwargs)
+
+def test_caching(tmpdir):
+  tmpdir.join('data.txt').write('live from new york')
+  calls = []
+  assert make_graph(tmpdir, calls).output('report')['report'] == '4: LIVE FROM NEW YORK'
+  assert calls == ['report', 'count', 'read', 'shout']
+
+  # Nothing's changed, so everything comes from the cache
+  calls = []
+  graph = make_graph(tmpdir, calls)
+  assert graph.stale('report') == []
+  assert graph.output('report')['report'] == '4: LIVE FROM NEW YORK'
+  assert calls == []
+
+  tmpdir.join('data.txt').write('goodnight')
+  calls = []
+  graph = make_graph(tmpdir, calls)
+  assert graph.stale('count') == ['read', 'count']
+  assert graph.output('report')['report'] == '1: GOODNIGHT'
+  assert sorted(calls) == ['count', 'read', 'report', 'shout']
+
+  calls = []
+  make_graph(tmpdir, calls, force=True).output('count')
+  assert calls == ['count', 'read']
+
+def test_code_change_invalidates(tmpdir):
+  tmpdir.join('data.txt').write('live from new york')
+  graph = make_graph(tmpdir, [])
+  graph.output('report')
+  def count(inputs):
+    return dict(n_words=len(set(inputs['words'])))
+  graph = make_graph(tmpdir, [])
+  graph.stages['count'] = Stage('count', count, ['read'], ['n_words'])
+  assert graph.stale('report') == ['count', 'report']
@@ -0,0 +1,47 @@
+import pytest
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from snlscrape.store import ResponseStore
+from snlscrape.middlewares import ResponseStoreMiddleware
+
+EP_URL = 'http://www.snlarchives.net/Episodes/?20020518'
+BODY = b'<html><body><table class="epGuests"></table></body></html>'
+HEADERS = {'Content-Type': ['text/html; charset=UTF-8']}
+
+def test_store_roundtrip(tmpdir):
+  store = ResponseStore(str(tmpdir))
+  digest = store.put(EP_URL, 200, HEADERS, BODY)
+  # Same content under a different url shouldn't be stored twice
+  assert store.put(EP_URL + '1', 200, HEADERS, BODY) == digest
+  store.close()
+  assert len(tmpdir.join('objects').listdir()) == 1
+
+  reopened = ResponseStore(str(tmpdir))
+  assert reopened.urls() == [EP_URL, EP_URL + '1']
+  entry = reopened.get(EP_URL)
+  assert entry['status'] == 200
+  assert reopened.body(entry['sha1']) == BODY
+
+def middleware(tmpdir, **settings):
+  settings['SNL_STORE_DIR'] = str(tmpdir)
+  crawler = get_crawler(settings_dict=settings)
+  crawler.stats.open_spider(None)
+  return ResponseStoreMiddleware.from_crawler(crawler)
+
+def test_record_and_replay(tmpdir):
+  recorder = middleware(tmpdir, SNL_STORE_ENABLED=True)
+  request = Request(EP_URL)
+  assert recorder.process_request(request, None) is None
+  response = HtmlResponse(EP_URL, body=BODY, headers=HEADERS, request=request)
+  recorder.process_response(request, response, None)
+  recorder.spider_closed(None)
+
+  replayer = middleware(tmpdir, SNL_OFFLINE=True)
+  replayed = replayer.process_request(Request(EP_URL), None)
+  assert isinstance(replayed, HtmlResponse)
+  assert replayed.body == BODY
+  assert ResponseStoreMiddleware.FLAG in replayed.flags
+  with pytest.raises(IgnoreRequest):
+    replayer.process_request(Request(EP_URL + '1'), None)
@@ -0,0 +1,70 @@
+from scrapy.http import HtmlResponse, Request
+from scrapy.settings import Settings
+
+from snlscrape import settings as snl_settings
+from snlscrape.items import Season
+from snlscrape.spiders.snl import SnlSpider
+from snlscrape.targets import TargetFilter
+
+def targets(**settings):
+  return TargetFilter.from_settings(Settings(settings))
+
+def test_everything():
+  t = targets()
+  assert t.wants_season(1) and t.wants_episode('20020518') and t.wants_title('200205181', 'Sketch')
+
+def test_implied_ids():
+  t = targets(SNL_TARGET_TIDS='200205181,201310262')
+  assert t.epids == {'20020518', '20131026'}
+  assert t.sids == {27, 39}
+  assert t.wants_title('200205181') and not t.wants_title('200205182')
+  assert not t.wants_episode('20020511')
+
+def test_season_ranges():
+  t = targets(SNL_TARGET_SIDS='40-46,2')
+  assert t.sids == {2, 40, 41, 42, 43, 44, 45, 46}
+  assert t.wants_season(40) and not t.wants_season(39)
+
+def test_aired_range():
+  t = targets(SNL_TARGET_AIRED_AFTER='2014-08-01', SNL_TARGET_AIRED_BEFORE='20150601')
+  assert (t.min_sid, t.max_sid) == (40, 40)
+  assert t.wants_season(40) and not t.wants_season(41)
+  assert t.wants_episode('20140927') and not t.wants_episode('20150613')
+
+def test_categories():
+  t = targets(SNL_TARGET_CATEGORIES='Sketch,Film')
+  assert t.wants_title('200205181')
+  assert t.wants_title('200205181', 'Film') and not t.wants_title('200205181', 'Monologue')
+  t = targets(SNL_EXCLUDE_CATEGORIES='Musical Performance')
+  assert not t.wants_title('200205181', 'Musical Performance')
+
+def spider(**settings):
+  spider = SnlSpider()
+  spider.settings = Settings(dict(vars(snl_settings), SNL_SCRAPE_IMDB=False, **settings))
+  return spider
+
+def test_targeted_requests():
+  s = spider(SNL_TARGET_SIDS='27,40', SNL_TARGET_EPIDS='20150328,20150404')
+  requests = [(r.url, r.callback.__name__, r.meta.get('yield_season'))
+    for r in s.start_requests()]
+  # Season 27 is only targeted as a whole, so it's reached via its season page. Season
+  # 40's Season item comes with the first of its targeted episodes.
+  assert requests == [
+    ('http://www.snlarchives.net/Seasons/?2001', 'parseSeason', True),
+    ('http://www.snlarchives.net/Episodes/?20150328', 'parseEpisode', True),
+    ('http://www.snlarchives.net/Episodes/?20150404', 'parseEpisode', False),
+  ]
+
+def test_targeted_incremental():
+  s = spider(SNL_TARGET_SIDS='39-40')
+  s.complete_epids = {'20131026', '20150328'}
+  list(s.start_requests())
+  # The latest targeted season may still be airing, so its episodes aren't skipped
+  assert s.open_sid == 40
+  for (sid, epid, year) in [(39, '20131026', 2013), (40, '20150328', 2014)]:
+    body = '<div id="section_1"><a href="/Episodes/?{}">ep</a></div>'.format(epid)
+    url = 'http://www.snlarchives.net/Seasons/?{}'.format(year)
+    response = HtmlResponse(url, body=body.encode('utf-8'), encoding='utf-8',
+      request=Request(url, meta={'season': Season(sid=sid, year=year)}))
+    requested = [r.url for r in s.parseSeason(response)]
+    assert requested == ([] if sid == 39 else ['http://www.snlarchives.net/Episodes/?' + epid])
@@ -0,0 +1,46 @@
+import pandas as pd
+
+from snlscrape.tenure import TenureIndex
+
+def make_index():
+  episodes = pd.DataFrame(dict(
+    sid=[1, 1, 1, 2, 2, 3, 3],
+    epid=[19751011, 19751018, 19751025, 19760918, 19760925, 19770924, 19771001],
+  ))
+  seasons = pd.DataFrame(dict(sid=[1, 2, 3], first_epid=[19751011, 19760918, 19770924],
+    last_epid=[19751025, 19760925, 19771001]))
+  casts = pd.DataFrame(dict(
+    aid=['Chevy Chase', 'Chevy Chase', 'Al Franken', 'Al Franken', 'George Coe'],
+    sid=[1, 2, 1, 3, 1],
+    first_epid=[None, None, None, 19771001, None],
+    last_epid=[None, 19760918, None, None, 19751011],
+  ))
+  return TenureIndex.from_casts(casts, seasons, episodes)
+
+def test_runs():
+  index = make_index()
+  assert index.runs('Chevy Chase') == [(19751011, 19760918)]
+  # Non-contiguous runs are kept apart
+  assert index.runs('Al Franken') == [(19751011, 19751025), (19771001, 19771001)]
+  assert index.n_episodes.tolist() == [3, 1, 3, 1, 1]
+
+def test_queries():
+  index = make_index()
+  assert index.at(19751011) == ['George Coe', 'Al Franken', 'Chevy Chase']
+  assert index.at(19751018) == ['Al Franken', 'Chevy Chase']
+  assert index.at(19760925) == []
+  # Between seasons, only runs continuing from one to the next count
+  assert index.at(19760601) == ['Chevy Chase']
+  assert index.at(19700101) == index.at(19800101) == []
+  assert index.overlapping(19760101, 19771231) == ['Chevy Chase', 'Al Franken']
+  assert index.within(19751011, 19751025) == ['George Coe', 'Al Franken']
+  assert index.count_at([19751011, 19751018, 19760925, 19771001]).tolist() == [3, 2, 0, 1]
+
+def test_count_present():
+  index = make_index()
+  apps = pd.DataFrame(dict(
+    aid=['Chevy Chase', 'Chevy Chase', 'Chevy Chase', 'Chevy Chase', 'Al Franken'],
+    epid=[19751011, 19751011, 19751025, 19760925, 19771001],
+  ))
+  assert index.count_present(apps['aid'].values, apps['epid'].values).tolist() == \
+    [2, 0, 0, 1, 0]
@@ -0,0 +1,78 @@
+from scrapy import signals
+from scrapy.core.downloader import Slot
+from scrapy.http import Request, Response
+from scrapy.utils.test import get_crawler
+
+from snlscrape import settings as snl_settings
+from snlscrape.middlewares import HostThrottleMiddleware
+from snlscrape.throttle import HostThrottle
+
+def test_steady_host_keeps_base_delay():
+  throttle = HostThrottle(base_delay=.5, max_delay=10)
+  for _ in range(20):
+    throttle.record(latency=2.0)
+  # Slow, but not slowing down
+  assert throttle.delay == .5
+
+def test_backs_off_when_slowing_down():
+  throttle = HostThrottle(base_delay=.5, max_delay=10)
+  throttle.record(latency=.2)
+  for _ in range(20):
+    throttle.record(latency=.8)
+  assert 1.5 < throttle.delay <= 2.0
+  # ... and recovers when it speeds up again
+  for _ in range(20):
+    throttle.record(latency=.2)
+  assert abs(throttle.delay - .5) < .01
+
+def test_backs_off_on_errors():
+  throttle = HostThrottle(base_delay=.5, max_delay=1.5, error_backoff=4.0)
+  throttle.record(latency=.2)
+  throttle.record(error=True)
+  assert throttle.delay > .5
+  for _ in range(10):
+    throttle.record(error=True)
+  assert throttle.delay == 1.5
+
+class FakeDownloader(object):
+  def __init__(self):
+    self.slots = {}
+
+class FakeEngine(object):
+  """Just enough of an engine for HostThrottleMiddleware: a downloader with slots."""
+  def __init__(self):
+    self.downloader = FakeDownloader()
+
+def test_middleware_configures_slots():
+  settings = {name: value for (name, value) in vars(snl_settings).items() if name.isupper()}
+  settings.update(SNL_HOST_CONCURRENCY={'www.imdb.com': 2}, SNL_HOST_DELAY={'www.imdb.com': 1.5},
+    CONCURRENT_REQUESTS_PER_DOMAIN=8, DOWNLOAD_DELAY=.25)
+  crawler = get_crawler(settings_dict=settings)
+  crawler.engine = FakeEngine()
+  mw = HostThrottleMiddleware.from_crawler(crawler)
+  slots = crawler.engine.downloader.slots
+
+  def reach_downloader(url):
+    # What the downloader does with a request: put it in its host's slot (creating the
+    # slot with the default budget if need be), then tell everyone
+    request = Request(url, meta=dict(download_slot=url.split('/')[2]))
+    key = request.meta['download_slot']
+    slots.setdefault(key, Slot(8, .25))
+    crawler.signals.send_catch_log(signals.request_reached_downloader, request=request,
+      spider=None)
+    return request
+
+  # The host's budget applies from its very first request
+  request = reach_downloader('http://www.imdb.com/title/tt0072562/ratings')
+  assert (slots['www.imdb.com'].concurrency, slots['www.imdb.com'].delay) == (2, 1.5)
+  reach_downloader('http://www.snlarchives.net/Seasons/')
+  assert (slots['www.snlarchives.net'].concurrency, slots['www.snlarchives.net'].delay) == (8, .25)
+
+  # Errors push the delay up
+  mw.process_response(request, Response(request.url, status=503, request=request), None)
+  assert slots['www.imdb.com'].delay > 1.5
+  delay = slots['www.imdb.com'].delay
+  # ... and it's kept if the slot is garbage collected and created afresh
+  del slots['www.imdb.com']
+  reach_downloader('http://www.imdb.com/title/tt0072562/ratings')
+  assert slots['www.imdb.com'].delay == delay
@@ -0,0 +1,54 @@
+"""Per-host download delay policy (see HostThrottleMiddleware).
+
+snlarchives.net and IMDB have very different response times, so rather than a single
+global delay, each host gets its own. It starts at the host's configured base delay,
+and never goes below it, so we never hit a site harder than the fixed settings would.
+It goes up when the host shows signs of strain:
+  - when its recent latency rises above the best latency we've seen from it (a host
+    that's slow but steady isn't penalized, one that's slowing down is)
+  - in proportion to its recent error rate (5xx responses, timeouts, etc.)
+"""
+
+class HostThrottle(object):
+
+  def __init__(self, base_delay, max_delay, error_backoff=4.0, smoothing=.3):
+    self.base_delay = base_delay
+    self.max_delay = max(max_delay, base_delay)
+    # At a 100% error rate, the delay gets multiplied by (1 + error_backoff)
+    self.error_backoff = error_backoff
+    # Weight given to the latest observation in the moving averages below
+    self.smoothing = smoothing
+    # Exponentially weighted moving averages
+    self.latency = None
+    self.error_rate = 0.0
+    # Lowest latency seen from this host so far
+    self.baseline_latency = None
+    self.n_responses = 0
+    self.n_errors = 0
+
+  def _ewma(self, avg, obs):
+    return obs if avg is None else (1 - self.smoothing) * avg + self.smoothing * obs
+
+  def record(self, latency=None, error=False):
+    """Record the outcome of a request. latency may be None if it failed without
+    a response (e.g. a timeout).
+    """
+    self.n_responses += 1
+    self.n_errors += bool(error)
+    if latency is not None:
+      self.latency = self._ewma(self.latency, latency)
+      if self.baseline_latency is None or latency < self.baseline_latency:
+        self.baseline_latency = latency
+    self.error_rate = self._ewma(self.error_rate, float(bool(error)))
+
+  @property
+  def slowdown(self):
+    """How many times slower this host is responding than at its best."""
+    if not self.latency or not self.baseline_latency:
+      return 1.0
+    return max(1.0, self.latency / self.baseline_latency)
+
+  @property
+  def delay(self):
+    delay = self.base_delay * self.slowdown * (1 + self.error_backoff * self.error_rate)
+    return min(delay, self.max_delay)